@@ -6,14 +6,22 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # DeepSeek API настройки
-DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+# URL можно переопределить (например, на локальный mock: python -m benchmarks.mock_llm_server)
+DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions")
 API_KEY = os.getenv("DEEPSEEK_API_KEY")
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "1000"))
+# Автопродолжение ответов, обрезанных по max_tokens (finish_reason == "length"):
+# общий бюджет completion-токенов на ответ со всеми продолжениями и число сегментов
+CONTINUATION_TOKEN_BUDGET = int(os.getenv("CONTINUATION_TOKEN_BUDGET", "4000"))
+CONTINUATION_MAX_SEGMENTS = int(os.getenv("CONTINUATION_MAX_SEGMENTS", "4"))
+
+# Библиотека JSON для SSE, ответов API и MCP: auto (orjson, если установлен), orjson или json
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto").lower()
 
 # Hugging Face API настройки (для Llama 3.2-1B-Instruct)
 # Используем Instruct версию модели, которая поддерживает instruction/chat задачи
 # Используем router API с chat completions endpoint (OpenAI-совместимый формат)
-HUGGINGFACE_API_URL = "https://router.huggingface.co/v1/chat/completions"
+HUGGINGFACE_API_URL = os.getenv("HUGGINGFACE_API_URL", "https://router.huggingface.co/v1/chat/completions")
 HUGGINGFACE_MODEL = "meta-llama/Llama-3.2-1B-Instruct"  # Модель передается в теле запроса
 HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY")  # Опционально, требуется только для использования Llama API
 
@@ -24,6 +32,49 @@ HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY")  # Опционально
 # через переменную окружения MCP_WEATHER_SERVER_URL.
 MCP_WEATHER_SERVER_URL = os.getenv("MCP_WEATHER_SERVER_URL", "http://185.28.85.26:9001")
 MCP_USE_HTTP = os.getenv("MCP_USE_HTTP", "true").lower() == "true"
+# JSON-файл с реестром MCP-серверов (транспорт, команда, env, pool_size); см. mcp_servers.example.json
+MCP_SERVERS_CONFIG = os.getenv("MCP_SERVERS_CONFIG")
+# SSE MCP-серверы: число параллельных сессий, лимит запросов в полёте на сессию и интервал heartbeat
+MCP_SSE_POOL_SIZE = int(os.getenv("MCP_SSE_POOL_SIZE", "2"))
+MCP_SSE_MAX_IN_FLIGHT = int(os.getenv("MCP_SSE_MAX_IN_FLIGHT", "32"))
+MCP_SSE_HEARTBEAT_INTERVAL = float(os.getenv("MCP_SSE_HEARTBEAT_INTERVAL", "15"))
+# Прогревать серверы реестра при старте (подключение, initialize, tools/list)
+MCP_PREWARM = os.getenv("MCP_PREWARM", "true").lower() == "true"
+# Сколько секунд кэшировать найденную команду запуска stdio MCP-сервера
+MCP_RESOLVER_TTL = float(os.getenv("MCP_RESOLVER_TTL", "300"))
+
+# Weather chat: сколько ждать данные MCP и через сколько после старта MCP-запроса
+# параллельно запускать запасной ответ DeepSeek (0 — сразу; ответ отменяется, если MCP успел)
+WEATHER_MCP_DEADLINE_MS = float(os.getenv("WEATHER_MCP_DEADLINE_MS", "10000"))
+WEATHER_FALLBACK_HEDGE_MS = float(os.getenv("WEATHER_FALLBACK_HEDGE_MS", "500"))
+# LRU-кэш намерений по нормализованному запросу (0 — выключен) и доля вызовов,
+# попадающих в debug-лог backend.services.weather_intent.sampled
+WEATHER_INTENT_CACHE_SIZE = int(os.getenv("WEATHER_INTENT_CACHE_SIZE", "1024"))
+WEATHER_INTENT_LOG_SAMPLE = float(os.getenv("WEATHER_INTENT_LOG_SAMPLE", "0.01"))
+
+# Диалоги на сервере (conversation_id): сколько держать в памяти и где БД
+# (по умолчанию conversations.db рядом с БД суммаризаций)
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "256"))
+CONVERSATIONS_DB_PATH = os.getenv("CONVERSATIONS_DB_PATH")
+
+# Раскладка сжатой истории в /api/compression/chat: rolling (одна суммаризация
+# в начале, переписывается при каждом сжатии) или stable (замороженные суммаризации
+# блоков — префикс не меняется между ходами); размер кэша суммаризаций блоков
+COMPRESSION_LAYOUT = os.getenv("COMPRESSION_LAYOUT", "rolling").lower()
+COMPRESSION_SUMMARY_CACHE_SIZE = int(os.getenv("COMPRESSION_SUMMARY_CACHE_SIZE", "1024"))
+
+# Трассировка запросов (Server-Timing всегда; экспорт — если задан путь или endpoint)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH")  # например, traces.jsonl
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT")  # например, http://127.0.0.1:4318/v1/traces
+
+# Детектор блокировок event loop (backend/services/loop_monitor.py)
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+
+# Админские endpoint-ы (/api/admin/*): без токена отключены (404)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 # Настройки приложения
 STATIC_DIR = Path("static")
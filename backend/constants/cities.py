@@ -0,0 +1,159 @@
+"""
+Офлайн-справочник городов для распознавания места в запросах о погоде.
+
+Каждая запись: (каноническое русское название, английское название, синонимы).
+Падежные формы русских названий строятся автоматически (services/gazetteer.py);
+в синонимах перечислены только сокращения, разговорные названия и формы,
+которые не выводятся правилами (множественное число, беглые гласные).
+Названия, совпадающие с частыми словами (Nice, Орёл), сюда намеренно не входят.
+"""
+
+CITIES = (
+    # Россия
+    ("Москва", "Moscow", ("Мск",)),
+    ("Санкт-Петербург", "Saint Petersburg", ("Петербург", "Питер", "СПб", "St Petersburg", "Petersburg")),
+    ("Новосибирск", "Novosibirsk", ()),
+    ("Екатеринбург", "Yekaterinburg", ("Екб", "Ekaterinburg")),
+    ("Казань", "Kazan", ()),
+    ("Нижний Новгород", "Nizhny Novgorod", ()),
+    ("Челябинск", "Chelyabinsk", ()),
+    ("Самара", "Samara", ()),
+    ("Омск", "Omsk", ()),
+    ("Ростов-на-Дону", "Rostov-on-Don", ("Ростов", "Rostov")),
+    ("Уфа", "Ufa", ()),
+    ("Красноярск", "Krasnoyarsk", ()),
+    ("Воронеж", "Voronezh", ()),
+    ("Пермь", "Perm", ()),
+    ("Волгоград", "Volgograd", ()),
+    ("Краснодар", "Krasnodar", ()),
+    ("Саратов", "Saratov", ()),
+    ("Тюмень", "Tyumen", ()),
+    ("Тольятти", "Tolyatti", ("Togliatti",)),
+    ("Ижевск", "Izhevsk", ()),
+    ("Барнаул", "Barnaul", ()),
+    ("Ульяновск", "Ulyanovsk", ()),
+    ("Иркутск", "Irkutsk", ()),
+    ("Хабаровск", "Khabarovsk", ()),
+    ("Ярославль", "Yaroslavl", ()),
+    ("Владивосток", "Vladivostok", ()),
+    ("Махачкала", "Makhachkala", ()),
+    ("Томск", "Tomsk", ()),
+    ("Оренбург", "Orenburg", ()),
+    ("Кемерово", "Kemerovo", ("Кемерове",)),
+    ("Новокузнецк", "Novokuznetsk", ()),
+    ("Рязань", "Ryazan", ()),
+    ("Астрахань", "Astrakhan", ()),
+    ("Пенза", "Penza", ()),
+    ("Липецк", "Lipetsk", ()),
+    ("Киров", "Kirov", ()),
+    ("Чебоксары", "Cheboksary", ("Чебоксарах", "Чебоксар", "Чебоксарам")),
+    ("Тула", "Tula", ()),
+    ("Калининград", "Kaliningrad", ()),
+    ("Курск", "Kursk", ()),
+    ("Улан-Удэ", "Ulan-Ude", ()),
+    ("Ставрополь", "Stavropol", ()),
+    ("Сочи", "Sochi", ()),
+    ("Тверь", "Tver", ()),
+    ("Магнитогорск", "Magnitogorsk", ()),
+    ("Иваново", "Ivanovo", ("Иванове",)),
+    ("Брянск", "Bryansk", ()),
+    ("Белгород", "Belgorod", ()),
+    ("Сургут", "Surgut", ()),
+    ("Владимир", "Vladimir", ()),
+    ("Архангельск", "Arkhangelsk", ()),
+    ("Чита", "Chita", ()),
+    ("Смоленск", "Smolensk", ()),
+    ("Калуга", "Kaluga", ()),
+    ("Курган", "Kurgan", ()),
+    ("Череповец", "Cherepovets", ("Череповце", "Череповца", "Череповцу", "Череповцом")),
+    ("Вологда", "Vologda", ()),
+    ("Мурманск", "Murmansk", ()),
+    ("Якутск", "Yakutsk", ()),
+    ("Грозный", "Grozny", ()),
+    ("Петрозаводск", "Petrozavodsk", ()),
+    ("Кострома", "Kostroma", ()),
+    ("Новороссийск", "Novorossiysk", ()),
+    ("Йошкар-Ола", "Yoshkar-Ola", ()),
+    ("Сыктывкар", "Syktyvkar", ()),
+    ("Нальчик", "Nalchik", ()),
+    ("Симферополь", "Simferopol", ()),
+    ("Севастополь", "Sevastopol", ()),
+    ("Анапа", "Anapa", ()),
+    ("Геленджик", "Gelendzhik", ()),
+    ("Великий Новгород", "Veliky Novgorod", ()),
+    ("Псков", "Pskov", ()),
+    ("Норильск", "Norilsk", ()),
+    ("Южно-Сахалинск", "Yuzhno-Sakhalinsk", ()),
+    ("Абакан", "Abakan", ()),
+    ("Благовещенск", "Blagoveshchensk", ()),
+    ("Ялта", "Yalta", ()),
+    # Ближнее зарубежье
+    ("Минск", "Minsk", ()),
+    ("Киев", "Kyiv", ("Kiev",)),
+    ("Алматы", "Almaty", ("Алма-Ата",)),
+    ("Астана", "Astana", ()),
+    ("Ташкент", "Tashkent", ()),
+    ("Баку", "Baku", ()),
+    ("Тбилиси", "Tbilisi", ()),
+    ("Ереван", "Yerevan", ()),
+    ("Бишкек", "Bishkek", ()),
+    ("Рига", "Riga", ()),
+    ("Вильнюс", "Vilnius", ()),
+    ("Таллин", "Tallinn", ("Таллинн",)),
+    ("Кишинёв", "Chisinau", ()),
+    # Европа
+    ("Лондон", "London", ()),
+    ("Париж", "Paris", ()),
+    ("Берлин", "Berlin", ()),
+    ("Рим", "Rome", ()),
+    ("Мадрид", "Madrid", ()),
+    ("Барселона", "Barcelona", ()),
+    ("Прага", "Prague", ()),
+    ("Вена", "Vienna", ()),
+    ("Варшава", "Warsaw", ()),
+    ("Амстердам", "Amsterdam", ()),
+    ("Брюссель", "Brussels", ()),
+    ("Стокгольм", "Stockholm", ()),
+    ("Осло", "Oslo", ()),
+    ("Хельсинки", "Helsinki", ()),
+    ("Копенгаген", "Copenhagen", ()),
+    ("Дублин", "Dublin", ()),
+    ("Лиссабон", "Lisbon", ()),
+    ("Афины", "Athens", ("Афинах", "Афин", "Афинам")),
+    ("Милан", "Milan", ()),
+    ("Мюнхен", "Munich", ()),
+    ("Женева", "Geneva", ()),
+    ("Цюрих", "Zurich", ()),
+    ("Будапешт", "Budapest", ()),
+    ("Белград", "Belgrade", ()),
+    ("София", "Sofia", ()),
+    ("Бухарест", "Bucharest", ()),
+    ("Стамбул", "Istanbul", ()),
+    ("Анкара", "Ankara", ()),
+    ("Анталья", "Antalya", ("Анталия",)),
+    # Азия, Африка, Америка, Океания
+    ("Токио", "Tokyo", ()),
+    ("Пекин", "Beijing", ()),
+    ("Шанхай", "Shanghai", ()),
+    ("Гонконг", "Hong Kong", ()),
+    ("Сеул", "Seoul", ()),
+    ("Бангкок", "Bangkok", ()),
+    ("Сингапур", "Singapore", ()),
+    ("Дели", "Delhi", ("New Delhi",)),
+    ("Мумбаи", "Mumbai", ()),
+    ("Дубай", "Dubai", ("Дубаи",)),
+    ("Тель-Авив", "Tel Aviv", ()),
+    ("Каир", "Cairo", ()),
+    ("Нью-Йорк", "New York", ("New York City", "NYC")),
+    ("Лос-Анджелес", "Los Angeles", ()),
+    ("Чикаго", "Chicago", ()),
+    ("Сан-Франциско", "San Francisco", ()),
+    ("Вашингтон", "Washington", ()),
+    ("Торонто", "Toronto", ()),
+    ("Монреаль", "Montreal", ()),
+    ("Мехико", "Mexico City", ()),
+    ("Рио-де-Жанейро", "Rio de Janeiro", ()),
+    ("Буэнос-Айрес", "Buenos Aires", ()),
+    ("Сидней", "Sydney", ()),
+    ("Мельбурн", "Melbourne", ()),
+)
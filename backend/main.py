@@ -1,12 +1,24 @@
 """Главный файл приложения FastAPI"""
+import asyncio
 import logging
+from pathlib import Path
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-from backend.config import STATIC_DIR
-from backend.routers import chat, health, llama, compression, summaries, mcp, weather_chat
-from backend.services.summaries_db import init_db
+from backend.config import (
+    STATIC_DIR, LOOP_MONITOR_ENABLED, LOOP_MONITOR_INTERVAL_MS, LOOP_BLOCK_THRESHOLD_MS, MCP_PREWARM, CONVERSATIONS_DB_PATH,
+)
+from backend.routers import (
+    chat, health, llama, compression, summaries, mcp, weather_chat, metrics, admin, conversations, prompts,
+)
+from backend.routers.common import FastJSONResponse
+from backend.services.metrics import MetricsMiddleware
+from backend.services.tracing import TracingMiddleware
+from backend.services.summaries_db import init_db, get_db_dir
+from backend.services.conversations import conversation_store
+from backend.services.loop_monitor import LoopMonitor
+from backend.services.mcp_client import prewarm_mcp_servers, close_mcp_servers
 
 # Настройка логирования
 logging.basicConfig(
@@ -21,7 +33,8 @@ try:
 except Exception as e:
     logger.error(f"Error importing MCP router: {e}")
 
-app = FastAPI()
+# Ответы сериализуются через services/serialization (orjson, если установлен)
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Настройка CORS
 app.add_middleware(
@@ -31,6 +44,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Латентность и число запросов в работе по маршрутам (GET /metrics)
+app.add_middleware(MetricsMiddleware)
+# Спаны запроса: заголовки Server-Timing/X-Trace-Id, экспорт в TRACE_JSONL_PATH/TRACE_OTLP_ENDPOINT
+app.add_middleware(TracingMiddleware)
 
 # Подключение роутеров
 app.include_router(chat.router)
@@ -38,16 +55,44 @@ app.include_router(health.router)
 app.include_router(llama.router)
 app.include_router(compression.router)
 app.include_router(summaries.router)
+app.include_router(conversations.router)
+app.include_router(prompts.router)
 app.include_router(mcp.router)
 app.include_router(weather_chat.router)
+app.include_router(metrics.router)
+app.include_router(admin.router)
 logger.info(f"MCP router registered with prefix: {mcp.router.prefix}")
 logger.info(f"Weather chat router registered with prefix: {weather_chat.router.prefix}")
 
 
+loop_monitor = LoopMonitor(
+    interval=LOOP_MONITOR_INTERVAL_MS / 1000,
+    threshold=LOOP_BLOCK_THRESHOLD_MS / 1000,
+)
+
+
 @app.on_event("startup")
-def on_startup():
-    """Инициализация БД суммаризаций при старте приложения."""
+async def on_startup():
+    """Инициализация БД суммаризаций и диалогов и мониторинга event loop при старте приложения."""
     init_db()
+    conversation_store.open(Path(CONVERSATIONS_DB_PATH) if CONVERSATIONS_DB_PATH else get_db_dir() / "conversations.db")
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    if MCP_PREWARM:
+        # В фоне: старт не ждёт npx/подключений, запросы во время прогрева используют те же сессии
+        app.state.mcp_prewarm = asyncio.create_task(prewarm_mcp_servers())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Остановка фоновых задач, MCP-процессов, SSE-сессий и БД диалогов."""
+    prewarm = getattr(app.state, "mcp_prewarm", None)
+    if prewarm is not None and not prewarm.done():
+        prewarm.cancel()
+    await close_mcp_servers()
+    if LOOP_MONITOR_ENABLED:
+        await loop_monitor.stop()
+    conversation_store.close()
 
 
 # Отдаём статические файлы из папки static
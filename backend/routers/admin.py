@@ -0,0 +1,48 @@
+"""Роутер для админских endpoint-ов (профилирование)"""
+import hmac
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from backend.config import ADMIN_TOKEN
+from backend.services import profiler
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """Пропускает запрос только с верным X-Admin-Token; без ADMIN_TOKEN endpoint-ы не существуют."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def admin_profile(
+    seconds: float = Query(10.0, gt=0, le=profiler.MAX_SECONDS),
+    interval_ms: float = Query(5.0, ge=1.0, le=1000.0),
+):
+    """
+    Сэмплирующее профилирование процесса на seconds секунд
+
+    Returns:
+        Collapsed stacks (flamegraph.pl / speedscope)
+    """
+    logger.warning(f"Admin profiling started: seconds={seconds}, interval_ms={interval_ms}")
+    try:
+        result = await profiler.profile(seconds, interval_ms / 1000)
+    except profiler.ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        result.collapsed(),
+        headers={
+            "Content-Disposition": f'attachment; filename="{profiler.profile_filename()}"',
+            "X-Profile-Samples": str(result.sample_count),
+        },
+    )
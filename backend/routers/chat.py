@@ -1,90 +1,69 @@
 """Роутер для обработки чата"""
 import logging
-from typing import Optional, List, Dict
+from typing import Dict, List, Optional, Tuple
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
 
-from backend.services.deepseek_api import call_deepseek_api, stream_deepseek_api
-from backend.config import MAX_TOKENS
+from backend.routers.common import (
+    CompletionRequest, ConversationTurn, FastJSONRoute, open_conversation, prepare_messages, record_reply,
+    record_stream_usage, record_usage, render_template_user, resolve_template, rollback_turn, sse_response,
+    system_messages, usage_response, uses_user_template,
+)
+from backend.services.continuation import complete_with_continuation, stream_with_continuation
+from backend.services.llm_providers import get_provider
+from backend.services.prompt_templates import PromptTemplate
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/chat", tags=["chat"])
+router = APIRouter(prefix="/api/chat", tags=["chat"], route_class=FastJSONRoute)
 
 
-class ChatRequest(BaseModel):
-    prompt: Optional[str] = None
-    system_prompt: Optional[str] = None
-    messages: Optional[List[Dict[str, str]]] = None
-    temperature: Optional[float] = None
-    max_tokens: Optional[int] = None
+class ChatRequest(CompletionRequest):
+    pass
 
 
-def _prepare_messages(request: ChatRequest) -> List[Dict[str, str]]:
+async def _request_messages(
+    request: ChatRequest, template: Optional[PromptTemplate]
+) -> Tuple[List[Dict[str, str]], Optional[ConversationTurn]]:
     """
-    Подготовка сообщений из запроса
-    Отправляет только system_prompt и текущий запрос пользователя (без истории)
-    
-    Args:
-        request: Запрос с промптом или сообщениями
-    
-    Returns:
-        Список сообщений в формате для API (только system_prompt + текущий запрос)
+    Сообщения для модели
+
+    Без conversation_id — только system_prompt и текущий запрос (prepare_messages).
+    С conversation_id — история диалога с сервера плюс новый prompt; messages
+    принимаются один раз, чтобы перенести уже накопленную историю; новое
+    сообщение уже записано в диалог, при ошибке ход нужно отменить (rollback_turn).
     """
-    messages = []
-    
-    # Добавляем system_prompt, если он есть
-    if request.system_prompt:
-        messages.append({"role": "system", "content": request.system_prompt})
-    
-    # Определяем текущий запрос пользователя
-    user_content = None
-    if request.prompt:
-        # Если есть prompt, используем его
-        user_content = request.prompt
-    elif request.messages:
-        # Если есть messages, берем только последнее сообщение от пользователя
-        for msg in reversed(request.messages):
-            if isinstance(msg, dict) and msg.get("role") == "user":
-                user_content = msg.get("content")
-                break
-        # Если не нашли user сообщение, берем последнее сообщение
-        if not user_content and len(request.messages) > 0:
-            last_msg = request.messages[-1]
-            if isinstance(last_msg, dict):
-                user_content = last_msg.get("content", "")
-    else:
-        raise HTTPException(status_code=400, detail="Either 'prompt' or 'messages' must be provided")
-    
-    # Добавляем только текущий запрос пользователя
-    if user_content:
-        messages.append({"role": "user", "content": user_content})
-    else:
-        raise HTTPException(status_code=400, detail="No user message found in request")
-    
-    return messages
+    if not request.conversation_id:
+        return prepare_messages(request), None
+    prompt = request.prompt
+    if uses_user_template(request, template):
+        prompt = render_template_user(request, template)
+    new_messages = [{"role": "user", "content": prompt}] if prompt else []
+    turn = await open_conversation(request.conversation_id, new_messages, request.messages)
+    return system_messages(request, template) + turn.conversation.messages, turn
 
 
 @router.post("/stream")
 async def chat_stream(request: ChatRequest):
     """Streaming endpoint для получения ответов по частям"""
+    turn = None
     try:
-        logger.info(f"Received streaming chat request: messages={bool(request.messages)}, prompt={bool(request.prompt)}")
-        
-        messages = _prepare_messages(request)
-        temperature = request.temperature if request.temperature is not None else 0.3
-        max_tokens = request.max_tokens
+        logger.debug(f"Received streaming chat request: messages={bool(request.messages)}, prompt={bool(request.prompt)}")
         
-        async def generate():
-            async for chunk in stream_deepseek_api(messages, temperature=temperature, max_tokens=max_tokens):
-                yield f"data: {chunk}\n\n"
+        template = resolve_template(request)
+        messages, turn = await _request_messages(request, template)
+        provider = get_provider("deepseek")
         
-        return StreamingResponse(generate(), media_type="text/event-stream")
+        chunks = stream_with_continuation(provider, messages, temperature=request.temperature, max_tokens=request.max_tokens)
+        chunks = record_stream_usage(chunks, "chat_stream", template)
+        if turn is not None:
+            chunks = record_reply(chunks, turn)
+        return sse_response(chunks)
         
     except HTTPException:
+        await rollback_turn(turn)
         raise
     except Exception as e:
+        await rollback_turn(turn)
         logger.error(f"Unexpected error in streaming: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -92,84 +71,48 @@ async def chat_stream(request: ChatRequest):
 @router.post("")
 async def chat(request: ChatRequest):
     """Обычный endpoint для получения ответа"""
+    turn = None
     try:
-        logger.info(f"Received chat request: messages={bool(request.messages)}, prompt={bool(request.prompt)}")
+        logger.debug(f"Received chat request: messages={bool(request.messages)}, prompt={bool(request.prompt)}")
         
-        messages = _prepare_messages(request)
-        temperature = request.temperature if request.temperature is not None else 0.3
+        template = resolve_template(request)
+        messages, turn = await _request_messages(request, template)
+        provider = get_provider("deepseek")
+        temperature = request.temperature if request.temperature is not None else provider.config.default_temperature
         max_tokens = request.max_tokens
         
-        logger.info(f"Sending request to DeepSeek API with {len(messages)} messages, temperature={temperature}, max_tokens={max_tokens}")
+        logger.debug(f"Sending request to DeepSeek API with {len(messages)} messages, temperature={temperature}, max_tokens={max_tokens}")
         if request.system_prompt:
-            logger.info(f"System prompt: {request.system_prompt[:100]}...")
+            logger.debug(f"System prompt: {request.system_prompt[:100]}...")
         
-        data = await call_deepseek_api(messages, temperature=temperature, max_tokens=max_tokens)
+        # Обрезанный по max_tokens ответ дополняется продолжениями (services/continuation.py)
+        completion = await complete_with_continuation(provider, messages, temperature=temperature, max_tokens=max_tokens)
         
-        # Извлекаем ответ из структуры DeepSeek API
-        if "choices" in data and len(data["choices"]) > 0:
-            choice = data["choices"][0]
-            response_content = choice["message"]["content"]
-            finish_reason = choice.get("finish_reason", "stop")
-            
-            # Инициализируем переменные для токенов
-            initial_usage = data.get("usage", {})
-            prompt_tokens = initial_usage.get("prompt_tokens", 0)
-            completion_tokens = initial_usage.get("completion_tokens", 0)
-            
-            # Если ответ обрезан из-за лимита токенов, запрашиваем продолжение
-            if finish_reason == "length":
-                logger.info("Response was truncated, requesting continuation...")
-                # Добавляем текущий ответ в контекст и запрашиваем продолжение
-                continuation_messages = messages + [
-                    {"role": "assistant", "content": response_content},
-                    {"role": "user", "content": "Продолжи ответ с того места, где остановился. Ответ должен быть полным."}
-                ]
-                
-                # Вычисляем доступные токены для продолжения
-                initial_total = initial_usage.get("total_tokens", 0)
-                max_total_tokens = max_tokens or MAX_TOKENS
-                remaining_tokens = max_total_tokens - initial_total
-                
-                if remaining_tokens > 100:  # Запрашиваем продолжение только если есть достаточно токенов
-                    continuation_max_tokens = min(remaining_tokens, 500)  # Ограничиваем продолжение
-                    continuation_data = await call_deepseek_api(
-                        continuation_messages, 
-                        temperature=temperature, 
-                        max_tokens=continuation_max_tokens
-                    )
-                    
-                    if "choices" in continuation_data and len(continuation_data["choices"]) > 0:
-                        continuation_content = continuation_data["choices"][0]["message"]["content"]
-                        response_content += continuation_content
-                        
-                        # Обновляем информацию о токенах
-                        if "usage" in continuation_data:
-                            continuation_usage = continuation_data["usage"]
-                            # Для продолжения prompt токены будут больше (включают предыдущий ответ)
-                            # Но completion токены - это только новые токены
-                            continuation_completion = continuation_usage.get("completion_tokens", 0)
-                            completion_tokens = completion_tokens + continuation_completion
-                            # Общий prompt остается примерно таким же (может немного увеличиться)
-                            prompt_tokens = continuation_usage.get("prompt_tokens", prompt_tokens)
+        if completion["content"] is not None:
+            response_content = completion["content"]
+            usage = completion["usage"]
+            record_usage("chat", template, usage)
             
             result = {"response": response_content}
+            if turn is not None:
+                await turn.add_reply(response_content)
+                result["conversation_id"] = turn.conversation.id
             
-            # Добавляем информацию о токенах
-            result["usage"] = {
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_tokens": prompt_tokens + completion_tokens
-            }
+            # Добавляем информацию о токенах (с попаданиями в кэш префикса)
+            result["usage"] = usage_response(usage)
+            result["segments"] = completion["segments"]
             
-            logger.info("Successfully received response from DeepSeek API")
+            logger.debug("Successfully received response from DeepSeek API")
             return result
         else:
-            logger.error(f"Unexpected response format: {data}")
+            logger.error(f"Unexpected response format: {completion['raw']}")
             raise HTTPException(status_code=500, detail="Unexpected response format from DeepSeek API")
                 
     except HTTPException:
+        await rollback_turn(turn)
         raise
     except Exception as e:
+        await rollback_turn(turn)
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
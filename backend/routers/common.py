@@ -0,0 +1,284 @@
+"""Общие модели и помощники для роутеров, работающих с LLM-провайдерами"""
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine, Optional, List, Dict, AsyncIterator
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, Field
+
+from backend.constants.prompts import LATEX_INSTRUCTION
+from backend.services import serialization
+from backend.services.conversations import Conversation, conversation_store
+from backend.services.metrics import record_llm_usage
+from backend.services.prompt_templates import PromptTemplate, prompt_registry
+
+logger = logging.getLogger(__name__)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ через services/serialization (orjson, если установлен); default_response_class приложения."""
+
+    def render(self, content: Any) -> bytes:
+        return serialization.dumps_bytes(content)
+
+
+class FastJSONRequest(Request):
+    """Запрос, тело которого разбирается через services/serialization."""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = serialization.loads(await self.body())
+        return self._json
+
+
+class FastJSONRoute(APIRoute):
+    """Маршрут с FastJSONRequest: route_class для роутеров, принимающих JSON-тела."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            return await handler(FastJSONRequest(request.scope, request.receive))
+
+        return route_handler
+
+
+# Идентификатор диалога на сервере (см. services/conversations.py)
+ConversationId = Field(None, min_length=1, max_length=64, pattern=r"^[A-Za-z0-9_-]+$")
+
+
+class CompletionRequest(BaseModel):
+    prompt: Optional[str] = None
+    system_prompt: Optional[str] = None
+    messages: Optional[List[Dict[str, str]]] = None
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    conversation_id: Optional[str] = ConversationId
+    # Шаблон из реестра (services/prompt_templates.py) вместо system_prompt;
+    # template_vars — значения полей шаблона сообщения пользователя
+    template: Optional[str] = None
+    template_vars: Optional[Dict[str, str]] = None
+    # Инструкция по LaTeX в конце system-сообщения (вариант шаблона "+latex")
+    latex: bool = False
+
+
+def resolve_template(request: CompletionRequest) -> Optional[PromptTemplate]:
+    """
+    Шаблон запроса: по имени (template) или по тексту system_prompt, если он
+    совпадает с зарегистрированным шаблоном; None — запрос без шаблона.
+    """
+    if request.template:
+        if request.system_prompt:
+            raise HTTPException(status_code=400, detail="Use either 'template' or 'system_prompt', not both")
+        try:
+            return prompt_registry.get(request.template, latex=request.latex)
+        except KeyError as e:
+            raise HTTPException(status_code=400, detail=e.args[0])
+    if request.system_prompt:
+        template = prompt_registry.match_system(request.system_prompt)
+        if template is not None and request.latex:
+            template = prompt_registry.get(template.name, latex=True)
+        return template
+    if request.latex:
+        return prompt_registry.get("latex")
+    return None
+
+
+def system_messages(request: CompletionRequest, template: Optional[PromptTemplate]) -> List[Dict[str, str]]:
+    """Начало списка сообщений: готовый префикс шаблона или system_prompt запроса."""
+    if template is not None:
+        return template.prefix()
+    if request.system_prompt:
+        content = request.system_prompt + LATEX_INSTRUCTION if request.latex else request.system_prompt
+        return [{"role": "system", "content": content}]
+    return []
+
+
+def uses_user_template(request: CompletionRequest, template: Optional[PromptTemplate]) -> bool:
+    """
+    Собирать ли сообщение пользователя по шаблону: только если шаблон назван явно
+    (template). Шаблон, найденный по тексту system_prompt, даёт лишь готовый
+    префикс — такие клиенты присылают уже собранный prompt.
+    """
+    return bool(request.template) and template is not None and template.user is not None
+
+
+def render_template_user(request: CompletionRequest, template: PromptTemplate) -> str:
+    """Сообщение пользователя по шаблону и template_vars запроса."""
+    try:
+        return template.render_user(request.template_vars or {})
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+
+
+def prepare_messages(request: CompletionRequest) -> List[Dict[str, str]]:
+    """
+    Подготовка сообщений из запроса
+    Отправляет только system_prompt и текущий запрос пользователя (без истории)
+
+    Args:
+        request: Запрос с промптом или сообщениями
+
+    Returns:
+        Список сообщений в формате для API (только system_prompt + текущий запрос)
+    """
+    template = resolve_template(request)
+    # Добавляем system_prompt (или префикс шаблона), если он есть
+    messages = system_messages(request, template)
+
+    # Определяем текущий запрос пользователя
+    user_content = None
+    if uses_user_template(request, template):
+        # Сообщение пользователя собирается по шаблону
+        user_content = render_template_user(request, template)
+    elif request.prompt:
+        # Если есть prompt, используем его
+        user_content = request.prompt
+    elif request.messages:
+        # Если есть messages, берем только последнее сообщение от пользователя
+        for msg in reversed(request.messages):
+            if isinstance(msg, dict) and msg.get("role") == "user":
+                user_content = msg.get("content")
+                break
+        # Если не нашли user сообщение, берем последнее сообщение
+        if not user_content and len(request.messages) > 0:
+            last_msg = request.messages[-1]
+            if isinstance(last_msg, dict):
+                user_content = last_msg.get("content", "")
+    else:
+        raise HTTPException(status_code=400, detail="Either 'prompt' or 'messages' must be provided")
+
+    # Добавляем только текущий запрос пользователя
+    if user_content:
+        messages.append({"role": "user", "content": user_content})
+    else:
+        raise HTTPException(status_code=400, detail="No user message found in request")
+
+    return messages
+
+
+def sse_response(chunks: AsyncIterator[str]) -> StreamingResponse:
+    """Оборачивает поток JSON-строк в Server-Sent Events ответ ("data: ...\\n\\n")."""
+    async def generate():
+        async for chunk in chunks:
+            yield f"data: {chunk}\n\n"
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
+
+@dataclass
+class ConversationTurn:
+    """
+    Ход в диалоге на сервере: новые сообщения уже дописаны, ответа ещё нет
+
+    Если ответ не получен, ход отменяется (rollback): иначе история закончится
+    сообщением без ответа, а повтор запроса клиентом продублирует его.
+    """
+    conversation: Conversation
+    start: int  # сколько сообщений было в диалоге до хода
+    created: bool  # диалог создан этим запросом (из seed)
+    new_messages: List[Dict[str, str]]
+
+    async def add_reply(self, content: str) -> None:
+        await conversation_store.append(self.conversation, [{"role": "assistant", "content": content}])
+
+    async def rollback(self) -> None:
+        if self.created:
+            # Повтор запроса с тем же seed снова создаст диалог
+            await conversation_store.delete(self.conversation.id)
+            return
+        if self.conversation.messages[self.start:] != self.new_messages:
+            logger.warning(f"Conversation {self.conversation.id} changed during the turn, not rolling back")
+            return
+        await conversation_store.truncate(self.conversation, self.start)
+
+
+async def rollback_turn(turn: Optional[ConversationTurn]) -> None:
+    """Отменяет ход диалога (None — запрос без conversation_id или диалог не открыт)."""
+    if turn is not None:
+        await turn.rollback()
+
+
+async def open_conversation(
+    conversation_id: str,
+    new_messages: List[Dict[str, str]],
+    seed: Optional[List[Dict[str, str]]] = None,
+) -> ConversationTurn:
+    """
+    Диалог на сервере с дописанными новыми сообщениями
+
+    Для неизвестного conversation_id диалог создаётся из seed — полной истории,
+    которую клиент присылает один раз; дальше достаточно нового сообщения.
+    Ответ дописывается через add_reply; при ошибке ход отменяется через rollback.
+    """
+    conversation = await conversation_store.get(conversation_id)
+    if conversation is None:
+        if seed is None:
+            raise HTTPException(status_code=404, detail=f"Conversation '{conversation_id}' not found")
+        conversation = await conversation_store.create(seed + new_messages, conversation_id=conversation_id)
+        return ConversationTurn(conversation, 0, True, conversation.messages[len(seed):])
+    if seed is not None:
+        raise HTTPException(status_code=409, detail="Conversation already exists: send only the new message")
+    if not new_messages:
+        raise HTTPException(status_code=400, detail="New message is required for an existing conversation")
+    start = len(conversation.messages)
+    await conversation_store.append(conversation, new_messages)
+    return ConversationTurn(conversation, start, False, conversation.messages[start:])
+
+
+async def record_reply(chunks: AsyncIterator[str], turn: ConversationTurn) -> AsyncIterator[str]:
+    """
+    Пропускает поток {"content": ...} и после его окончания дописывает ответ ассистента
+    в диалог; если пришла ошибка ({"error": ...}) или ответ пустой, ход отменяется.
+    """
+    parts = []
+    failed = False
+    try:
+        async for chunk in chunks:
+            if chunk.startswith('{"content"'):
+                parts.append(serialization.loads(chunk).get("content") or "")
+            elif chunk.startswith('{"error"'):
+                failed = True
+            yield chunk
+    except Exception:
+        await turn.rollback()
+        raise
+    if parts and not failed:
+        await turn.add_reply("".join(parts))
+    else:
+        await turn.rollback()
+
+
+def record_usage(endpoint: str, template: Optional[PromptTemplate], usage: Optional[Dict[str, Any]]) -> None:
+    """Учитывает usage ответа в статистике шаблона и в llm_tokens_total по endpoint-у."""
+    prompt_registry.record_usage(template, usage)
+    record_llm_usage(endpoint, template.name if template is not None else None, usage)
+
+
+async def record_stream_usage(
+    chunks: AsyncIterator[str], endpoint: str, template: Optional[PromptTemplate] = None
+) -> AsyncIterator[str]:
+    """Пропускает поток и учитывает usage из финального события {"finish_reason": ...} (см. record_usage)."""
+    async for chunk in chunks:
+        if chunk.startswith('{"finish_reason"'):
+            record_usage(endpoint, template, serialization.loads(chunk).get("usage"))
+        yield chunk
+
+
+def usage_response(usage: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Поле usage ответа API: токены запроса и ответа, а также попадания в кэш
+    префикса DeepSeek (prompt_cache_hit_tokens / prompt_cache_miss_tokens), если они есть.
+    """
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0)
+    result = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+    for key in ("prompt_cache_hit_tokens", "prompt_cache_miss_tokens"):
+        if key in usage:
+            result[key] = usage[key]
+    return result
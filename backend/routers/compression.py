@@ -1,24 +1,38 @@
 """Роутер для тестирования сжатия истории диалога"""
-import json
 import logging
-from typing import Optional, List, Dict
+from typing import Literal, Optional, List, Dict, Tuple
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from backend.services.deepseek_api import call_deepseek_api, stream_deepseek_api
+from backend.routers.common import (
+    ConversationId, ConversationTurn, FastJSONRoute, open_conversation, record_reply, record_stream_usage,
+    record_usage, rollback_turn, usage_response,
+)
+from backend.services.conversations import Conversation, conversation_store
+from backend.services.compression_layout import DEFAULT_LAYOUT, StableHistory, stable_history
+from backend.services.continuation import complete_with_continuation, stream_with_continuation
+from backend.services.history import HistoryBuilder, estimate_message_tokens, estimate_tokens
+from backend.services.llm_providers import get_provider
+from backend.services.serialization import dumps
 from backend.services.summaries_db import save_summary
-from backend.config import MAX_TOKENS
+from backend.services.tracing import span, traced
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/compression", tags=["compression"])
+router = APIRouter(prefix="/api/compression", tags=["compression"], route_class=FastJSONRoute)
 
 
 class CompressionRequest(BaseModel):
-    messages: List[Dict[str, str]]
+    # Либо вся история (messages), либо conversation_id и новое сообщение (message);
+    # messages вместе с новым conversation_id переносят историю на сервер
+    messages: Optional[List[Dict[str, str]]] = None
+    conversation_id: Optional[str] = ConversationId
+    message: Optional[Dict[str, str]] = None
     temperature: Optional[float] = None
     max_tokens: Optional[int] = None
+    # Раскладка сжатой истории (services/compression_layout.py); по умолчанию COMPRESSION_LAYOUT
+    layout: Optional[Literal["rolling", "stable"]] = None
 
 
 class SummarizeRequest(BaseModel):
@@ -26,30 +40,15 @@ class SummarizeRequest(BaseModel):
 
 
 def _estimate_tokens(text: str) -> int:
-    """
-    Приблизительная оценка количества токенов в тексте
-    Для русского текста: примерно 1 токен = 2.5 символа
-    Для английского: примерно 1 токен = 4 символа
-    Используем среднее значение: 1 токен = 3 символа
-    """
-    if not text:
-        return 0
-    # Базовое правило: примерно 1 токен на 3 символа
-    # Добавляем небольшой запас для знаков препинания и пробелов
-    return max(1, len(text) // 3)
+    """Приблизительная оценка количества токенов в тексте (см. services/history.py)"""
+    return estimate_tokens(text)
 
 
 def _estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
     """
     Приблизительная оценка токенов для списка сообщений
     """
-    total = 0
-    for msg in messages:
-        content = msg.get("content", "")
-        role = msg.get("role", "")
-        # Добавляем токены для роли и форматирования
-        total += _estimate_tokens(role) + _estimate_tokens(content) + 4  # +4 для форматирования сообщения
-    return total
+    return sum(map(estimate_message_tokens, messages))
 
 
 def _create_summary_prompt(messages: List[Dict[str, str]]) -> str:
@@ -62,35 +61,17 @@ def _create_summary_prompt(messages: List[Dict[str, str]]) -> str:
     Returns:
         Промпт для суммаризации
     """
-    # Формируем текст истории
-    history_text = ""
-    for msg in messages:
-        role = msg.get("role", "unknown")
-        content = msg.get("content", "")
-        if role == "user":
-            history_text += f"Пользователь: {content}\n\n"
-        elif role == "assistant":
-            history_text += f"Ассистент: {content}\n\n"
-        elif role == "system":
-            history_text += f"Система: {content}\n\n"
-    
-    prompt = f"""Создай краткую суммаризацию следующего диалога, сохраняя ключевую информацию, контекст и важные детали. 
-Суммаризация должна быть достаточно подробной, чтобы ассистент мог продолжить диалог естественным образом.
-
-Диалог:
-{history_text}
-
-Суммаризация:"""
-    
-    return prompt
+    return HistoryBuilder(messages).summary_prompt()
 
 
-async def summarize_messages(messages: List[Dict[str, str]]) -> str:
+@traced("compression.summarize")
+async def summarize_messages(messages: List[Dict[str, str]], history: Optional[HistoryBuilder] = None) -> str:
     """
     Суммаризирует список сообщений
     
     Args:
         messages: Список сообщений для суммаризации
+        history: Уже собранная по этим сообщениям история (чтобы не проходить их повторно)
     
     Returns:
         Текст суммаризации
@@ -98,7 +79,7 @@ async def summarize_messages(messages: List[Dict[str, str]]) -> str:
     if not messages:
         return ""
     
-    summary_prompt = _create_summary_prompt(messages)
+    summary_prompt = (history or HistoryBuilder(messages)).summary_prompt()
     
     api_messages = [
         {
@@ -112,20 +93,82 @@ async def summarize_messages(messages: List[Dict[str, str]]) -> str:
     ]
     
     try:
-        data = await call_deepseek_api(api_messages, temperature=0.3, max_tokens=500)
+        completion = await get_provider("deepseek").complete(api_messages, temperature=0.3, max_tokens=500)
         
-        if "choices" in data and len(data["choices"]) > 0:
-            summary = data["choices"][0]["message"]["content"]
-            logger.info(f"Created summary of {len(messages)} messages, summary length: {len(summary)}")
+        if completion["content"] is not None:
+            record_usage("summarize", None, completion["usage"])
+            summary = completion["content"]
+            logger.debug(f"Created summary of {len(messages)} messages, summary length: {len(summary)}")
             return summary
         else:
-            logger.error(f"Unexpected response format: {data}")
+            logger.error(f"Unexpected response format: {completion['raw']}")
             raise HTTPException(status_code=500, detail="Unexpected response format from DeepSeek API")
     except Exception as e:
         logger.error(f"Error summarizing messages: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error summarizing messages: {str(e)}")
 
 
+def _summary_message(summary: str, count: int) -> Dict[str, str]:
+    """Системное сообщение, заменяющее первые count сообщений истории"""
+    return {
+        "role": "system",
+        "content": f"Суммаризация предыдущего диалога ({count} сообщений):\n{summary}"
+    }
+
+
+async def _request_history(request: CompressionRequest) -> Tuple[List[Dict[str, str]], Optional[ConversationTurn]]:
+    """
+    История для запроса и ход диалога на сервере (если передан conversation_id);
+    при ошибке ход нужно отменить (rollback_turn)
+    """
+    if not request.conversation_id:
+        if request.messages is None:
+            raise HTTPException(status_code=400, detail="Either messages or conversation_id is required")
+        return request.messages.copy(), None
+    new_messages = [request.message] if request.message else []
+    turn = await open_conversation(request.conversation_id, new_messages, request.messages)
+    return list(turn.conversation.messages), turn
+
+
+async def _rolling_summary(conversation: Conversation, point: int) -> str:
+    """
+    Накопительная суммаризация первых point сообщений диалога
+    
+    Модели отправляются только прошлая суммаризация и сообщения, появившиеся
+    после неё; если новых сообщений в суммаризируемой части нет, сохранённая
+    суммаризация используется без обращения к LLM.
+    """
+    if conversation.summary is not None and conversation.summarized_count >= point:
+        return conversation.summary
+    
+    messages_to_summarize = conversation.messages[conversation.summarized_count:point]
+    if conversation.summary is not None:
+        messages_to_summarize = [_summary_message(conversation.summary, conversation.summarized_count)] + messages_to_summarize
+    
+    summary_text = await summarize_messages(messages_to_summarize)
+    with span("compression.save_summary"):
+        save_summary(summary_text)
+    await conversation_store.set_summary(conversation, summary_text, point)
+    return summary_text
+
+
+async def _summarize_block(messages: List[Dict[str, str]]) -> str:
+    """Суммаризация блока истории для раскладки stable (сохраняется в БД, как и обычная)"""
+    summary_text = await summarize_messages(messages)
+    with span("compression.save_summary"):
+        save_summary(summary_text)
+    return summary_text
+
+
+def _stable_info(stable: StableHistory) -> Dict[str, int]:
+    """Поля ответа о раскладке stable: сколько сообщений заморожено и размер неизменного префикса"""
+    return {
+        "frozen_message_count": stable.frozen_count,
+        "new_block_summaries": stable.created,
+        "stable_prefix_tokens": stable.prefix_tokens,
+    }
+
+
 def compress_history(messages: List[Dict[str, str]], compression_threshold: int = 10) -> List[Dict[str, str]]:
     """
     Сжимает историю диалога, заменяя старые сообщения на summary
@@ -159,7 +202,7 @@ def compress_history(messages: List[Dict[str, str]], compression_threshold: int
 async def summarize(request: SummarizeRequest):
     """Endpoint для суммаризации списка сообщений"""
     try:
-        logger.info(f"Received summarize request for {len(request.messages)} messages")
+        logger.debug(f"Received summarize request for {len(request.messages)} messages")
         
         summary = await summarize_messages(request.messages)
         
@@ -177,22 +220,36 @@ async def summarize(request: SummarizeRequest):
 @router.post("/chat")
 async def chat_with_history(request: CompressionRequest):
     """Endpoint для чата с поддержкой истории и автоматической суммаризации"""
+    turn = None
     try:
-        logger.info(f"Received chat request with {len(request.messages)} messages in history")
+        messages, turn = await _request_history(request)
+        conversation = turn.conversation if turn is not None else None
+        logger.debug(f"Received chat request with {len(messages)} messages in history")
         
-        messages = request.messages.copy()
+        provider = get_provider("deepseek")
         temperature = request.temperature if request.temperature is not None else 0.7
         max_tokens = request.max_tokens
         
         # Проверяем, нужно ли делать суммаризацию (каждые 10 сообщений)
         compression_threshold = 10
         needs_compression = len(messages) >= compression_threshold
+        layout = request.layout or DEFAULT_LAYOUT
         
         compressed_messages = []
         summary_created = False
         summary_text = ""
+        # Текст истории для суммаризации и оценка токенов собираются за один проход
+        history = HistoryBuilder()
+        summarized_tokens = 0
+        stable = None
         
-        if needs_compression:
+        if layout == "stable":
+            # Замороженные суммаризации блоков по compression_threshold сообщений
+            stable = await stable_history(messages, _summarize_block, compression_threshold)
+            compressed_messages = stable.messages
+            summary_created = stable.frozen_count > 0
+            summary_text = stable.summary_text
+        elif needs_compression:
             # Подсчитываем, сколько раз нужно сжать (каждые 10 сообщений)
             messages_to_summarize = []
             remaining_messages = []
@@ -203,80 +260,49 @@ async def chat_with_history(request: CompressionRequest):
                 messages_to_summarize = messages[:last_compression_point]
                 remaining_messages = messages[last_compression_point:]
                 
-                summary_text = await summarize_messages(messages_to_summarize)
+                if conversation is not None:
+                    summarized_tokens = conversation.tokens - _estimate_messages_tokens(remaining_messages)
+                    summary_text = await _rolling_summary(conversation, last_compression_point)
+                else:
+                    history.extend(messages_to_summarize)
+                    summarized_tokens = history.tokens
+                    summary_text = await summarize_messages(messages_to_summarize, history)
+                    with span("compression.save_summary"):
+                        save_summary(summary_text)
                 summary_created = True
-                save_summary(summary_text)
                 
-                compressed_messages = [
-                    {
-                        "role": "system",
-                        "content": f"Суммаризация предыдущего диалога ({len(messages_to_summarize)} сообщений):\n{summary_text}"
-                    }
-                ] + remaining_messages
+                compressed_messages = [_summary_message(summary_text, len(messages_to_summarize))] + remaining_messages
             else:
                 compressed_messages = messages
         else:
             compressed_messages = messages
         
-        # Подсчитываем токены до компрессии
-        tokens_before_compression = _estimate_messages_tokens(messages)
+        # Подсчитываем токены до компрессии (суммаризированная часть уже учтена;
+        # для диалога на сервере оценка хранится вместе с ним)
+        if conversation is not None:
+            tokens_before_compression = conversation.tokens
+        else:
+            history.extend(messages[history.count:])
+            tokens_before_compression = history.tokens
         
         # Отправляем запрос с полной историей (сжатой или нет)
-        logger.info(f"Sending request with {len(compressed_messages)} messages (compressed: {summary_created})")
+        logger.debug(f"Sending request with {len(compressed_messages)} messages (compressed: {summary_created})")
         
-        data = await call_deepseek_api(compressed_messages, temperature=temperature, max_tokens=max_tokens)
+        completion = await complete_with_continuation(
+            provider, compressed_messages, temperature=temperature, max_tokens=max_tokens
+        )
         
-        # Подсчитываем токены после компрессии
-        tokens_after_compression = _estimate_messages_tokens(compressed_messages)
+        # Подсчитываем токены после компрессии: summary вместо суммаризированных сообщений
+        tokens_after_compression = tokens_before_compression
+        if stable is not None:
+            tokens_after_compression = stable.tokens
+        elif summary_created:
+            tokens_after_compression += estimate_message_tokens(compressed_messages[0]) - summarized_tokens
         
-        if "choices" in data and len(data["choices"]) > 0:
-            choice = data["choices"][0]
-            response_content = choice["message"]["content"]
-            finish_reason = choice.get("finish_reason", "stop")
-            
-            # Если ответ обрезан из-за лимита токенов, запрашиваем продолжение
-            if finish_reason == "length":
-                logger.info("Response was truncated, requesting continuation...")
-                # Добавляем текущий ответ в контекст и запрашиваем продолжение
-                continuation_messages = compressed_messages + [
-                    {"role": "assistant", "content": response_content},
-                    {"role": "user", "content": "Продолжи ответ с того места, где остановился. Ответ должен быть полным."}
-                ]
-                
-                # Вычисляем оставшиеся токены для продолжения
-                initial_usage = data.get("usage", {})
-                initial_total = initial_usage.get("total_tokens", 0)
-                max_total_tokens = max_tokens or MAX_TOKENS
-                remaining_tokens = max_total_tokens - initial_total
-                
-                if remaining_tokens > 100:  # Запрашиваем продолжение только если есть достаточно токенов
-                    continuation_max_tokens = min(remaining_tokens, 500)  # Ограничиваем продолжение
-                    continuation_data = await call_deepseek_api(
-                        continuation_messages, 
-                        temperature=temperature, 
-                        max_tokens=continuation_max_tokens
-                    )
-                    
-                    if "choices" in continuation_data and len(continuation_data["choices"]) > 0:
-                        continuation_content = continuation_data["choices"][0]["message"]["content"]
-                        response_content += continuation_content
-                        
-                        # Обновляем информацию о токенах
-                        if "usage" in continuation_data:
-                            continuation_usage = continuation_data["usage"]
-                            initial_completion = initial_usage.get("completion_tokens", 0)
-                            continuation_completion = continuation_usage.get("completion_tokens", 0)
-                            completion_tokens = initial_completion + continuation_completion
-                            prompt_tokens = continuation_usage.get("prompt_tokens", initial_usage.get("prompt_tokens", 0))
-                        else:
-                            prompt_tokens = initial_usage.get("prompt_tokens", 0)
-                            completion_tokens = initial_usage.get("completion_tokens", 0)
-                else:
-                    prompt_tokens = initial_usage.get("prompt_tokens", 0)
-                    completion_tokens = initial_usage.get("completion_tokens", 0)
-            else:
-                prompt_tokens = data.get("usage", {}).get("prompt_tokens", 0)
-                completion_tokens = data.get("usage", {}).get("completion_tokens", 0)
+        if completion["content"] is not None:
+            response_content = completion["content"]
+            usage = completion["usage"]
+            record_usage("compression_chat" if stable is None else "compression_chat_stable", None, usage)
             
             result = {
                 "response": response_content,
@@ -286,25 +312,31 @@ async def chat_with_history(request: CompressionRequest):
                 "summary": summary_text if summary_created else None,
                 "tokens_before_compression": tokens_before_compression,
                 "tokens_after_compression": tokens_after_compression,
-                "tokens_saved": tokens_before_compression - tokens_after_compression if summary_created else 0
+                "tokens_saved": tokens_before_compression - tokens_after_compression if summary_created else 0,
+                "layout": layout,
             }
+            if stable is not None:
+                result.update(_stable_info(stable))
             
-            # Добавляем информацию о токенах
-            result["usage"] = {
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_tokens": prompt_tokens + completion_tokens
-            }
+            # Добавляем информацию о токенах (с попаданиями в кэш префикса)
+            result["usage"] = usage_response(usage)
+            result["segments"] = completion["segments"]
             
-            logger.info("Successfully received response from DeepSeek API")
+            if turn is not None:
+                await turn.add_reply(response_content)
+                result["conversation_id"] = conversation.id
+            
+            logger.debug("Successfully received response from DeepSeek API")
             return result
         else:
-            logger.error(f"Unexpected response format: {data}")
+            logger.error(f"Unexpected response format: {completion['raw']}")
             raise HTTPException(status_code=500, detail="Unexpected response format from DeepSeek API")
                 
     except HTTPException:
+        await rollback_turn(turn)
         raise
     except Exception as e:
+        await rollback_turn(turn)
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -312,57 +344,88 @@ async def chat_with_history(request: CompressionRequest):
 @router.post("/chat/stream")
 async def chat_with_history_stream(request: CompressionRequest):
     """Streaming endpoint для чата с поддержкой истории и автоматической суммаризации"""
+    turn = None
     try:
-        logger.info(f"Received streaming chat request with {len(request.messages)} messages in history")
+        messages, turn = await _request_history(request)
+        conversation = turn.conversation if turn is not None else None
+        logger.debug(f"Received streaming chat request with {len(messages)} messages in history")
         
-        messages = request.messages.copy()
         temperature = request.temperature if request.temperature is not None else 0.7
         max_tokens = request.max_tokens
         
         # Проверяем, нужно ли делать суммаризацию (каждые 10 сообщений)
         compression_threshold = 10
         needs_compression = len(messages) >= compression_threshold
+        layout = request.layout or DEFAULT_LAYOUT
         
         compressed_messages = []
         summary_created = False
         summary_text = ""
+        stable = None
         
-        if needs_compression:
+        if layout == "stable":
+            stable = await stable_history(messages, _summarize_block, compression_threshold)
+            compressed_messages = stable.messages
+            summary_created = stable.frozen_count > 0
+            summary_text = stable.summary_text
+        elif needs_compression:
             last_compression_point = (len(messages) // compression_threshold) * compression_threshold
             
             if last_compression_point > 0:
                 messages_to_summarize = messages[:last_compression_point]
                 remaining_messages = messages[last_compression_point:]
                 
-                summary_text = await summarize_messages(messages_to_summarize)
+                if conversation is not None:
+                    summary_text = await _rolling_summary(conversation, last_compression_point)
+                else:
+                    summary_text = await summarize_messages(messages_to_summarize)
+                    with span("compression.save_summary"):
+                        save_summary(summary_text)
                 summary_created = True
-                save_summary(summary_text)
                 
-                compressed_messages = [
-                    {
-                        "role": "system",
-                        "content": f"Суммаризация предыдущего диалога ({len(messages_to_summarize)} сообщений):\n{summary_text}"
-                    }
-                ] + remaining_messages
+                compressed_messages = [_summary_message(summary_text, len(messages_to_summarize))] + remaining_messages
             else:
                 compressed_messages = messages
         else:
             compressed_messages = messages
         
-        logger.info(f"Streaming with {len(compressed_messages)} messages (compressed: {summary_created})")
+        logger.debug(f"Streaming with {len(compressed_messages)} messages (compressed: {summary_created})")
+        
+        compression_info = {
+            'type': 'compression_info',
+            'compressed': summary_created,
+            'original_count': len(messages),
+            'compressed_count': len(compressed_messages),
+            'summary': summary_text if summary_created else None,
+            'layout': layout,
+        }
+        if stable is not None:
+            compression_info.update(_stable_info(stable))
+        if conversation is not None:
+            compression_info['conversation_id'] = conversation.id
         
         async def generate():
             # Отправляем информацию о сжатии
-            yield f"data: {json.dumps({'type': 'compression_info', 'compressed': summary_created, 'original_count': len(messages), 'compressed_count': len(compressed_messages), 'summary': summary_text if summary_created else None})}\n\n"
+            yield f"data: {dumps(compression_info)}\n\n"
             
-            async for chunk in stream_deepseek_api(compressed_messages, temperature=temperature, max_tokens=max_tokens):
+            chunks = stream_with_continuation(
+                get_provider("deepseek"), compressed_messages, temperature=temperature, max_tokens=max_tokens
+            )
+            chunks = record_stream_usage(
+                chunks, "compression_chat_stream" if stable is None else "compression_chat_stream_stable"
+            )
+            if turn is not None:
+                chunks = record_reply(chunks, turn)
+            async for chunk in chunks:
                 yield f"data: {chunk}\n\n"
         
         return StreamingResponse(generate(), media_type="text/event-stream")
         
     except HTTPException:
+        await rollback_turn(turn)
         raise
     except Exception as e:
+        await rollback_turn(turn)
         logger.error(f"Unexpected error in streaming: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -0,0 +1,41 @@
+"""Роутер для диалогов, хранящихся на сервере (conversation_id вместо всей истории)."""
+import logging
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from backend.routers.common import FastJSONRoute
+from backend.services.conversations import conversation_store
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/conversations", tags=["conversations"], route_class=FastJSONRoute)
+
+
+class CreateConversationRequest(BaseModel):
+    messages: Optional[List[Dict[str, str]]] = None
+
+
+@router.post("")
+async def create_conversation(request: CreateConversationRequest):
+    """Создаёт диалог (при необходимости — с уже накопленной историей) и возвращает его id."""
+    conversation = await conversation_store.create(request.messages or [])
+    return {"conversation_id": conversation.id, "message_count": len(conversation.messages)}
+
+
+@router.get("/{conversation_id}")
+async def get_conversation(conversation_id: str):
+    """История, суммаризация и оценка токенов диалога."""
+    conversation = await conversation_store.get(conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail=f"Conversation '{conversation_id}' not found")
+    return conversation.to_dict()
+
+
+@router.delete("/{conversation_id}")
+async def delete_conversation(conversation_id: str):
+    """Удаляет диалог."""
+    if not await conversation_store.delete(conversation_id):
+        raise HTTPException(status_code=404, detail=f"Conversation '{conversation_id}' not found")
+    return {"status": "ok"}
@@ -1,14 +1,20 @@
 """Роутер для работы с MCP серверами"""
 import logging
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List
 
-from backend.services.mcp_client import list_mcp_tools, call_mcp_tool
+from backend.routers.common import FastJSONRoute
+from backend.services.mcp_client import list_mcp_tools, call_mcp_tool, call_mcp_tools
+from backend.services.mcp_resolver import launch_specs
+from backend.services.mcp_servers import mcp_servers
+from backend.services.serialization import dumps
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/mcp", tags=["mcp"])
+router = APIRouter(prefix="/api/mcp", tags=["mcp"], route_class=FastJSONRoute)
 
 
 class MCPListRequest(BaseModel):
@@ -28,7 +34,7 @@ async def list_tools(request: MCPListRequest):
         Информация о сервере и его инструментах
     """
     try:
-        logger.info(f"Listing tools from MCP server: {request.server_name} with locale: {request.locale}")
+        logger.debug(f"Listing tools from MCP server: {request.server_name} with locale: {request.locale}")
         
         result = await list_mcp_tools(request.server_name, locale=request.locale or "ru-RU")
         
@@ -53,7 +59,7 @@ async def list_tools_get(server_name: str, summary: bool = False, locale: str =
         Информация о сервере и его инструментах
     """
     try:
-        logger.info(f"Listing tools from MCP server: {server_name} with locale: {locale}")
+        logger.debug(f"Listing tools from MCP server: {server_name} with locale: {locale}")
         
         result = await list_mcp_tools(server_name, locale=locale)
         
@@ -112,7 +118,7 @@ async def call_tool(request: MCPCallToolRequest):
         Результат вызова (content, isError и т.д.)
     """
     try:
-        logger.info(
+        logger.debug(
             f"Calling MCP tool: server={request.server_name}, "
             f"tool={request.tool_name}, args={request.arguments}"
         )
@@ -126,3 +132,70 @@ async def call_tool(request: MCPCallToolRequest):
     except Exception as e:
         logger.error(f"Error calling MCP tool: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+class MCPToolInvocation(BaseModel):
+    """Один вызов инструмента в составе /call-tools"""
+    server_name: str = "mcp-weather"
+    tool_name: str
+    arguments: Dict[str, Any] = {}
+
+
+class MCPCallToolsRequest(BaseModel):
+    """Запрос на параллельный вызов нескольких инструментов"""
+    calls: List[MCPToolInvocation] = Field(..., min_length=1, max_length=32)
+    locale: Optional[str] = "ru-RU"
+
+
+@router.post("/call-tools")
+async def call_tools(request: MCPCallToolsRequest):
+    """
+    Параллельный вызов нескольких инструментов (например, погода в 5 городах).
+    
+    Args:
+        request: calls (server_name, tool_name, arguments) и locale
+    
+    Returns:
+        NDJSON: по строке на вызов в порядке завершения
+        ({"index", "server_name", "tool_name", "elapsed_ms", "result" | "error"})
+    """
+    invocations = [call.model_dump() for call in request.calls]
+
+    async def generate():
+        async for outcome in call_mcp_tools(invocations, locale=request.locale or "ru-RU"):
+            yield dumps(jsonable_encoder(outcome)) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@router.get("/resolver")
+async def resolver_state():
+    """
+    Закэшированные команды запуска stdio MCP-серверов (LaunchSpec)
+    
+    Returns:
+        ttl и список записей: команда, аргументы, env, npm cache, возраст и время до истечения
+    """
+    return {"ttl_seconds": launch_specs.ttl, "entries": launch_specs.snapshot()}
+
+
+@router.delete("/resolver")
+async def resolver_invalidate(server_name: Optional[str] = None):
+    """
+    Сброс кэша команд запуска (для одного сервера или для всех)
+    
+    Args:
+        server_name: Имя сервера; если не задано, сбрасываются все записи
+    """
+    return {"invalidated": launch_specs.invalidate(server_name)}
+
+
+@router.get("/servers")
+async def servers_state():
+    """
+    Реестр MCP-серверов: транспорт, команда/URL, размер пула и результат прогрева
+    
+    Returns:
+        Список серверов из MCP_SERVERS_CONFIG (и mcp-weather при MCP_USE_HTTP)
+    """
+    return {"servers": mcp_servers.snapshot()}
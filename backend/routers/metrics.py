@@ -0,0 +1,15 @@
+"""Роутер для метрик в формате Prometheus"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from backend.services.metrics import REGISTRY
+
+router = APIRouter(tags=["metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Метрики приложения (латентность маршрутов, upstream LLM, MCP, кэши)"""
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,15 @@
+"""Роутер для реестра шаблонов промптов."""
+import logging
+from fastapi import APIRouter
+
+from backend.services.prompt_templates import prompt_registry
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/prompts", tags=["prompts"])
+
+
+@router.get("/templates")
+def list_templates():
+    """Шаблоны: отпечаток префикса, его размер в токенах, поля и статистика попаданий в кэш DeepSeek."""
+    return {"templates": [template.to_dict() for template in prompt_registry.templates()]}
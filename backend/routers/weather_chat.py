@@ -1,17 +1,22 @@
 """Роутер для обработки чата о погоде с использованием MCP сервера"""
+import asyncio
 import logging
-import re
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from backend.routers.common import FastJSONRoute, record_stream_usage, record_usage, sse_response
+from backend.services.continuation import complete_with_continuation, stream_with_continuation
 from backend.services.mcp_client import call_mcp_tool, list_mcp_tools, _call_mcp_via_http
-from backend.services.deepseek_api import call_deepseek_api
-from backend.config import MCP_WEATHER_SERVER_URL, MCP_USE_HTTP
+from backend.services.llm_providers import LLMProvider, get_provider
+from backend.services.serialization import dumps
+from backend.services.tracing import span, traced
+from backend.services.weather_intent import intent_memo
+from backend.config import MCP_WEATHER_SERVER_URL, MCP_USE_HTTP, WEATHER_MCP_DEADLINE_MS, WEATHER_FALLBACK_HEDGE_MS
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/weather-chat", tags=["weather-chat"])
+router = APIRouter(prefix="/api/weather-chat", tags=["weather-chat"], route_class=FastJSONRoute)
 
 # Имя MCP сервера погоды
 WEATHER_MCP_SERVER = "mcp-weather"
@@ -25,115 +30,20 @@ class WeatherChatRequest(BaseModel):
 
 def _extract_weather_intent(prompt: str) -> Optional[Dict[str, Any]]:
     """
-    Извлекает намерение пользователя из запроса о погоде
+    Извлекает намерение пользователя из запроса о погоде (см. services/weather_intent.py)
+    
+    Место уточняется по справочнику городов; canonical_location — стабильное
+    название города (не зависит от падежа и языка, его получает MCP сервер)
+    или None. Результаты для повторяющихся запросов берутся из LRU-кэша
+    (WEATHER_INTENT_CACHE_SIZE).
     
     Returns:
         Словарь с информацией о намерении или None
     """
-    prompt_lower = prompt.lower()
-    
-    # Расширенный список ключевых слов для определения запросов о погоде
-    weather_keywords = [
-        "погода", "weather", "температура", "temperature", "temp", 
-        "дождь", "rain", "дожд", "raining", "rainy",
-        "снег", "snow", "снеж", "snowing", "snowy",
-        "ветер", "wind", "ветр", "windy",
-        "прогноз", "forecast", "прогноз погоды", "weather forecast",
-        "облачно", "cloudy", "облака", "clouds",
-        "солнечно", "sunny", "солнце", "sun",
-        "туман", "fog", "туманно", "foggy",
-        "град", "hail", "гроза", "thunderstorm",
-        "влажность", "humidity", "давление", "pressure",
-        "осадки", "precipitation", "осадк",
-        "климат", "climate", "метео", "meteo"
-    ]
-    
-    # Проверяем, есть ли запрос о погоде
-    if not any(keyword in prompt_lower for keyword in weather_keywords):
-        return None
-    
-    intent = {
-        "type": None,
-        "location": None,
-        "days": 3
-    }
-    
-    # Определяем тип запроса
-    if any(word in prompt_lower for word in ["прогноз", "forecast", "на несколько дней", "на неделю"]):
-        intent["type"] = "forecast"
-        # Извлекаем количество дней
-        days_match = re.search(r'(\d+)\s*(?:дн|day|день|дня|дней)', prompt_lower)
-        if days_match:
-            intent["days"] = min(int(days_match.group(1)), 7)
-    else:
-        intent["type"] = "current"
-    
-    # Извлекаем местоположение
-    # Упрощенная и более надежная логика извлечения
-    # Список слов для исключения
-    exclude_words = [
-        "какая", "какой", "какое", "какие", "the", "a", "an", "в", "для", "for",
-        "на", "по", "с", "о", "об", "про", "как", "что", "где", "когда",
-        "расскажи", "скажи", "покажи", "tell", "show", "say", "погода", "weather"
-    ]
-    
-    # Метод 1: Ищем паттерн "в [название города]" - самый частый случай
-    # Ищем "в" или "in", затем слова до конца строки или знака препинания
-    # Берем до 3 слов (для названий типа "Санкт-Петербург", "Нью-Йорк")
-    pattern_v = r'\b(?:в|in)\s+((?:[А-ЯЁа-яёA-Za-z][А-ЯЁа-яёA-Za-z\-]*\s*){1,3})(?:\s|$|,|\.|\?|!|;|:)'
-    match = re.search(pattern_v, prompt, re.IGNORECASE)
-    if match:
-        location = match.group(1).strip().rstrip('.,!?;:()[]{}"\'')
-        location_words = location.split()
-        # Фильтруем стоп-слова из начала
-        filtered_words = []
-        for word in location_words:
-            word_clean = word.strip('.,!?;:()[]{}"\'')
-            if word_clean.lower() not in exclude_words:
-                filtered_words.append(word_clean)
-            else:
-                break  # Если встретили стоп-слово, останавливаемся
-        
-        if filtered_words:
-            location = ' '.join(filtered_words)
-            location_lower = location.lower()
-            # Проверяем, что это не исключенное слово и имеет достаточную длину
-            if (location and len(location) > 2 and 
-                location_lower not in exclude_words):
-                # Приводим к правильному регистру (каждое слово с заглавной буквы)
-                location = ' '.join(word.capitalize() for word in location.split())
-                intent["location"] = location
-                logger.info(f"Extracted location (method 1 - 'в'): {location} from prompt: {prompt}")
-    
-    # Метод 2: Если не нашли через "в", ищем паттерн "[название города] погода"
-    if not intent["location"]:
-        pattern_city_first = r'([А-ЯЁа-яёA-Za-z][А-ЯЁа-яёA-Za-z\s\-]+?)\s+(?:погода|weather|прогноз|forecast)'
-        match = re.search(pattern_city_first, prompt, re.IGNORECASE)
-        if match:
-            location = match.group(1).strip().rstrip('.,!?;:()[]{}"\'')
-            location_lower = location.lower()
-            if (location and len(location) > 2 and 
-                location_lower not in exclude_words):
-                # Приводим к правильному регистру
-                if location[0].islower():
-                    location = location[0].upper() + location[1:]
-                intent["location"] = location
-                logger.info(f"Extracted location (method 2 - city first): {location} from prompt: {prompt}")
-    
-    # Метод 3: Ищем слова с заглавной буквы в тексте (резервный метод)
-    if not intent["location"]:
-        words = prompt.split()
-        for word in words:
-            clean_word = word.strip('.,!?;:()[]{}"\'')
-            if (clean_word and clean_word[0].isupper() and len(clean_word) > 2 and
-                clean_word.lower() not in weather_keywords + exclude_words):
-                intent["location"] = clean_word
-                logger.info(f"Extracted location (method 3 - capitalized): {clean_word} from prompt: {prompt}")
-                break
-    
-    return intent
+    return intent_memo.get(prompt)
 
 
+@traced("weather.mcp")
 async def _get_weather_data(intent: Dict[str, Any]) -> Optional[str]:
     """
     Получает данные о погоде через MCP сервер
@@ -155,21 +65,23 @@ async def _get_weather_data(intent: Dict[str, Any]) -> Optional[str]:
         else:
             tool_name = "get_current_weather"
         
-        # Всегда передаем location, даже если оно не указано (MCP сервер может использовать дефолтное)
-        if intent["location"]:
-            arguments["location"] = intent["location"]
+        # Всегда передаем location, даже если оно не указано (MCP сервер может использовать дефолтное).
+        # Город из справочника — каноническим названием: падеж и опечатки MCP серверу не нужны
+        location = intent.get("canonical_location") or intent["location"]
+        if location:
+            arguments["location"] = location
         # Если местоположение не указано, MCP сервер может использовать дефолтное или вернуть ошибку
         
         # Вызываем инструмент MCP - это обязательно для запросов о погоде
-        logger.info(f"Calling MCP tool {tool_name} with arguments: {arguments}")
+        logger.debug(f"Calling MCP tool {tool_name} with arguments: {arguments}")
         
         # Используем HTTP подключение, если настроено
         if MCP_USE_HTTP:
-            logger.info(f"🌐 Using HTTP connection to MCP server: {MCP_WEATHER_SERVER_URL}")
+            logger.debug(f"🌐 Using HTTP connection to MCP server: {MCP_WEATHER_SERVER_URL}")
             result = await call_mcp_tool(WEATHER_MCP_SERVER, tool_name, arguments)
         else:
             # Используем локальное подключение через stdio
-            logger.info(f"🔧 Using local stdio connection to MCP server: {WEATHER_MCP_SERVER}")
+            logger.debug(f"🔧 Using local stdio connection to MCP server: {WEATHER_MCP_SERVER}")
             server_info = await list_mcp_tools(WEATHER_MCP_SERVER)
             if "error" in server_info:
                 logger.error(f"MCP Weather server error: {server_info['error']}")
@@ -204,6 +116,96 @@ async def _get_weather_data(intent: Dict[str, Any]) -> Optional[str]:
         return None
 
 
+def _general_messages(prompt: str) -> List[Dict[str, str]]:
+    """Сообщения для запроса не о погоде."""
+    return [
+        {"role": "system", "content": "Ты универсальный AI-помощник. Отвечай на любые вопросы пользователя. Если пользователь спрашивает о погоде, используй доступные инструменты для получения актуальной информации."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _is_question(prompt: str) -> bool:
+    """Вопрос, на который стоит ответить через DeepSeek, а не только показать данные."""
+    return "?" in prompt or any(word in prompt.lower() for word in ["что", "как", "почему", "расскажи", "объясни"])
+
+
+def _explain_messages(prompt: str, weather_data: str) -> List[Dict[str, str]]:
+    """Сообщения для ответа на вопрос по данным о погоде."""
+    return [
+        {"role": "system", "content": "Ты универсальный AI-помощник. Отвечай кратко и по делу, используя предоставленные данные."},
+        {"role": "user", "content": f"Вопрос: {prompt}\n\nДанные о погоде:\n{weather_data}\n\nОтветь на вопрос пользователя, используя предоставленные данные о погоде."}
+    ]
+
+
+def _fallback_messages(prompt: str) -> List[Dict[str, str]]:
+    """Сообщения, если данные о погоде получить не удалось."""
+    return [
+        {"role": "system", "content": "Ты универсальный AI-помощник. Если не удалось получить данные о погоде через инструменты, извинись и предложи уточнить запрос или ответь на основе общих знаний."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+async def _complete(messages: List[Dict[str, str]], request: WeatherChatRequest) -> Optional[str]:
+    """Ответ DeepSeek (None — формат не распознан): с автопродолжением и учётом usage, как /api/chat."""
+    completion = await complete_with_continuation(
+        get_provider("deepseek"), messages, temperature=request.temperature, max_tokens=request.max_tokens
+    )
+    record_usage("weather_chat", None, completion["usage"])
+    return completion["content"]
+
+
+def _stream(provider: LLMProvider, messages: List[Dict[str, str]], request: WeatherChatRequest) -> AsyncIterator[str]:
+    """Поток DeepSeek с автопродолжением и учётом usage, как /api/chat/stream."""
+    chunks = stream_with_continuation(provider, messages, temperature=request.temperature, max_tokens=request.max_tokens)
+    return record_stream_usage(chunks, "weather_chat_stream")
+
+
+async def _fetch_weather_data(intent: Dict[str, Any]) -> Optional[str]:
+    """_get_weather_data с ограничением WEATHER_MCP_DEADLINE_MS; по истечении — None."""
+    try:
+        return await asyncio.wait_for(_get_weather_data(intent), timeout=WEATHER_MCP_DEADLINE_MS / 1000)
+    except asyncio.TimeoutError:
+        logger.warning(f"⚠️ MCP weather data not received within {WEATHER_MCP_DEADLINE_MS:.0f} ms")
+        return None
+
+
+async def _weather_or_fallback(request: WeatherChatRequest, intent: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Данные MCP или, если их нет, запасной ответ DeepSeek
+    
+    Запасной запрос стартует параллельно с MCP через WEATHER_FALLBACK_HEDGE_MS
+    (или сразу после неудачи MCP) и отменяется, если данные пришли. Поэтому при
+    ошибке MCP ответ готов примерно через max(время MCP, hedge + латентность LLM),
+    а не через их сумму. Пояснение по данным (_explain_messages) сюда не входит:
+    его сообщения зависят от данных и собираются только после их получения.
+    
+    Returns:
+        (weather_data, None) или (None, текст запасного ответа DeepSeek; None — формат не распознан)
+    """
+    fallback: Optional[asyncio.Task] = None
+
+    def start_fallback() -> None:
+        nonlocal fallback
+        if fallback is None:
+            logger.debug("Starting speculative DeepSeek fallback while MCP is in flight")
+            fallback = asyncio.create_task(_complete(_fallback_messages(request.prompt), request))
+
+    hedge = asyncio.get_running_loop().call_later(max(WEATHER_FALLBACK_HEDGE_MS, 0) / 1000, start_fallback)
+    try:
+        weather_data = await _fetch_weather_data(intent)
+        if weather_data:
+            return weather_data, None
+        start_fallback()
+        return None, await fallback
+    finally:
+        hedge.cancel()
+        if fallback is not None:
+            if not fallback.done():
+                fallback.cancel()
+            elif not fallback.cancelled():
+                fallback.exception()  # ошибка проигравшей ветки не нужна, но должна быть прочитана
+
+
 @router.post("")
 async def weather_chat(request: WeatherChatRequest):
     """
@@ -216,32 +218,26 @@ async def weather_chat(request: WeatherChatRequest):
         Ответ с информацией о погоде
     """
     try:
-        logger.info(f"Received weather chat request: {request.prompt[:100]}...")
-        
         # Извлекаем намерение пользователя
-        intent = _extract_weather_intent(request.prompt)
-        logger.info(f"Extracted intent: {intent}")
+        with span("weather.intent"):
+            intent = _extract_weather_intent(request.prompt)
         
         if not intent:
             # Если это не запрос о погоде, отвечаем обычным способом
-            logger.info("ℹ️ No weather intent detected, using DeepSeek API directly (MCP will NOT be called)")
-            messages = [
-                {"role": "system", "content": "Ты универсальный AI-помощник. Отвечай на любые вопросы пользователя. Если пользователь спрашивает о погоде, используй доступные инструменты для получения актуальной информации."},
-                {"role": "user", "content": request.prompt}
-            ]
-            
-            data = await call_deepseek_api(messages, temperature=request.temperature, max_tokens=request.max_tokens)
-            if "choices" in data and len(data["choices"]) > 0:
-                return {"response": data["choices"][0]["message"]["content"]}
+            logger.debug("ℹ️ No weather intent detected, using DeepSeek API directly (MCP will NOT be called)")
+            content = await _complete(_general_messages(request.prompt), request)
+            if content is not None:
+                return {"response": content}
             else:
                 raise HTTPException(status_code=500, detail="Unexpected response format from DeepSeek API")
         
-        # Получаем данные о погоде через MCP (обязательно для запросов о погоде)
-        logger.info(f"🌤️ Weather intent detected: {intent}, calling MCP server '{WEATHER_MCP_SERVER}'")
-        logger.info(f"🔧 MCP will be called with tool based on intent type: {intent['type']}")
-        weather_data = await _get_weather_data(intent)
+        # Получаем данные о погоде через MCP (обязательно для запросов о погоде),
+        # запасной ответ DeepSeek готовится параллельно
+        logger.debug(f"🌤️ Weather intent detected: {intent}, calling MCP server '{WEATHER_MCP_SERVER}'")
+        logger.debug(f"🔧 MCP will be called with tool based on intent type: {intent['type']}")
+        weather_data, fallback = await _weather_or_fallback(request, intent)
         if weather_data:
-            logger.info(f"✅ MCP server returned weather data successfully (length: {len(weather_data)} chars)")
+            logger.debug(f"✅ MCP server returned weather data successfully (length: {len(weather_data)} chars)")
         else:
             logger.warning(f"⚠️ MCP server did not return weather data, will use DeepSeek fallback")
         
@@ -250,27 +246,16 @@ async def weather_chat(request: WeatherChatRequest):
             response = f"Вот информация о погоде:\n\n{weather_data}"
             
             # Если пользователь задал вопрос, можем дополнить ответ через DeepSeek
-            if "?" in request.prompt or any(word in request.prompt.lower() for word in ["что", "как", "почему", "расскажи", "объясни"]):
-                messages = [
-                    {"role": "system", "content": "Ты универсальный AI-помощник. Отвечай кратко и по делу, используя предоставленные данные."},
-                    {"role": "user", "content": f"Вопрос: {request.prompt}\n\nДанные о погоде:\n{weather_data}\n\nОтветь на вопрос пользователя, используя предоставленные данные о погоде."}
-                ]
-                
-                data = await call_deepseek_api(messages, temperature=request.temperature, max_tokens=request.max_tokens)
-                if "choices" in data and len(data["choices"]) > 0:
-                    response = data["choices"][0]["message"]["content"]
+            if _is_question(request.prompt):
+                content = await _complete(_explain_messages(request.prompt, weather_data), request)
+                if content is not None:
+                    response = content
             
             return {"response": response}
         else:
             # Если не удалось получить данные о погоде, отвечаем через DeepSeek
-            messages = [
-                {"role": "system", "content": "Ты универсальный AI-помощник. Если не удалось получить данные о погоде через инструменты, извинись и предложи уточнить запрос или ответь на основе общих знаний."},
-                {"role": "user", "content": request.prompt}
-            ]
-            
-            data = await call_deepseek_api(messages, temperature=request.temperature, max_tokens=request.max_tokens)
-            if "choices" in data and len(data["choices"]) > 0:
-                return {"response": data["choices"][0]["message"]["content"]}
+            if fallback is not None:
+                return {"response": fallback}
             else:
                 raise HTTPException(status_code=500, detail="Unexpected response format from DeepSeek API")
                 
@@ -279,3 +264,46 @@ async def weather_chat(request: WeatherChatRequest):
     except Exception as e:
         logger.error(f"Unexpected error in weather chat: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+async def _weather_chat_events(request: WeatherChatRequest, intent: Optional[Dict[str, Any]]) -> AsyncIterator[str]:
+    """
+    События /stream: сначала сырые данные MCP, затем ответ по частям
+    
+    Yields:
+        JSON строки: {"weather_data": "...", "intent": {...}} (как только ответил MCP),
+        затем {"content": "..."} или {"error": "..."}; после ответа DeepSeek —
+        {"finish_reason": ..., "segments": N, "usage": {...}} (services/continuation.py)
+    """
+    provider = get_provider("deepseek")
+    if not intent:
+        async for chunk in _stream(provider, _general_messages(request.prompt), request):
+            yield chunk
+        return
+
+    weather_data = await _fetch_weather_data(intent)
+    if not weather_data:
+        logger.warning("⚠️ MCP server did not return weather data, streaming DeepSeek fallback")
+        async for chunk in _stream(provider, _fallback_messages(request.prompt), request):
+            yield chunk
+        return
+
+    yield dumps({"weather_data": weather_data, "intent": intent})
+    if _is_question(request.prompt):
+        async for chunk in _stream(provider, _explain_messages(request.prompt, weather_data), request):
+            yield chunk
+    else:
+        yield dumps({"content": f"Вот информация о погоде:\n\n{weather_data}"})
+
+
+@router.post("/stream")
+async def weather_chat_stream(request: WeatherChatRequest):
+    """
+    Streaming версия /api/weather-chat (Server-Sent Events)
+    
+    Данные MCP отправляются сразу после ответа сервера погоды, объяснение DeepSeek
+    приходит следом по токенам. Склеенные "content" совпадают с ответом /api/weather-chat.
+    """
+    with span("weather.intent"):
+        intent = _extract_weather_intent(request.prompt)
+    return sse_response(_weather_chat_events(request, intent))
@@ -0,0 +1,153 @@
+"""
+Раскладка сжатой истории, удобная для кэша префикса DeepSeek (layout "stable").
+
+В обычной раскладке ("rolling") каждое сжатие переписывает первое сообщение —
+суммаризацию всех сжатых сообщений, — и префикс запроса, закэшированный на
+стороне провайдера, больше не совпадает. В раскладке "stable" история делится
+на блоки по block_size сообщений; заполненный блок суммаризируется один раз, и
+его суммаризация дальше отправляется неизменной ("замороженной"):
+
+    system-сообщения из начала истории + суммаризации блоков + несжатый хвост
+
+Новое сжатие только дописывает суммаризацию следующего блока, поэтому всё, что
+было до неё, остаётся побайтно тем же, а меняется лишь хвост. Суммаризации
+блоков лежат в LRU-кэше по отпечатку содержимого блока — это работает и для
+запросов с полной историей (messages), и для диалогов на сервере (conversation_id).
+Насколько префикс попадает в кэш, видно по prompt_cache_hit_tokens в usage.
+"""
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from backend.config import COMPRESSION_LAYOUT, COMPRESSION_SUMMARY_CACHE_SIZE
+from backend.services.history import estimate_message_tokens
+from backend.services.metrics import record_cache
+from backend.services.serialization import dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+LAYOUTS = ("rolling", "stable")
+
+if COMPRESSION_LAYOUT not in LAYOUTS:
+    logger.warning(f"Unknown COMPRESSION_LAYOUT={COMPRESSION_LAYOUT!r}, using rolling")
+# Раскладка для запросов без явного layout
+DEFAULT_LAYOUT = COMPRESSION_LAYOUT if COMPRESSION_LAYOUT in LAYOUTS else "rolling"
+
+Summarizer = Callable[[List[Dict[str, str]]], Awaitable[str]]
+
+
+def block_fingerprint(block: List[Dict[str, str]]) -> str:
+    """Отпечаток блока сообщений: sha256 его JSON."""
+    return hashlib.sha256(dumps_bytes(block)).hexdigest()
+
+
+def block_summary_message(summary: str, start: int, end: int) -> Dict[str, str]:
+    """Замороженная суммаризация сообщений start..end (нумерация с 1, без закреплённых system)."""
+    return {
+        "role": "system",
+        "content": f"Суммаризация сообщений {start}–{end} диалога:\n{summary}"
+    }
+
+
+class BlockSummaryCache:
+    """
+    LRU-кэш: отпечаток блока -> суммаризация
+
+    Первая сохранённая суммаризация блока не перезаписывается: при
+    одновременных запросах обе стороны получат один и тот же текст (и префикс).
+    Обращения учитываются в cache_requests_total{cache="compression_block_summary"}.
+    """
+
+    def __init__(self, maxsize: int = COMPRESSION_SUMMARY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get(self, key: str) -> Optional[str]:
+        summary = self._entries.get(key)
+        if summary is not None:
+            self._entries.move_to_end(key)
+        record_cache("compression_block_summary", summary is not None)
+        return summary
+
+    def put(self, key: str, summary: str) -> str:
+        """Сохраняет суммаризацию блока; возвращает ту, что осталась в кэше."""
+        existing = self._entries.get(key)
+        if existing is not None:
+            return existing
+        if self.maxsize > 0:
+            self._entries[key] = summary
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return summary
+
+
+block_summaries = BlockSummaryCache()
+
+
+@dataclass
+class StableHistory:
+    """Сжатая история в раскладке stable."""
+    messages: List[Dict[str, str]]
+    summaries: List[str]
+    frozen_count: int  # сколько сообщений истории заменено суммаризациями блоков
+    created: int  # сколько суммаризаций блоков получено от модели в этом запросе
+    prefix_tokens: int  # оценка неизменяемого префикса: закреплённые system + суммаризации
+    tokens: int  # оценка всей сжатой истории
+
+    @property
+    def summary_text(self) -> str:
+        return "\n\n".join(self.summaries)
+
+
+async def stable_history(
+    messages: List[Dict[str, str]],
+    summarize: Summarizer,
+    block_size: int,
+    cache: BlockSummaryCache = block_summaries,
+) -> StableHistory:
+    """
+    Сжимает историю в раскладке stable
+
+    Системные сообщения в начале истории закрепляются и не суммаризируются.
+    Последнее сообщение (текущий запрос) всегда остаётся в хвосте. Недостающие
+    суммаризации блоков запрашиваются одновременно.
+    """
+    pinned = 0
+    while pinned < len(messages) and messages[pinned].get("role") == "system":
+        pinned += 1
+    rest = messages[pinned:]
+    block_count = (len(rest) - 1) // block_size if rest else 0
+    blocks = [rest[i * block_size:(i + 1) * block_size] for i in range(block_count)]
+    keys = [block_fingerprint(block) for block in blocks]
+    summaries: List[Optional[str]] = [cache.get(key) for key in keys]
+
+    missing = [i for i, summary in enumerate(summaries) if summary is None]
+    if missing:
+        created = await asyncio.gather(*(summarize(blocks[i]) for i in missing))
+        for i, summary in zip(missing, created):
+            summaries[i] = cache.put(keys[i], summary)
+        logger.debug(f"Summarized {len(missing)} of {block_count} history blocks")
+
+    prefix = messages[:pinned] + [
+        block_summary_message(summary, i * block_size + 1, (i + 1) * block_size)
+        for i, summary in enumerate(summaries)
+    ]
+    tail = rest[block_count * block_size:]
+    prefix_tokens = sum(map(estimate_message_tokens, prefix))
+    return StableHistory(
+        messages=prefix + tail,
+        summaries=summaries,
+        frozen_count=block_count * block_size,
+        created=len(missing),
+        prefix_tokens=prefix_tokens,
+        tokens=prefix_tokens + sum(map(estimate_message_tokens, tail)),
+    )
@@ -0,0 +1,173 @@
+"""
+Автопродолжение ответов, обрезанных по лимиту токенов (finish_reason == "length").
+
+Пока модель упирается в max_tokens, ей отправляется исходная история, уже
+полученный текст ответа и просьба продолжить; сегменты склеиваются в один
+ответ — для обычного вызова в content, для streaming — в тот же поток.
+Общий расход completion-токенов ограничен бюджетом (CONTINUATION_TOKEN_BUDGET),
+число сегментов — CONTINUATION_MAX_SEGMENTS; usage суммируется по сегментам.
+
+Каждый сегмент — отдельный запрос к API, и промпт продолжения заново содержит
+всю историю и уже полученный текст. Поэтому prompt_tokens и
+prompt_cache_hit/miss_tokens в сумме — это промпт, оплаченный за все запросы
+ответа, а не размер исходного промпта; вложенные поля (prompt_tokens_details,
+completion_tokens_details) суммируются так же.
+"""
+import logging
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from backend.config import CONTINUATION_MAX_SEGMENTS, CONTINUATION_TOKEN_BUDGET
+from backend.services.history import estimate_tokens
+from backend.services.llm_providers import LLMProvider
+from backend.services.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+CONTINUATION_PROMPT = "Продолжи ответ с того места, где остановился. Ответ должен быть полным."
+# Продолжение не запрашивается, если в бюджете осталось меньше токенов
+MIN_CONTINUATION_TOKENS = 100
+
+
+def continuation_messages(messages: List[Dict[str, str]], response: str) -> List[Dict[str, str]]:
+    """История для очередного сегмента: исходные сообщения, ответ до обрыва и просьба продолжить."""
+    return messages + [
+        {"role": "assistant", "content": response},
+        {"role": "user", "content": CONTINUATION_PROMPT},
+    ]
+
+
+def merge_usage(total: Dict[str, Any], usage: Optional[Dict[str, Any]]) -> None:
+    """
+    Прибавляет к total числовые поля usage очередного сегмента, включая вложенные
+    словари; prompt-поля тоже складываются — это оплаченный промпт всех запросов.
+    """
+    for key, value in (usage or {}).items():
+        if isinstance(value, dict):
+            nested = total.setdefault(key, {})
+            if isinstance(nested, dict):
+                merge_usage(nested, value)
+        elif isinstance(value, int) and not isinstance(value, bool):
+            total[key] = total.get(key, 0) + value
+
+
+class ContinuationBudget:
+    """Учёт completion-токенов и сегментов одного ответа."""
+
+    def __init__(self, max_tokens: int, budget: Optional[int] = None,
+                 max_segments: int = CONTINUATION_MAX_SEGMENTS):
+        self.max_tokens = max_tokens
+        self.budget = budget or CONTINUATION_TOKEN_BUDGET
+        self.max_segments = max_segments
+        self.used = 0
+        self.segments = 0
+        self.usage: Dict[str, Any] = {}
+
+    def add(self, text: str, usage: Optional[Dict[str, Any]]) -> None:
+        """Учитывает сегмент; без usage от API токены оцениваются по тексту."""
+        self.segments += 1
+        merge_usage(self.usage, usage)
+        completion_tokens = (usage or {}).get("completion_tokens")
+        self.used += completion_tokens if completion_tokens is not None else estimate_tokens(text)
+
+    def next_max_tokens(self) -> int:
+        """max_tokens следующего сегмента; 0 — продолжать нельзя."""
+        remaining = self.budget - self.used
+        if self.segments >= self.max_segments or remaining < MIN_CONTINUATION_TOKENS:
+            return 0
+        return min(self.max_tokens, remaining)
+
+
+async def complete_with_continuation(
+    provider: LLMProvider,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    budget: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    provider.complete с автопродолжением обрезанного ответа
+
+    Returns:
+        Dict как у provider.complete, content — склеенный ответ, usage — сумма
+        по сегментам (prompt-поля — по всем запросам, см. merge_usage),
+        finish_reason — последнего сегмента; плюс "segments".
+    """
+    completion = await provider.complete(messages, temperature=temperature, max_tokens=max_tokens)
+    content = completion["content"]
+    if content is None:
+        return completion
+
+    tracker = ContinuationBudget(max_tokens or provider.config.default_max_tokens, budget)
+    tracker.add(content, completion["usage"])
+    finish_reason = completion["finish_reason"]
+    raw = completion["raw"]
+
+    while finish_reason == "length":
+        segment_max_tokens = tracker.next_max_tokens()
+        if not segment_max_tokens:
+            break
+        logger.debug(f"Response was truncated, requesting continuation {tracker.segments} "
+                     f"(max_tokens={segment_max_tokens}, used={tracker.used}/{tracker.budget})")
+        continuation = await provider.complete(
+            continuation_messages(messages, content), temperature=temperature, max_tokens=segment_max_tokens
+        )
+        if continuation["content"] is None:
+            break
+        content += continuation["content"]
+        tracker.add(continuation["content"], continuation["usage"])
+        finish_reason = continuation["finish_reason"]
+        raw = continuation["raw"]
+
+    return {
+        "content": content,
+        "finish_reason": finish_reason,
+        "usage": tracker.usage,
+        "segments": tracker.segments,
+        "raw": raw,
+    }
+
+
+async def stream_with_continuation(
+    provider: LLMProvider,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    budget: Optional[int] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    provider.stream с автопродолжением: сегменты идут в один поток
+
+    Yields:
+        Чанки провайдера ({"content": "..."} или {"error": "..."}), последним —
+        {"finish_reason": ..., "segments": N, "usage": {...}} с суммой usage по сегментам
+        (prompt-поля — по всем запросам, см. merge_usage).
+    """
+    tracker = ContinuationBudget(max_tokens or provider.config.default_max_tokens, budget)
+    parts: List[str] = []
+    segment_messages = messages
+    segment_max_tokens = max_tokens
+    finish_reason = None
+
+    while True:
+        info: Dict[str, Any] = {}
+        segment: List[str] = []
+        async for chunk in provider.stream(segment_messages, temperature=temperature,
+                                           max_tokens=segment_max_tokens, info=info):
+            if chunk.startswith('{"content"'):
+                segment.append(loads(chunk)["content"])
+            yield chunk
+        text = "".join(segment)
+        parts.append(text)
+        tracker.add(text, info.get("usage"))
+        finish_reason = info.get("finish_reason")
+
+        if finish_reason != "length" or not text:
+            break
+        segment_max_tokens = tracker.next_max_tokens()
+        if not segment_max_tokens:
+            break
+        logger.debug(f"Stream was truncated, requesting continuation {tracker.segments} "
+                     f"(max_tokens={segment_max_tokens}, used={tracker.used}/{tracker.budget})")
+        segment_messages = continuation_messages(messages, "".join(parts))
+
+    yield dumps({"finish_reason": finish_reason, "segments": tracker.segments, "usage": tracker.usage})
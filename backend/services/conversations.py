@@ -0,0 +1,256 @@
+"""
+Хранилище диалогов на сервере: клиент присылает conversation_id и новое
+сообщение, а не всю историю на каждом ходе.
+
+Постоянное хранение — SQLite (stdlib sqlite3): сообщения дописываются
+строками, без перезаписи истории; в отдельной таблице — накопительная
+суммаризация, число суммаризированных сообщений и оценка токенов.
+Недавние диалоги живут в LRU-кэше в памяти; обращения к БД выполняются
+через asyncio.to_thread, чтобы не блокировать event loop.
+Если БД недоступна, диалоги хранятся только в кэше.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from backend.config import CONVERSATION_CACHE_SIZE
+from backend.services.history import estimate_message_tokens
+from backend.services.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    summary TEXT,
+    summarized_count INTEGER NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    conversation_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, position)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class Conversation:
+    """Диалог: история, накопительная суммаризация и оценка токенов всей истории."""
+    id: str
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    summary: Optional[str] = None
+    summarized_count: int = 0  # сколько первых сообщений покрывает summary
+    tokens: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "conversation_id": self.id,
+            "messages": self.messages,
+            "summary": self.summary,
+            "summarized_count": self.summarized_count,
+            "tokens": self.tokens,
+            "updated_at": self.updated_at,
+        }
+
+
+def new_conversation_id() -> str:
+    return uuid.uuid4().hex
+
+
+class ConversationStore:
+    """SQLite + LRU-кэш диалогов в памяти."""
+
+    def __init__(self, cache_size: int = CONVERSATION_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.path: Optional[Path] = None
+        self._cache: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Одно соединение на процесс; запросы из разных потоков to_thread идут по очереди
+        self._db_lock = threading.Lock()
+
+    @property
+    def persistent(self) -> bool:
+        return self._conn is not None
+
+    def open(self, path: Path) -> bool:
+        """Открывает (и при необходимости создаёт) БД; False — работа только в памяти."""
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA_SQL)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Conversation DB unavailable at %s: %s. Conversations are kept in memory only.", path, e)
+            return False
+        self.close()
+        self._conn = conn
+        self.path = path
+        logger.info("Conversation DB initialized at %s", path)
+        return True
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._db_lock:
+                self._conn.close()
+            self._conn = None
+
+    async def _run(self, fn: Callable[[sqlite3.Connection], T]) -> Optional[T]:
+        conn = self._conn
+        if conn is None:
+            return None
+
+        def locked() -> T:
+            with self._db_lock:
+                return fn(conn)
+
+        try:
+            return await asyncio.to_thread(locked)
+        except sqlite3.Error as e:
+            logger.warning("Conversation DB error: %s", e)
+            return None
+
+    def _remember(self, conversation: Conversation) -> None:
+        self._cache[conversation.id] = conversation
+        self._cache.move_to_end(conversation.id)
+        while len(self._cache) > self.cache_size:
+            evicted, _ = self._cache.popitem(last=False)
+            if not self.persistent:
+                logger.warning(f"Conversation {evicted} evicted from memory without persistent storage")
+
+    async def get(self, conversation_id: str) -> Optional[Conversation]:
+        """Диалог из кэша или из БД; None — такого диалога нет."""
+        conversation = self._cache.get(conversation_id)
+        record_cache("conversations", conversation is not None)
+        if conversation is not None:
+            self._cache.move_to_end(conversation_id)
+            return conversation
+
+        def load(conn: sqlite3.Connection) -> Optional[Conversation]:
+            row = conn.execute(
+                "SELECT summary, summarized_count, tokens, updated_at FROM conversations WHERE id = ?",
+                (conversation_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            messages = [
+                {"role": role, "content": content}
+                for role, content in conn.execute(
+                    "SELECT role, content FROM conversation_messages WHERE conversation_id = ? ORDER BY position",
+                    (conversation_id,),
+                )
+            ]
+            return Conversation(conversation_id, messages, row[0], row[1], row[2], row[3])
+
+        conversation = await self._run(load)
+        if conversation is not None:
+            # Пока шло чтение, диалог мог попасть в кэш из другого запроса
+            conversation = self._cache.get(conversation_id, conversation)
+            self._remember(conversation)
+        return conversation
+
+    async def create(self, messages: Iterable[Dict[str, str]] = (),
+                     conversation_id: Optional[str] = None) -> Conversation:
+        """Новый диалог (с начальной историей, если клиент переносит её с собой)."""
+        conversation = Conversation(conversation_id or new_conversation_id())
+        self._remember(conversation)
+
+        def insert(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT OR REPLACE INTO conversations (id, updated_at) VALUES (?, ?)",
+                (conversation.id, conversation.updated_at),
+            )
+
+        await self._run(insert)
+        await self.append(conversation, messages)
+        return conversation
+
+    async def append(self, conversation: Conversation, messages: Iterable[Dict[str, str]]) -> None:
+        """Дописывает сообщения: в памяти сразу, в БД — только новые строки."""
+        start = len(conversation.messages)
+        added = [{"role": m.get("role", ""), "content": m.get("content", "")} for m in messages]
+        if not added:
+            return
+        conversation.messages.extend(added)
+        conversation.tokens += sum(map(estimate_message_tokens, added))
+        conversation.updated_at = time.time()
+        rows = [(conversation.id, start + i, m["role"], m["content"]) for i, m in enumerate(added)]
+        tokens, updated_at = conversation.tokens, conversation.updated_at
+
+        def insert(conn: sqlite3.Connection) -> None:
+            with conn:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO conversation_messages (conversation_id, position, role, content) "
+                    "VALUES (?, ?, ?, ?)", rows)
+                conn.execute("UPDATE conversations SET tokens = ?, updated_at = ? WHERE id = ?",
+                             (tokens, updated_at, conversation.id))
+
+        await self._run(insert)
+
+    async def truncate(self, conversation: Conversation, count: int) -> None:
+        """
+        Оставляет первые count сообщений (отмена хода, на который нет ответа).
+        Суммаризация, захватившая удалённые сообщения, сбрасывается.
+        """
+        if len(conversation.messages) <= count:
+            return
+        removed = conversation.messages[count:]
+        del conversation.messages[count:]
+        conversation.tokens -= sum(map(estimate_message_tokens, removed))
+        conversation.updated_at = time.time()
+        if conversation.summarized_count > count:
+            conversation.summary = None
+            conversation.summarized_count = 0
+        values = (conversation.summary, conversation.summarized_count, conversation.tokens,
+                  conversation.updated_at, conversation.id)
+
+        def delete(conn: sqlite3.Connection) -> None:
+            with conn:
+                conn.execute("BEGIN")
+                conn.execute("DELETE FROM conversation_messages WHERE conversation_id = ? AND position >= ?",
+                             (conversation.id, count))
+                conn.execute("UPDATE conversations SET summary = ?, summarized_count = ?, tokens = ?, updated_at = ? "
+                             "WHERE id = ?", values)
+
+        await self._run(delete)
+
+    async def set_summary(self, conversation: Conversation, summary: str, summarized_count: int) -> None:
+        """Сохраняет накопительную суммаризацию первых summarized_count сообщений."""
+        conversation.summary = summary
+        conversation.summarized_count = summarized_count
+
+        def update(conn: sqlite3.Connection) -> None:
+            conn.execute("UPDATE conversations SET summary = ?, summarized_count = ? WHERE id = ?",
+                         (summary, summarized_count, conversation.id))
+
+        await self._run(update)
+
+    async def delete(self, conversation_id: str) -> bool:
+        """Удаляет диалог; True, если он был."""
+        cached = self._cache.pop(conversation_id, None) is not None
+
+        def remove(conn: sqlite3.Connection) -> bool:
+            with conn:
+                conn.execute("BEGIN")
+                conn.execute("DELETE FROM conversation_messages WHERE conversation_id = ?", (conversation_id,))
+                return conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,)).rowcount > 0
+
+        return bool(await self._run(remove)) or cached
+
+
+conversation_store = ConversationStore()
@@ -1,10 +1,11 @@
 """Сервис для работы с DeepSeek API"""
-import json
 import logging
-from typing import List, Dict, Optional, AsyncGenerator
+from typing import Any, List, Dict, Optional, AsyncGenerator
 import httpx
 
 from backend.config import DEEPSEEK_API_URL, API_KEY, MAX_TOKENS
+from backend.services.serialization import JSONDecodeError, dumps, loads
+from backend.services.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -43,20 +44,62 @@ async def call_deepseek_api(
         "stream": stream
     }
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            DEEPSEEK_API_URL,
-            headers=headers,
-            json=payload
-        )
-        response.raise_for_status()
-        return response.json()
+    with span("deepseek.complete", messages=len(messages), max_tokens=payload["max_tokens"]) as s:
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            response = await client.post(
+                DEEPSEEK_API_URL,
+                headers=headers,
+                json=payload
+            )
+            s.set("http.status_code", response.status_code)
+            response.raise_for_status()
+            data = loads(response.content)
+        usage = data.get("usage") or {}
+        s.set("completion_tokens", usage.get("completion_tokens", 0))
+        return data
+
+
+# Маркер конца потока ("data: [DONE]") для _parse_stream_line
+STREAM_DONE = object()
+
+
+def _parse_stream_line(line: str, info: Optional[Dict[str, Any]] = None):
+    """
+    Разбор одной строки SSE-потока DeepSeek
+    
+    Args:
+        line: Строка потока
+        info: Если передан, в него записываются finish_reason и usage из служебных чанков
+    
+    Returns:
+        Текст очередного фрагмента ответа, STREAM_DONE для "data: [DONE]"
+        или None, если строка не содержит контента
+    """
+    if not line.startswith("data: "):
+        return None
+    data_str = line[6:]  # Убираем "data: "
+    if data_str == "[DONE]":
+        return STREAM_DONE
+    try:
+        data = loads(data_str)
+    except JSONDecodeError:
+        return None
+    if info is not None and data.get("usage"):
+        info["usage"] = data["usage"]
+    if "choices" in data and len(data["choices"]) > 0:
+        choice = data["choices"][0]
+        if info is not None and choice.get("finish_reason"):
+            info["finish_reason"] = choice["finish_reason"]
+        delta = choice.get("delta", {})
+        return delta.get("content", "") or None
+    return None
 
 
 async def stream_deepseek_api(
     messages: List[Dict[str, str]],
     temperature: float = 0.3,
-    max_tokens: Optional[int] = None
+    max_tokens: Optional[int] = None,
+    info: Optional[Dict[str, Any]] = None
 ) -> AsyncGenerator[str, None]:
     """
     Streaming вызов DeepSeek API для получения ответа по частям
@@ -65,12 +108,13 @@ async def stream_deepseek_api(
         messages: Список сообщений в формате [{"role": "user/assistant/system", "content": "..."}]
         temperature: Температура для генерации (по умолчанию 0.3)
         max_tokens: Максимальное количество токенов (по умолчанию из конфига)
+        info: Если передан, после окончания потока содержит finish_reason и usage
     
     Yields:
         JSON строки с частями ответа в формате {"content": "..."} или {"error": "..."}
     """
     if not API_KEY:
-        yield json.dumps({"error": "API key is not configured"})
+        yield dumps({"error": "API key is not configured"})
         return
     
     headers = {
@@ -85,32 +129,33 @@ async def stream_deepseek_api(
         "max_tokens": max_tokens or MAX_TOKENS,
         "stream": True
     }
+    if info is not None:
+        # Последним чанком API присылает usage всего ответа
+        payload["stream_options"] = {"include_usage": True}
     
-    try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream(
-                "POST",
-                DEEPSEEK_API_URL,
-                headers=headers,
-                json=payload
-            ) as response:
-                response.raise_for_status()
-                
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data_str = line[6:]  # Убираем "data: "
-                        if data_str == "[DONE]":
+    with span("deepseek.stream", messages=len(messages), max_tokens=payload["max_tokens"]) as s:
+        try:
+            async with httpx.AsyncClient(timeout=120.0) as client:
+                async with client.stream(
+                    "POST",
+                    DEEPSEEK_API_URL,
+                    headers=headers,
+                    json=payload
+                ) as response:
+                    s.set("http.status_code", response.status_code)
+                    response.raise_for_status()
+                    
+                    chunks = 0
+                    async for line in response.aiter_lines():
+                        content = _parse_stream_line(line, info)
+                        if content is STREAM_DONE:
                             break
-                        try:
-                            data = json.loads(data_str)
-                            if "choices" in data and len(data["choices"]) > 0:
-                                delta = data["choices"][0].get("delta", {})
-                                content = delta.get("content", "")
-                                if content:
-                                    yield json.dumps({"content": content})
-                        except json.JSONDecodeError:
-                            continue
-    except Exception as e:
-        logger.error(f"Streaming error: {str(e)}")
-        yield json.dumps({"error": str(e)})
+                        if content:
+                            chunks += 1
+                            yield dumps({"content": content})
+                    s.set("chunks", chunks)
+        except Exception as e:
+            logger.error(f"Streaming error: {str(e)}")
+            s.set("error", str(e))
+            yield dumps({"error": str(e)})
 
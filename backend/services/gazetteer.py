@@ -0,0 +1,316 @@
+"""
+Справочник городов (газеттир) с нечётким поиском в памяти.
+
+Из backend/constants/cities.py при первом обращении строится индекс:
+    - точный словарь нормализованная форма -> город (все падежные формы
+      русских названий, английские названия и синонимы);
+    - отсортированный список форм для поиска по префиксу (bisect);
+    - инвертированный индекс триграмм для опечаток: кандидаты с наибольшим
+      числом общих триграмм проверяются расстоянием Дамерау-Левенштейна.
+Каноническое название города не зависит от падежа и языка запроса
+("в Москве", "Moscow" -> "Москва") и годится как стабильный ключ кэша.
+"""
+import re
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import product
+from typing import Collection, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from backend.constants.cities import CITIES
+
+# Минимальная длина строки для поиска по префиксу и по триграммам
+MIN_APPROXIMATE_LENGTH = 5
+# Префикс должен покрывать не меньше этой доли самой короткой подходящей формы
+MIN_PREFIX_COVERAGE = 0.6
+# Кандидатов из индекса триграмм (по числу общих триграмм), проверяемых расстоянием правки
+FUZZY_CANDIDATES = 16
+
+_TOKEN_RE = re.compile(r"[0-9A-Za-zА-Яа-яЁё]+")
+_CYRILLIC_RE = re.compile(r"[А-Яа-яЁё]")
+_INDECLINABLE_ENDINGS = "оеиуюэы"
+_HUSHING = "жшчщ"
+_VELAR = "гкх"
+
+
+@dataclass(frozen=True)
+class City:
+    """Город из справочника."""
+    name: str     # каноническое название (рус.), ключ для кэша погоды
+    name_en: str
+
+
+@dataclass(frozen=True)
+class LocationMatch:
+    """Найденный город и фрагмент входной строки, по которому он найден."""
+    city: City
+    text: str
+    score: float  # 1.0 — точное совпадение формы
+
+    @property
+    def exact(self) -> bool:
+        return self.score == 1.0
+
+
+def normalize(text: str) -> str:
+    """Ключ формы: нижний регистр, ё -> е, дефисы и пунктуация -> один пробел."""
+    return " ".join(_TOKEN_RE.findall(text.lower().replace("ё", "е")))
+
+
+# --- падежные формы ---------------------------------------------------------
+# Формы перечисляются по падежам (родительный, дательный, винительный,
+# творительный, предложный), чтобы слова составного названия согласовывались.
+
+def _noun_cases(word: str) -> List[List[str]]:
+    end = word[-1].lower()
+    stem = word[:-1]
+    if end in _INDECLINABLE_ENDINGS:
+        return [[word]] * 5
+    if word.lower().endswith("ия"):
+        return [[stem + "и"], [stem + "и"], [stem + "ю"], [stem + "ей"], [stem + "и"]]
+    if end == "я":
+        return [[stem + "и"], [stem + "е"], [stem + "ю"], [stem + "ей"], [stem + "е"]]
+    if end == "а":
+        genitive = stem + ("и" if stem[-1].lower() in _VELAR + _HUSHING else "ы")
+        instrumental = stem + ("ей" if stem[-1].lower() in _HUSHING + "ц" else "ой")
+        return [[genitive], [stem + "е"], [stem + "у"], [instrumental], [stem + "е"]]
+    if end == "ь":
+        # Род по написанию не определить: Казань (ж. р.) и Ярославль (м. р.)
+        return [[stem + "и", stem + "я"], [stem + "и", stem + "ю"], [word],
+                [stem + "ью", stem + "ем"], [stem + "и", stem + "е"]]
+    if end == "й":
+        return [[stem + "я"], [stem + "ю"], [word], [stem + "ем"], [stem + "е"]]
+    instrumental = word + ("ем" if end in _HUSHING + "ц" else "ом")
+    return [[word + "а"], [word + "у"], [word], [instrumental], [word + "е"]]
+
+
+def _adjective_cases(word: str) -> Optional[List[List[str]]]:
+    lower = word.lower()
+    stem = word[:-2]
+    if lower.endswith("ний"):
+        return [[stem + "его"], [stem + "ему"], [word], [stem + "им"], [stem + "ем"]]
+    if lower.endswith(("ий", "ый", "ой")):
+        instrumental = stem + ("им" if stem[-1].lower() in _VELAR + _HUSHING else "ым")
+        return [[stem + "ого"], [stem + "ому"], [word], [instrumental], [stem + "ом"]]
+    if lower.endswith("ая"):
+        return [[stem + "ой"], [stem + "ой"], [stem + "ую"], [stem + "ой"], [stem + "ой"]]
+    return None
+
+
+def _hyphenated_cases(word: str) -> List[List[str]]:
+    parts = word.split("-")
+    # "Ростов-на-Дону" склоняется по первой части, "Санкт-Петербург" — по последней
+    index = 0 if any(part.islower() for part in parts[1:-1]) else len(parts) - 1
+    cases = []
+    for forms in _noun_cases(parts[index]):
+        cases.append(["-".join(parts[:index] + [form] + parts[index + 1:]) for form in forms])
+    return cases
+
+
+def inflect(name: str) -> Set[str]:
+    """Именительный и косвенные падежи русского названия города."""
+    words = name.split()
+    per_word = []
+    for position, word in enumerate(words):
+        is_last = position == len(words) - 1
+        adjective = _adjective_cases(word) if not is_last or len(words) == 1 else None
+        if adjective is not None and (not is_last or word.lower().endswith(("ый", "ий"))):
+            per_word.append(adjective)
+        elif not is_last:
+            per_word.append([[word]] * 5)
+        elif "-" in word:
+            per_word.append(_hyphenated_cases(word))
+        else:
+            per_word.append(_noun_cases(word))
+    forms = {name}
+    for case in range(5):
+        forms.update(" ".join(combo) for combo in product(*(cases[case] for cases in per_word)))
+    return forms
+
+
+def _surface_forms(name: str) -> Set[str]:
+    # Сокращения (СПб, Мск) и латиница не склоняются
+    if not _CYRILLIC_RE.search(name) or len(name) <= 3 or name.isupper():
+        return {name}
+    return inflect(name)
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Gazetteer:
+    """Индекс городов: точный поиск форм, поиск по префиксу и по триграммам."""
+
+    def __init__(self, entries: Iterable[Tuple[str, str, Sequence[str]]]):
+        self.cities: List[City] = []
+        self._exact: Dict[str, int] = {}
+        for name, name_en, aliases in entries:
+            city_id = len(self.cities)
+            self.cities.append(City(name, name_en))
+            for source in (name, name_en, *aliases):
+                for form in _surface_forms(source):
+                    # При совпадении форм выигрывает город, записанный раньше (крупнее)
+                    self._exact.setdefault(normalize(form), city_id)
+
+        self._keys: List[str] = sorted(self._exact)
+        self._key_city: List[int] = [self._exact[key] for key in self._keys]
+        self._key_trigram_count: List[int] = []
+        postings: Dict[str, List[int]] = {}
+        for key_id, key in enumerate(self._keys):
+            grams = _trigrams(key)
+            self._key_trigram_count.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(key_id)
+        self._postings: Dict[str, Tuple[int, ...]] = {gram: tuple(ids) for gram, ids in postings.items()}
+        self.max_words = max(key.count(" ") + 1 for key in self._keys)
+        # Первые слова форм: позиции текста с другим словом точный поиск пропускает
+        self._first_words = frozenset(key.split(" ", 1)[0] for key in self._keys)
+
+    def __len__(self) -> int:
+        return len(self.cities)
+
+    def lookup(self, text: str) -> Optional[City]:
+        """Точное совпадение формы (падеж, язык, синоним)."""
+        city_id = self._exact.get(normalize(text))
+        return None if city_id is None else self.cities[city_id]
+
+    def complete(self, prefix: str, limit: int = 10) -> List[City]:
+        """Города, одна из форм которых начинается с prefix (для автодополнения)."""
+        key = normalize(prefix)
+        if not key:
+            return []
+        found: List[City] = []
+        seen: Set[int] = set()
+        for key_id in range(bisect_left(self._keys, key), len(self._keys)):
+            if not self._keys[key_id].startswith(key):
+                break
+            city_id = self._key_city[key_id]
+            if city_id not in seen:
+                seen.add(city_id)
+                found.append(self.cities[city_id])
+                if len(found) >= limit:
+                    break
+        return found
+
+    def resolve(self, text: str) -> Optional[LocationMatch]:
+        """Город по всей строке: точная форма, однозначный префикс или опечатка."""
+        key = normalize(text)
+        if not key:
+            return None
+        city_id = self._exact.get(key)
+        if city_id is not None:
+            return LocationMatch(self.cities[city_id], text, 1.0)
+        return self._approximate(key, text)
+
+    def find(self, text: str, fuzzy: bool = False, ignore: Collection[str] = ()) -> Optional[LocationMatch]:
+        """
+        Первый (самый длинный в позиции) город, упомянутый в тексте
+
+        Сначала ищутся точные формы; при fuzzy=True затем — префиксы и опечатки
+        в последовательностях слов, кроме слов из ignore (в нижнем регистре).
+        text в результате — фрагмент исходной строки.
+        """
+        # Токены уже состоят только из букв и цифр: normalize сводится к lower и ё -> е
+        tokens = [(m.start(), m.end(), m.group().lower().replace("ё", "е")) for m in _TOKEN_RE.finditer(text)]
+        words = [token[2] for token in tokens]
+        for start, word in enumerate(words):
+            if word not in self._first_words:
+                continue
+            for width in range(min(self.max_words, len(words) - start), 0, -1):
+                city_id = self._exact.get(" ".join(words[start:start + width]))
+                if city_id is not None:
+                    surface = text[tokens[start][0]:tokens[start + width - 1][1]]
+                    return LocationMatch(self.cities[city_id], surface, 1.0)
+        if not fuzzy:
+            return None
+        for start in range(len(words)):
+            for width in range(min(self.max_words, len(words) - start), 0, -1):
+                key = " ".join(words[start:start + width])
+                if key in ignore:
+                    continue
+                match = self._approximate(key, text[tokens[start][0]:tokens[start + width - 1][1]])
+                if match is not None:
+                    return match
+        return None
+
+    def _approximate(self, key: str, text: str) -> Optional[LocationMatch]:
+        if len(key) < MIN_APPROXIMATE_LENGTH or key.isdigit():
+            return None
+        # Однозначный префикс: "новосиб" -> Новосибирск
+        city_id, shortest = None, 0
+        for key_id in range(bisect_left(self._keys, key), len(self._keys)):
+            candidate = self._keys[key_id]
+            if not candidate.startswith(key):
+                break
+            if city_id is not None and self._key_city[key_id] != city_id:
+                city_id = None
+                break
+            city_id = self._key_city[key_id]
+            shortest = min(shortest or len(candidate), len(candidate))
+        if city_id is not None:
+            coverage = len(key) / shortest
+            return LocationMatch(self.cities[city_id], text, round(coverage, 3)) if coverage >= MIN_PREFIX_COVERAGE else None
+
+        # Опечатка: кандидаты по убыванию коэффициента Дайса по триграммам, первый
+        # с расстоянием правки не больше 1 (2 для длинных слов) принимается. Одна
+        # правка меняет не больше трёх триграмм — это отсекает кандидатов до подсчёта.
+        grams = _trigrams(key)
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        max_distance = 1 if len(key) <= 8 else 2
+        candidates = []
+        for key_id, common in shared.most_common(FUZZY_CANDIDATES):
+            candidate_grams = self._key_trigram_count[key_id]
+            if abs(len(self._keys[key_id]) - len(key)) > max_distance:
+                continue
+            if common < max(len(grams), candidate_grams) - 3 * max_distance:
+                continue
+            score = 2 * common / (len(grams) + candidate_grams)
+            candidates.append((-score, self._key_city[key_id], key_id))
+        for negative_score, city_id, key_id in sorted(candidates):
+            if _edit_distance(key, self._keys[key_id], max_distance) <= max_distance:
+                return LocationMatch(self.cities[city_id], text, round(-negative_score, 3))
+        return None
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Расстояние Дамерау-Левенштейна (с перестановкой соседних букв)
+
+    Считается только полоса |i - j| <= limit; результат больше limit
+    означает "дальше limit".
+    """
+    too_far = limit + 1
+    previous2: List[int] = []
+    previous = [j if j <= limit else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [i if i <= limit else too_far] + [too_far] * len(b)
+        char = a[i - 1]
+        row_min = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            value = previous[j - 1] if char == b[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and char == b[j - 2] and a[i - 2] == b[j - 1] and previous2[j - 2] + 1 < value:
+                value = previous2[j - 2] + 1
+            if value > too_far:
+                value = too_far
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return too_far
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+@lru_cache(maxsize=1)
+def get_gazetteer() -> Gazetteer:
+    """Общий индекс, строится при первом обращении."""
+    return Gazetteer(CITIES)
@@ -0,0 +1,86 @@
+"""
+Рендеринг истории диалога для суммаризации и оценка её размера в токенах.
+
+HistoryBuilder за один проход по сообщениям готовит и текст истории для
+промпта суммаризации, и оценку токенов. Части текста копятся в списке и
+склеиваются через join только при обращении, поэтому историю можно
+дописывать (append/extend), не перестраивая её заново.
+"""
+from typing import Dict, Iterable, List, Optional
+
+# Подписи ролей в тексте истории; сообщения с другими ролями в текст не попадают
+ROLE_LABELS = {"user": "Пользователь", "assistant": "Ассистент", "system": "Система"}
+# Токены на форматирование одного сообщения
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT_HEAD = (
+    "Создай краткую суммаризацию следующего диалога, сохраняя ключевую информацию, контекст и важные детали. \n"
+    "Суммаризация должна быть достаточно подробной, чтобы ассистент мог продолжить диалог естественным образом.\n"
+    "\n"
+    "Диалог:\n"
+)
+SUMMARY_PROMPT_TAIL = "\n\nСуммаризация:"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Приблизительная оценка количества токенов в тексте
+    Для русского текста: примерно 1 токен = 2.5 символа
+    Для английского: примерно 1 токен = 4 символа
+    Используем среднее значение: 1 токен = 3 символа
+    """
+    if not text:
+        return 0
+    return max(1, len(text) // 3)
+
+
+def estimate_message_tokens(message: Dict[str, str]) -> int:
+    """Оценка токенов одного сообщения: роль, текст и форматирование."""
+    return (estimate_tokens(message.get("role", "")) + estimate_tokens(message.get("content", ""))
+            + MESSAGE_OVERHEAD_TOKENS)
+
+
+class HistoryBuilder:
+    """Текст истории и оценка токенов, накапливаемые по мере добавления сообщений."""
+
+    def __init__(self, messages: Optional[Iterable[Dict[str, str]]] = None):
+        self.tokens = 0
+        self.count = 0
+        self._parts: List[str] = []
+        if messages is not None:
+            self.extend(messages)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, message: Dict[str, str]) -> None:
+        self.extend((message,))
+
+    def extend(self, messages: Iterable[Dict[str, str]]) -> None:
+        # Горячий цикл: estimate_tokens развёрнут, атрибуты вынесены в локальные переменные
+        parts_append = self._parts.append
+        labels = ROLE_LABELS
+        tokens = count = 0
+        for message in messages:
+            role = message.get("role", "")
+            content = message.get("content", "")
+            tokens += ((len(role) // 3 or 1) if role else 0) + ((len(content) // 3 or 1) if content else 0)
+            count += 1
+            label = labels.get(role)
+            if label is not None:
+                parts_append(f"{label}: {content}\n\n")
+        self.tokens += tokens + count * MESSAGE_OVERHEAD_TOKENS
+        self.count += count
+
+    @property
+    def text(self) -> str:
+        """Текст истории ("Пользователь: ...\\n\\n" на каждое сообщение)."""
+        if len(self._parts) > 1:
+            # Склеенный текст сохраняется одной частью: следующий join копирует
+            # только его и новые сообщения
+            self._parts[:] = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def summary_prompt(self) -> str:
+        """Промпт для суммаризации накопленной истории."""
+        return "".join((SUMMARY_PROMPT_HEAD, self.text, SUMMARY_PROMPT_TAIL))
@@ -5,10 +5,13 @@ from typing import List, Dict, Optional, AsyncGenerator
 import httpx
 
 from backend.config import HUGGINGFACE_API_KEY, HUGGINGFACE_API_URL, HUGGINGFACE_MODEL
+from backend.services.serialization import dumps, loads
+from backend.services.tracing import traced
 
 logger = logging.getLogger(__name__)
 
 
+@traced("llama.complete")
 async def call_llama_api(
     messages: List[Dict[str, str]],
     temperature: float = 0.7,
@@ -29,7 +32,7 @@ async def call_llama_api(
         raise ValueError("HUGGINGFACE_API_KEY not found in environment variables")
     
     # Используем chat completions endpoint через router API
-    logger.info(f"Llama request: {len(messages)} messages, temperature={temperature}, max_tokens={max_tokens}")
+    logger.debug(f"Llama request: {len(messages)} messages, temperature={temperature}, max_tokens={max_tokens}")
     
     headers = {
         "Authorization": f"Bearer {HUGGINGFACE_API_KEY}",
@@ -44,8 +47,9 @@ async def call_llama_api(
         "max_tokens": max_tokens or 1000
     }
     
-    logger.info(f"Llama API request URL: {HUGGINGFACE_API_URL}")
-    logger.info(f"Llama API request payload: {json.dumps(payload, indent=2)}")
+    logger.debug(f"Llama API request URL: {HUGGINGFACE_API_URL}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Llama API request payload: {json.dumps(payload, indent=2)}")
     
     try:
         async with httpx.AsyncClient(timeout=120.0) as client:
@@ -67,8 +71,8 @@ async def call_llama_api(
             
             response.raise_for_status()
             data = response.json()
-            logger.info(f"Llama API response type: {type(data)}, keys: {data.keys() if isinstance(data, dict) else 'list'}")
-            logger.info(f"Llama API response preview: {str(data)[:500]}")
+            logger.debug(f"Llama API response type: {type(data)}, keys: {data.keys() if isinstance(data, dict) else 'list'}")
+            logger.debug(f"Llama API response preview: {str(data)[:500]}")
             
             # Chat completions API возвращает ответ в формате OpenAI
             # {"choices": [{"message": {"content": "..."}}]}
@@ -113,6 +117,7 @@ async def call_llama_api(
         raise ValueError(f"Error calling Llama API: {str(e)}")
 
 
+@traced("llama.stream")
 async def stream_llama_api(
     messages: List[Dict[str, str]],
     temperature: float = 0.7,
@@ -130,11 +135,11 @@ async def stream_llama_api(
         JSON строки с частями ответа в формате {"content": "..."} или {"error": "..."}
     """
     if not HUGGINGFACE_API_KEY:
-        yield json.dumps({"error": "HUGGINGFACE_API_KEY not found in environment variables"})
+        yield dumps({"error": "HUGGINGFACE_API_KEY not found in environment variables"})
         return
     
     # Используем chat completions endpoint через router API
-    logger.info(f"Llama streaming request: {len(messages)} messages, temperature={temperature}, max_tokens={max_tokens}")
+    logger.debug(f"Llama streaming request: {len(messages)} messages, temperature={temperature}, max_tokens={max_tokens}")
     
     headers = {
         "Authorization": f"Bearer {HUGGINGFACE_API_KEY}",
@@ -150,8 +155,9 @@ async def stream_llama_api(
         "stream": True
     }
     
-    logger.info(f"Llama streaming API request URL: {HUGGINGFACE_API_URL}")
-    logger.info(f"Llama streaming API request payload: {json.dumps(payload, indent=2)}")
+    logger.debug(f"Llama streaming API request URL: {HUGGINGFACE_API_URL}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Llama streaming API request payload: {json.dumps(payload, indent=2)}")
     
     try:
         async with httpx.AsyncClient(timeout=180.0) as client:
@@ -173,7 +179,7 @@ async def stream_llama_api(
                             error_msg = "Model is loading, please try again in a few moments"
                     except:
                         error_msg = "Model is loading, please try again in a few moments"
-                    yield json.dumps({"error": f"Model is loading: {error_msg}"})
+                    yield dumps({"error": f"Model is loading: {error_msg}"})
                     return
                 
                 # Проверяем другие ошибки статуса
@@ -199,7 +205,7 @@ async def stream_llama_api(
                     except Exception as ex:
                         logger.error(f"Failed to read error response: {ex}", exc_info=True)
                         error_msg = f"HTTP {response.status_code}"
-                    yield json.dumps({"error": error_msg})
+                    yield dumps({"error": error_msg})
                     return
                 
                 response.raise_for_status()
@@ -217,7 +223,7 @@ async def stream_llama_api(
                             break
                         
                         try:
-                            chunk_data = json.loads(data_str)
+                            chunk_data = loads(data_str)
                             # Формат OpenAI streaming: {"choices": [{"delta": {"content": "..."}}]}
                             if isinstance(chunk_data, dict) and "choices" in chunk_data:
                                 choices = chunk_data.get("choices", [])
@@ -225,7 +231,7 @@ async def stream_llama_api(
                                     delta = choices[0].get("delta", {})
                                     content = delta.get("content", "")
                                     if content:
-                                        yield json.dumps({"content": content})
+                                        yield dumps({"content": content})
                         except json.JSONDecodeError as e:
                             logger.warning(f"Failed to parse SSE chunk: {e}, line: {line[:100]}")
                             continue
@@ -235,10 +241,10 @@ async def stream_llama_api(
                 
     except httpx.TimeoutException as e:
         logger.error(f"Timeout error in Llama streaming: {str(e)}")
-        yield json.dumps({"error": "Request timeout: The API did not respond in time. Please try again."})
+        yield dumps({"error": "Request timeout: The API did not respond in time. Please try again."})
     except httpx.NetworkError as e:
         logger.error(f"Network error in Llama streaming: {str(e)}")
-        yield json.dumps({"error": "Network error: Unable to connect to Hugging Face API. Please check your internet connection."})
+        yield dumps({"error": "Network error: Unable to connect to Hugging Face API. Please check your internet connection."})
     except httpx.HTTPStatusError as e:
         logger.error(f"HTTP error in Llama streaming: {str(e)}")
         try:
@@ -246,8 +252,8 @@ async def stream_llama_api(
         except:
             error_text = f"HTTP {e.response.status_code}" if e.response else "Unknown error"
         error_msg = f"HTTP {e.response.status_code if e.response else 'unknown'}: {error_text}"
-        yield json.dumps({"error": error_msg})
+        yield dumps({"error": error_msg})
     except Exception as e:
         logger.error(f"Unexpected error in Llama streaming: {str(e)}", exc_info=True)
-        yield json.dumps({"error": f"Error: {str(e)}"})
+        yield dumps({"error": f"Error: {str(e)}"})
 
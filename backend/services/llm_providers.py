@@ -0,0 +1,198 @@
+"""Единый интерфейс LLM-провайдеров (DeepSeek, Llama) и их реестр"""
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from backend.config import MAX_TOKENS, HUGGINGFACE_MODEL
+from backend.services.deepseek_api import call_deepseek_api, stream_deepseek_api
+from backend.services.llama_api import call_llama_api, stream_llama_api
+from backend.services.metrics import StreamTimer, UPSTREAM_ERRORS, observe_upstream
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    """Настройки провайдера: модель и значения по умолчанию для генерации."""
+    name: str
+    model: str
+    default_temperature: float
+    default_max_tokens: int
+
+
+class LLMProvider(ABC):
+    """
+    Базовый класс LLM-провайдера.
+
+    Публичные методы complete/stream — общая точка для сквозной логики
+    (метрики, трассировка, ретраи), адаптеры реализуют только _complete/_stream.
+    """
+
+    def __init__(self, config: ProviderConfig):
+        self.config = config
+
+    @property
+    def name(self) -> str:
+        return self.config.name
+
+    def _resolve_params(self, temperature: Optional[float], max_tokens: Optional[int]):
+        if temperature is None:
+            temperature = self.config.default_temperature
+        return temperature, max_tokens or self.config.default_max_tokens
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Обычный (не streaming) вызов модели
+
+        Returns:
+            Dict вида {"content": str | None, "finish_reason": str | None, "usage": dict, "raw": ответ API}.
+            content равен None, если формат ответа не распознан.
+        """
+        temperature, max_tokens = self._resolve_params(temperature, max_tokens)
+        with observe_upstream(self.name, "complete"):
+            return await self._complete(messages, temperature, max_tokens)
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        info: Optional[Dict[str, Any]] = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Streaming вызов модели
+
+        Args:
+            info: Если передан, после окончания потока в нём finish_reason и usage
+                (если провайдер их сообщает)
+
+        Yields:
+            JSON строки в формате {"content": "..."} или {"error": "..."}
+        """
+        temperature, max_tokens = self._resolve_params(temperature, max_tokens)
+        timer = StreamTimer(self.name)
+        with observe_upstream(self.name, "stream"):
+            async for chunk in self._stream(messages, temperature, max_tokens, info):
+                if chunk.startswith('{"error"'):
+                    UPSTREAM_ERRORS.inc(self.name, "stream")
+                else:
+                    timer.chunk()
+                yield chunk
+        timer.finish()
+
+    def count_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """
+        Приблизительная оценка количества токенов в сообщениях
+        (1 токен ≈ 3 символа, +4 токена на служебное форматирование сообщения)
+        """
+        total = 0
+        for msg in messages:
+            for text in (msg.get("role", ""), msg.get("content", "")):
+                if text:
+                    total += max(1, len(text) // 3)
+            total += 4
+        return total
+
+    @abstractmethod
+    async def _complete(
+        self, messages: List[Dict[str, str]], temperature: float, max_tokens: int
+    ) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def _stream(
+        self, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+        info: Optional[Dict[str, Any]] = None,
+    ) -> AsyncGenerator[str, None]:
+        ...
+
+
+class DeepSeekProvider(LLMProvider):
+    """Адаптер DeepSeek API (OpenAI-совместимый chat completions)."""
+
+    async def _complete(self, messages, temperature, max_tokens):
+        data = await call_deepseek_api(messages, temperature=temperature, max_tokens=max_tokens)
+        result = {"content": None, "finish_reason": None, "usage": data.get("usage") or {}, "raw": data}
+        if "choices" in data and len(data["choices"]) > 0:
+            choice = data["choices"][0]
+            result["content"] = choice["message"]["content"]
+            result["finish_reason"] = choice.get("finish_reason", "stop")
+        return result
+
+    async def _stream(self, messages, temperature, max_tokens, info=None):
+        async for chunk in stream_deepseek_api(messages, temperature=temperature, max_tokens=max_tokens, info=info):
+            yield chunk
+
+
+class LlamaProvider(LLMProvider):
+    """Адаптер Hugging Face router API (Llama 3.2-1B-Instruct)."""
+
+    async def _complete(self, messages, temperature, max_tokens):
+        data = await call_llama_api(messages, temperature=temperature, max_tokens=max_tokens)
+
+        # Формат ответа может быть: [{"generated_text": "..."}] или {"generated_text": "..."}
+        generated_text = ""
+        if isinstance(data, list) and len(data) > 0:
+            generated_text = data[0].get("generated_text", "")
+        elif isinstance(data, dict):
+            generated_text = data.get("generated_text") or data.get("text") or ""
+
+        if generated_text:
+            # Убираем префикс промпта, если модель его повторила
+            messages_text = "".join([f"{m.get('role', '')}: {m.get('content', '')}" for m in messages])
+            if messages_text in generated_text:
+                generated_text = generated_text[len(messages_text):].strip()
+
+        return {
+            "content": generated_text or None,
+            "finish_reason": None,
+            "usage": {},
+            "raw": data,
+        }
+
+    async def _stream(self, messages, temperature, max_tokens, info=None):
+        async for chunk in stream_llama_api(messages, temperature=temperature, max_tokens=max_tokens):
+            yield chunk
+
+
+# Реестр провайдеров: имя -> экземпляр
+_providers: Dict[str, LLMProvider] = {}
+
+
+def register_provider(provider: LLMProvider) -> None:
+    """Регистрирует (или заменяет) провайдера под его именем."""
+    _providers[provider.name] = provider
+    logger.debug(f"Registered LLM provider: {provider.name} (model={provider.config.model})")
+
+
+def get_provider(name: str) -> LLMProvider:
+    """Возвращает провайдера по имени; KeyError, если он не зарегистрирован."""
+    try:
+        return _providers[name]
+    except KeyError:
+        raise KeyError(f"Unknown LLM provider: {name}")
+
+
+def list_providers() -> List[str]:
+    """Имена зарегистрированных провайдеров."""
+    return list(_providers)
+
+
+register_provider(DeepSeekProvider(ProviderConfig(
+    name="deepseek",
+    model="deepseek-chat",
+    default_temperature=0.3,
+    default_max_tokens=MAX_TOKENS,
+)))
+register_provider(LlamaProvider(ProviderConfig(
+    name="llama",
+    model=HUGGINGFACE_MODEL,
+    default_temperature=0.7,
+    default_max_tokens=1000,
+)))
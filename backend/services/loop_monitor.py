@@ -0,0 +1,111 @@
+"""
+Детектор блокировок event loop.
+
+Heartbeat-задача в event loop раз в interval засыпает и измеряет, на сколько
+позже она проснулась (lag). Watchdog-поток следит за временем последнего
+heartbeat: если loop не отвечает дольше threshold, он снимает стек потока
+event loop прямо во время блокировки и пишет его в лог — это и есть
+виновник (sqlite3, shutil.which, файловая система и т.п. внутри async-хендлера).
+
+Метрики: гистограмма event_loop_lag_seconds, квантили event_loop_lag_quantile_seconds
+за последние LAG_WINDOW замеров и счётчик event_loop_blocked_total.
+"""
+import asyncio
+import logging
+import statistics
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from backend.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LAG_WINDOW = 600  # последние замеры для квантилей (≈1 минута при interval=0.1с)
+QUANTILES = (0.5, 0.95, 0.99)
+
+LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds", "Event loop scheduling lag measured by the heartbeat task",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_LAG_QUANTILES = REGISTRY.gauge(
+    "event_loop_lag_quantile_seconds", "Event loop lag quantiles over the recent window", ("quantile",))
+LOOP_BLOCKED = REGISTRY.counter(
+    "event_loop_blocked_total", "Times the event loop was blocked longer than the threshold")
+
+
+class LoopMonitor:
+    """Heartbeat в event loop + watchdog-поток, логирующий стек заблокированного loop."""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: deque = deque(maxlen=LAG_WINDOW)
+        self.blocked_count = 0
+        self._last_beat = time.perf_counter()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Запускает мониторинг; вызывается из работающего event loop."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1.0)
+
+    async def _heartbeat(self) -> None:
+        beats = 0
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._last_beat = now
+            lag = max(0.0, now - start - self.interval)
+            self.lags.append(lag)
+            LOOP_LAG.observe(lag)
+            beats += 1
+            if beats % 10 == 0:
+                self._update_quantiles()
+
+    def _update_quantiles(self) -> None:
+        if len(self.lags) < 2:
+            return
+        cuts = statistics.quantiles(self.lags, n=100, method="inclusive")
+        for q in QUANTILES:
+            LOOP_LAG_QUANTILES.set(str(q), value=cuts[int(q * 100) - 1])
+
+    def _watch(self) -> None:
+        reported_beat = None
+        check_every = max(self.threshold / 4, 0.01)
+        while not self._stop.wait(check_every):
+            last_beat = self._last_beat
+            stalled = time.perf_counter() - last_beat - self.interval
+            if stalled < self.threshold or reported_beat == last_beat:
+                continue
+            # Один отчёт на эпизод блокировки: следующий — только после нового heartbeat
+            reported_beat = last_beat
+            self.blocked_count += 1
+            LOOP_BLOCKED.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<no frame>"
+            logger.warning(
+                f"Event loop blocked for more than {stalled * 1000:.0f} ms "
+                f"(threshold {self.threshold * 1000:.0f} ms). Loop thread stack:\n{stack}"
+            )
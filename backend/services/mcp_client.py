@@ -1,21 +1,18 @@
 """Сервис для подключения к MCP серверам"""
 import logging
-import json
 import asyncio
 import os
-import shutil
-from typing import Dict, Any, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from urllib.parse import urlparse, urlunparse
 import httpx
 
-# Импортируем конфигурацию для HTTP подключения
-try:
-    from backend.config import MCP_WEATHER_SERVER_URL, MCP_USE_HTTP
-except ImportError:
-    # Если конфигурация не доступна, используем значения по умолчанию
-    # MCP Weather server развернут рядом с backend (тот же хост), порт 9001.
-    MCP_WEATHER_SERVER_URL = os.getenv("MCP_WEATHER_SERVER_URL", "http://185.28.85.26:9001")
-    MCP_USE_HTTP = os.getenv("MCP_USE_HTTP", "true").lower() == "true"
+from backend.services.mcp_resolver import launch_specs
+from backend.services.mcp_servers import MCPServerConfig, mcp_servers
+from backend.services.mcp_sse import MCP_HTTP_HEADERS
+from backend.services.mcp_stdio import result_or_raise, spawn_stdio_process
+from backend.services.metrics import MCP_ERRORS, observe_mcp
+from backend.services.serialization import JSONDecodeError, dumps, loads
+from backend.services.tracing import span, traced
 
 logger = logging.getLogger(__name__)
 
@@ -49,151 +46,24 @@ def _get_project_mcp_server_params():  # -> StdioServerParameters | None when MC
     )
 
 
-def _find_npx() -> Optional[str]:
-    """
-    Находит npx в PATH или в стандартных местах
-    
-    Returns:
-        Путь к npx или None, если не найден
-    """
-    # Сначала пробуем найти в PATH
-    npx_path = shutil.which("npx")
-    if npx_path:
-        return npx_path
-    
-    # Если не найден в PATH, пробуем стандартные места
-    standard_paths = [
-        "/opt/homebrew/bin/npx",  # Homebrew на Apple Silicon
-        "/usr/local/bin/npx",      # Homebrew на Intel Mac / Linux
-        "/usr/bin/npx",            # Системный
-        os.path.expanduser("~/.npm-global/bin/npx"),  # npm global
-    ]
-    
-    for path in standard_paths:
-        if os.path.exists(path) and os.access(path, os.X_OK):
-            logger.info(f"Found npx at standard location: {path}")
-            return path
-    
-    return None
-
-
-def _get_node_paths() -> list:
-    """
-    Находит пути к node и npm для добавления в PATH
-    
-    Returns:
-        Список путей к директориям с node/npm
-    """
-    paths = []
-    
-    # Ищем node в стандартных местах
-    node_paths = [
-        "/opt/homebrew/bin",      # Homebrew на Apple Silicon
-        "/usr/local/bin",         # Homebrew на Intel Mac / Linux
-        "/usr/bin",               # Системный
-        os.path.expanduser("~/.npm-global/bin"),  # npm global
-    ]
-    
-    for path in node_paths:
-        if os.path.exists(os.path.join(path, "node")):
-            paths.append(path)
-    
-    # Также проверяем через which, если доступен
-    node_path = shutil.which("node")
-    if node_path:
-        node_dir = os.path.dirname(node_path)
-        if node_dir not in paths:
-            paths.insert(0, node_dir)
-    
-    return paths
-
-
-def _resolve_mcp_server_command(server_name: str) -> Optional[str]:
-    """
-    Находит правильное имя команды для MCP сервера, проверяя оригинальное имя
-    и альтернативные варианты.
-    
-    Args:
-        server_name: Исходное имя сервера
-        
-    Returns:
-        Найденное имя команды (или полный путь, если найден) или None, если не найдено
-    """
-    # Сначала проверяем оригинальное имя
-    if os.path.isabs(server_name):
-        if os.path.exists(server_name):
-            return server_name
-    else:
-        resolved = shutil.which(server_name)
-        if resolved:
-            # Возвращаем полный путь для надежности
-            return resolved
-    
-    # Если не найдено, пробуем альтернативные имена
-    alternative_names = []
-    server_lower = server_name.lower()
-    
-    if "google" in server_lower or "search" in server_lower:
-        alternative_names = [
-            "google-search-mcp",
-            "mcp-server-google-search",
-            "google-search"
-        ]
-    elif "filesystem" in server_lower:
-        alternative_names = [
-            "mcp-server-filesystem",
-            "filesystem-mcp"
-        ]
-    elif "weather" in server_lower:
-        # Для MCP-Weather сервера пробуем найти Python скрипт
-        # Проверяем стандартные пути для установленного сервера
-        weather_paths = [
-            os.path.expanduser("~/MCP-Weather/server.py"),
-            os.path.expanduser("~/.local/share/mcp-weather/server.py"),
-            "/opt/mcp-weather/server.py",
-        ]
-        for path in weather_paths:
-            if os.path.exists(path):
-                # Возвращаем команду для запуска через Python
-                python_path = shutil.which("python3") or shutil.which("python")
-                if python_path:
-                    logger.info(f"Found MCP-Weather server at: {path}")
-                    return f"{python_path} {path}"
-        alternative_names = [
-            "mcp-weather",
-            "weather-mcp",
-            "mcp-server-weather"
-        ]
-    
-    # Пробуем найти альтернативные имена
-    for alt_name in alternative_names:
-        alt_resolved = shutil.which(alt_name)
-        if alt_resolved:
-            logger.info(f"Found MCP server with alternative name: {alt_name} (requested: {server_name}) -> {alt_resolved}")
-            # Возвращаем полный путь для надежности
-            return alt_resolved
-    
-    return None
-
-
-async def _list_tools_with_sdk(server_name: str, locale: str = "ru-RU") -> Dict[str, Any]:
-    """Использование официального MCP SDK для получения инструментов"""
-    # Сервер проекта (stdio): backend/mcp/server.py
+async def _stdio_server_params(server_name: str):  # -> StdioServerParameters
+    """Параметры SDK stdio_client: сервер проекта или закэшированный LaunchSpec."""
     if server_name == PROJECT_MCP_SERVER_NAME:
         server_params = _get_project_mcp_server_params()
         if not server_params:
             raise FileNotFoundError(
-                f"MCP SDK not available. Install with: pip install mcp (Python >=3.10)"
+                "MCP SDK not available. Install with: pip install mcp (Python >=3.10)"
             )
-    else:
-        resolved_command = _resolve_mcp_server_command(server_name)
-        if not resolved_command:
-            raise FileNotFoundError(f"MCP server '{server_name}' not found in PATH")
-        server_params = StdioServerParameters(
-            command=resolved_command,
-            args=[],
-            env=None
-        )
+        return server_params
+    spec = await launch_specs.resolve(server_name)
+    return StdioServerParameters(command=spec.command, args=list(spec.args), env=spec.full_env())
+
+
+@traced("mcp.stdio.list_tools")
+async def _list_tools_with_sdk(server_name: str, locale: str = "ru-RU") -> Dict[str, Any]:
+    """Использование официального MCP SDK для получения инструментов"""
+    # Сервер проекта (stdio): backend/mcp/server.py или найденная команда
+    server_params = await _stdio_server_params(server_name)
     
     async with stdio_client(server_params) as (read, write):
         async with ClientSession(read, write) as session:
@@ -224,212 +94,13 @@ async def _list_tools_with_sdk(server_name: str, locale: str = "ru-RU") -> Dict[
             return server_info
 
 
+@traced("mcp.stdio_fallback.list_tools")
 async def _list_tools_with_fallback(server_name: str, locale: str = "ru-RU") -> Dict[str, Any]:
     """Fallback реализация через прямое взаимодействие с MCP сервером по JSON-RPC"""
     try:
-        # Проверяем доступность npx в начале
-        npx_path = shutil.which("npx")
-        if not npx_path:
-            logger.warning("npx not found in PATH, MCP servers may not work")
-        
-        # Определяем команду для запуска сервера
-        # Используем вспомогательную функцию для поиска правильного имени
-        resolved_command = _resolve_mcp_server_command(server_name)
-        resolved = None
-        npx_args = None
-        
-        logger.info(f"Resolving MCP server '{server_name}': found command = {resolved_command}")
-        
-        if resolved_command:
-            # Функция уже возвращает полный путь, если найден
-            if os.path.exists(resolved_command):
-                resolved = resolved_command
-                logger.info(f"Using resolved binary: {resolved}")
-            elif os.path.isabs(resolved_command):
-                # Если это абсолютный путь, но файл не существует, пробуем найти через which
-                resolved = shutil.which(os.path.basename(resolved_command)) or resolved_command
-                logger.info(f"Using absolute path or which result: {resolved}")
-            else:
-                # Если это имя команды, пробуем найти его
-                resolved = shutil.which(resolved_command)
-                logger.info(f"Using which result: {resolved}")
-        
-        # Если бинарь все еще не найден, пытаемся использовать npx с соответствующим пакетом
-        if not resolved:
-            logger.info(f"Binary not found for {server_name}, will use npx fallback")
-            # Проверяем, доступен ли npx (включая стандартные места)
-            npx_path = _find_npx()
-            if not npx_path:
-                # Если npx тоже не найден, это критическая ошибка
-                raise FileNotFoundError(f"Neither MCP server '{server_name}' nor 'npx' found in PATH or standard locations")
-            
-            # Определяем npm пакет на основе имени сервера
-            npm_package = None
-            if "google" in server_name.lower() or "search" in server_name.lower():
-                npm_package = "@mcp-server/google-search-mcp"
-            elif "filesystem" in server_name.lower():
-                npm_package = "@modelcontextprotocol/server-filesystem"
-            else:
-                # Пытаемся угадать пакет из имени
-                server_part = server_name.replace("mcp-server-", "").replace("mcp_", "").replace("mcp-", "")
-                if server_part:
-                    npm_package = f"@mcp-server/{server_part}-mcp"
-            
-            if npm_package:
-                # Используем npx для запуска
-                resolved = npx_path
-                npx_args = ["-y", npm_package]
-                logger.info(f"Using npx to run {npm_package}")
-            else:
-                raise FileNotFoundError(f"MCP server '{server_name}' not found in PATH and no npx package available")
-
-        # Запускаем MCP сервер как subprocess
-        # Если бинарник найден, но не через npx, пробуем запустить напрямую
-        # Если не получается, используем npx как fallback
-        process = None
-        use_npx_fallback = False
-        
-        if npx_args:
-            # Используем npx для запуска
-            try:
-                # Подготавливаем переменные окружения с правильным PATH
-                env = dict(os.environ)
-                if "python" in resolved.lower():
-                    env["PYTHONUNBUFFERED"] = "1"
-                
-                # Добавляем пути к node в PATH, если их там нет
-                node_paths = _get_node_paths()
-                current_path = env.get("PATH", "").split(os.pathsep)
-                for node_path in node_paths:
-                    if node_path not in current_path:
-                        current_path.insert(0, node_path)
-                env["PATH"] = os.pathsep.join(current_path)
-                
-                # Настраиваем npm cache в временной директории, чтобы избежать проблем с правами
-                # Используем временную директорию или домашнюю директорию текущего пользователя
-                try:
-                    # Пробуем использовать домашнюю директорию текущего пользователя
-                    user_home = os.path.expanduser("~")
-                    # Проверяем, что это не системная директория без прав
-                    if user_home.startswith("/var/www") or not os.access(user_home, os.W_OK):
-                        # Используем временную директорию
-                        npm_cache_dir = os.path.join(os.path.expanduser("~"), ".npm-cache-mcp")
-                        # Если и это не работает, используем системную временную директорию
-                        if not os.access(os.path.dirname(npm_cache_dir), os.W_OK):
-                            npm_cache_dir = os.path.join("/tmp", f"npm-cache-mcp-{os.getuid()}")
-                    else:
-                        npm_cache_dir = os.path.join(user_home, ".npm-cache-mcp")
-                except Exception:
-                    # В крайнем случае используем /tmp
-                    npm_cache_dir = os.path.join("/tmp", f"npm-cache-mcp-{os.getuid()}")
-                
-                # Создаем директорию, если её нет
-                try:
-                    os.makedirs(npm_cache_dir, exist_ok=True, mode=0o700)
-                except (OSError, PermissionError):
-                    # Если не получилось создать, используем /tmp
-                    npm_cache_dir = os.path.join("/tmp", f"npm-cache-mcp-{os.getuid()}")
-                    os.makedirs(npm_cache_dir, exist_ok=True, mode=0o700)
-                
-                env["NPM_CONFIG_CACHE"] = npm_cache_dir
-                # Не устанавливаем NPM_CONFIG_PREFIX, чтобы не создавать проблем
-                
-                # Используем --yes для автоматического подтверждения и --prefer-offline для избежания проблем с кэшем
-                npx_args_with_flags = list(npx_args)
-                if "-y" not in npx_args_with_flags:
-                    npx_args_with_flags.insert(0, "-y")
-                
-                logger.info(f"Using npx with PATH: {env['PATH'][:100]}..., cache: {npm_cache_dir}")
-                
-                # Используем unbuffered режим для stdout/stderr
-                process = await asyncio.create_subprocess_exec(
-                    resolved,
-                    *npx_args_with_flags,
-                    stdin=asyncio.subprocess.PIPE,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    env=env
-                )
-            except Exception as e:
-                logger.warning(f"Failed to start with npx: {e}")
-                raise
-        else:
-            # Используем прямой бинарь, но если не получается, пробуем npx
-            try:
-                # Подготавливаем переменные окружения
-                env = dict(os.environ)
-                if "python" in resolved.lower():
-                    env["PYTHONUNBUFFERED"] = "1"
-                
-                # Добавляем пути к node в PATH, если их там нет (на случай, если бинарник тоже использует node)
-                node_paths = _get_node_paths()
-                current_path = env.get("PATH", "").split(os.pathsep)
-                for node_path in node_paths:
-                    if node_path not in current_path:
-                        current_path.insert(0, node_path)
-                env["PATH"] = os.pathsep.join(current_path)
-                
-                # Используем unbuffered режим для stdout/stderr
-                process = await asyncio.create_subprocess_exec(
-                    resolved,
-                    stdin=asyncio.subprocess.PIPE,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    env=env
-                )
-            except (FileNotFoundError, OSError) as e:
-                # Если прямой запуск не удался, пробуем через npx
-                logger.info(f"Direct binary execution failed for {resolved}, trying npx fallback: {e}")
-                npx_path = _find_npx()
-                if npx_path and ("google" in server_name.lower() or "search" in server_name.lower()):
-                    npm_package = "@mcp-server/google-search-mcp"
-                    resolved = npx_path
-                    npx_args = ["-y", npm_package]
-                    
-                    # Подготавливаем переменные окружения с правильным PATH
-                    env = dict(os.environ)
-                    node_paths = _get_node_paths()
-                    current_path = env.get("PATH", "").split(os.pathsep)
-                    for node_path in node_paths:
-                        if node_path not in current_path:
-                            current_path.insert(0, node_path)
-                    env["PATH"] = os.pathsep.join(current_path)
-                    
-                    # Настраиваем npm cache в временной директории, чтобы избежать проблем с правами
-                    try:
-                        # Пробуем использовать домашнюю директорию текущего пользователя
-                        user_home = os.path.expanduser("~")
-                        # Проверяем, что это не системная директория без прав
-                        if user_home.startswith("/var/www") or not os.access(user_home, os.W_OK):
-                            # Используем временную директорию
-                            npm_cache_dir = os.path.join("/tmp", f"npm-cache-mcp-{os.getuid()}")
-                        else:
-                            npm_cache_dir = os.path.join(user_home, ".npm-cache-mcp")
-                    except Exception:
-                        # В крайнем случае используем /tmp
-                        npm_cache_dir = os.path.join("/tmp", f"npm-cache-mcp-{os.getuid()}")
-                    
-                    # Создаем директорию, если её нет
-                    try:
-                        os.makedirs(npm_cache_dir, exist_ok=True, mode=0o700)
-                    except (OSError, PermissionError):
-                        # Если не получилось создать, используем /tmp
-                        npm_cache_dir = os.path.join("/tmp", f"npm-cache-mcp-{os.getuid()}")
-                        os.makedirs(npm_cache_dir, exist_ok=True, mode=0o700)
-                    
-                    env["NPM_CONFIG_CACHE"] = npm_cache_dir
-                    # Не устанавливаем NPM_CONFIG_PREFIX, чтобы не создавать проблем
-                    
-                    process = await asyncio.create_subprocess_exec(
-                        resolved,
-                        *npx_args,
-                        stdin=asyncio.subprocess.PIPE,
-                        stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.PIPE,
-                        env=env
-                    )
-                else:
-                    raise
+        # Команда запуска (PATH, npx, npm cache) берётся из кэша LaunchSpec
+        spec = await launch_specs.resolve(server_name)
+        process = await spawn_stdio_process(spec)
         
         if not process or not process.stdin or not process.stdout:
             raise RuntimeError("Failed to create subprocess pipes")
@@ -467,7 +138,7 @@ async def _list_tools_with_fallback(server_name: str, locale: str = "ru-RU") ->
             }
         }
         
-        init_message = json.dumps(init_request) + "\n"
+        init_message = dumps(init_request) + "\n"
         logger.debug(f"Sending initialize request: {init_message.strip()}")
         process.stdin.write(init_message.encode('utf-8'))
         await process.stdin.drain()
@@ -499,14 +170,14 @@ async def _list_tools_with_fallback(server_name: str, locale: str = "ru-RU") ->
             raise RuntimeError(f"Timeout waiting for server response. Stderr: {error_msg}")
         
         logger.debug(f"Received initialize response: {init_response_line.decode('utf-8', errors='ignore')[:200]}")
-        init_response = json.loads(init_response_line.decode('utf-8'))
+        init_response = loads(init_response_line)
         
         # Отправляем initialized notification
         initialized_notification = {
             "jsonrpc": "2.0",
             "method": "notifications/initialized"
         }
-        process.stdin.write((json.dumps(initialized_notification) + "\n").encode('utf-8'))
+        process.stdin.write((dumps(initialized_notification) + "\n").encode('utf-8'))
         await process.stdin.drain()
         
         # Отправляем запрос на получение списка инструментов
@@ -518,7 +189,7 @@ async def _list_tools_with_fallback(server_name: str, locale: str = "ru-RU") ->
         }
         
         logger.debug(f"Sending tools/list request")
-        process.stdin.write((json.dumps(tools_request) + "\n").encode('utf-8'))
+        process.stdin.write((dumps(tools_request) + "\n").encode('utf-8'))
         await process.stdin.drain()
         
         # Читаем ответ с увеличенным таймаутом
@@ -547,7 +218,7 @@ async def _list_tools_with_fallback(server_name: str, locale: str = "ru-RU") ->
             error_msg = stderr_output.decode('utf-8', errors='ignore') if stderr_output else "Timeout waiting for response"
             raise RuntimeError(f"Timeout waiting for tools/list response. Stderr: {error_msg}")
         
-        tools_response = json.loads(tools_response_line.decode('utf-8'))
+        tools_response = loads(tools_response_line)
         
         # Закрываем процесс
         process.stdin.close()
@@ -575,210 +246,13 @@ async def _list_tools_with_fallback(server_name: str, locale: str = "ru-RU") ->
         raise
     except asyncio.TimeoutError:
         raise RuntimeError("Timeout waiting for MCP server response")
-    except json.JSONDecodeError as e:
+    except JSONDecodeError as e:
         raise RuntimeError(f"Invalid JSON response from server: {e}")
     except Exception as e:
         raise RuntimeError(f"Error communicating with MCP server: {e}")
 
 
-# Заголовки по спецификации MCP HTTP transport (POST, Accept: application/json и text/event-stream)
-_MCP_HTTP_HEADERS = {
-    "Content-Type": "application/json",
-    "Accept": "application/json, text/event-stream",
-}
-
-# Кэш SSE-сессий для MCP серверов (Python SDK SSE требует GET /sse → session_id → POST /messages?session_id=)
-# ключ: base_url (e.g. http://185.28.85.26:9001), значение: {session_id, reader_task, response_futures}
-_sse_sessions: Dict[str, Dict[str, Any]] = {}
-_sse_lock = asyncio.Lock()
-_sse_request_id = 0
-_sse_request_id_lock = asyncio.Lock()
-
-
-def _parse_session_id_from_endpoint_data(data: str) -> Optional[str]:
-    """Из данных SSE event 'endpoint' извлекает session_id (MCP SDK: quote(path)?session_id=HEX)."""
-    if not data:
-        return None
-    from urllib.parse import unquote
-    raw = unquote(data.strip())
-    if "session_id=" in raw:
-        return raw.split("session_id=", 1)[1].split("&")[0].strip()
-    return None
-
-
-async def _sse_read_loop(
-    base_url: str,
-    stream: Any,
-    response_futures: Dict[int, asyncio.Future],
-    session_id_holder: Dict[str, str],
-    session_ready: asyncio.Event,
-) -> None:
-    """Читает SSE stream: первый event 'endpoint' → session_id, дальше 'message' → response_futures."""
-    try:
-        event_type = None
-        async for line in stream.aiter_lines():
-            if line.startswith("event:"):
-                event_type = line[6:].strip()
-            elif line.startswith("data:"):
-                data = line[5:].strip()
-                if event_type == "endpoint" and not session_id_holder.get("id"):
-                    sid = _parse_session_id_from_endpoint_data(data)
-                    if sid:
-                        session_id_holder["id"] = sid
-                        session_ready.set()
-                elif event_type == "message":
-                    try:
-                        msg = json.loads(data)
-                        rid = msg.get("id")
-                        if rid is not None:
-                            keys_to_try = [rid]
-                            if isinstance(rid, str) and rid.isdigit():
-                                keys_to_try.append(int(rid))
-                            elif isinstance(rid, int):
-                                keys_to_try.append(str(rid))
-                            for k in keys_to_try:
-                                if k in response_futures:
-                                    fut = response_futures.pop(k, None)
-                                    if fut and not fut.done():
-                                        fut.set_result(msg.get("result", msg))
-                                    break
-                    except (json.JSONDecodeError, KeyError):
-                        pass
-                event_type = None
-    except (asyncio.CancelledError, Exception) as e:
-        logger.debug(f"SSE read loop ended for {base_url}: {e}")
-    finally:
-        for fut in response_futures.values():
-            if not fut.done():
-                fut.cancel()
-
-
-async def _ensure_sse_session(base_url: str) -> str:
-    """
-    Устанавливает SSE-сессию: GET /sse, парсит session_id из event 'endpoint',
-    держит соединение открытым для приёма ответов (POST возвращает 202, ответ идёт по SSE).
-    """
-    base_clean = base_url.rstrip("/")
-    sse_url = f"{base_clean}/sse"
-    async with _sse_lock:
-        if base_clean in _sse_sessions:
-            entry = _sse_sessions[base_clean]
-            if entry.get("session_id") and (not entry.get("reader_task") or not entry["reader_task"].done()):
-                return entry["session_id"]
-            _sse_sessions.pop(base_clean, None)
-
-        response_futures: Dict[int, asyncio.Future] = {}
-        session_id_holder: Dict[str, str] = {}
-        session_ready = asyncio.Event()
-        client = httpx.AsyncClient(timeout=60.0)
-        response = await client.get(sse_url, headers=_MCP_HTTP_HEADERS)
-        response.raise_for_status()
-        reader_task = asyncio.create_task(
-            _sse_read_loop(base_url, response, response_futures, session_id_holder, session_ready)
-        )
-        _sse_sessions[base_clean] = {
-            "session_id": None,
-            "reader_task": reader_task,
-            "response_futures": response_futures,
-            "messages_url": f"{base_clean}/messages/",
-            "_client": client,
-            "initialized": False,
-        }
-    try:
-        await asyncio.wait_for(session_ready.wait(), timeout=15.0)
-    except asyncio.TimeoutError:
-        reader_task.cancel()
-        raise RuntimeError("MCP SSE: timeout waiting for session_id from /sse")
-    session_id = session_id_holder.get("id")
-    if not session_id:
-        reader_task.cancel()
-        raise RuntimeError("MCP SSE: could not get session_id from /sse endpoint event")
-    async with _sse_lock:
-        if base_clean in _sse_sessions:
-            _sse_sessions[base_clean]["session_id"] = session_id
-    logger.info(f"🌐 MCP SSE session established for {base_clean}, session_id={session_id[:8]}...")
-    return session_id
-
-
-async def _mcp_sse_do_initialize(base_clean: str, session_id: str, entry: Dict[str, Any]) -> None:
-    """MCP handshake: initialize + notifications/initialized (без этого сервер не шлёт ответы на tools/list)."""
-    response_futures = entry["response_futures"]
-    messages_url = entry["messages_url"]
-    init_id = 0
-    async with _sse_request_id_lock:
-        global _sse_request_id
-        _sse_request_id += 1
-        init_id = _sse_request_id
-    init_future: asyncio.Future = asyncio.Future()
-    response_futures[init_id] = init_future
-    post_url = f"{messages_url}?session_id={session_id}"
-    try:
-        init_request = {
-            "jsonrpc": "2.0",
-            "id": init_id,
-            "method": "initialize",
-            "params": {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {},
-                "clientInfo": {"name": "deepseek-web-client", "version": "1.0"},
-            },
-        }
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            r = await client.post(post_url, json=init_request, headers=_MCP_HTTP_HEADERS)
-            if r.status_code != 202:
-                r.raise_for_status()
-        await asyncio.wait_for(init_future, timeout=15.0)
-        notif = {"jsonrpc": "2.0", "method": "notifications/initialized", "params": {}}
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            await client.post(post_url, json=notif, headers=_MCP_HTTP_HEADERS)
-        entry["initialized"] = True
-        logger.info(f"🌐 MCP SSE initialized for {base_clean}")
-    finally:
-        response_futures.pop(init_id, None)
-
-
-async def _call_mcp_via_http_sse(base_url: str, method: str, params: Dict[str, Any], request_id: Optional[int] = None) -> Dict[str, Any]:
-    """Вызов MCP через SSE: установка сессии, при необходимости initialize, POST с session_id, ожидание ответа из SSE stream."""
-    global _sse_request_id
-    if request_id is None:
-        async with _sse_request_id_lock:
-            _sse_request_id += 1
-            request_id = _sse_request_id
-    base_clean = base_url.rstrip("/")
-    session_id = await _ensure_sse_session(base_clean)
-    entry = _sse_sessions.get(base_clean)
-    if not entry:
-        raise RuntimeError("MCP SSE session lost")
-    if not entry.get("initialized"):
-        await _mcp_sse_do_initialize(base_clean, session_id, entry)
-    response_futures = entry["response_futures"]
-    messages_url = entry["messages_url"]
-    jsonrpc_request = {
-        "jsonrpc": "2.0",
-        "id": request_id,
-        "method": method,
-        "params": params or {},
-    }
-    future: asyncio.Future = asyncio.Future()
-    response_futures[request_id] = future
-    post_url = f"{messages_url}?session_id={session_id}" if "?" not in messages_url else f"{messages_url}&session_id={session_id}"
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(post_url, json=jsonrpc_request, headers=_MCP_HTTP_HEADERS)
-            if response.status_code == 202:
-                pass  # Accepted — ответ придёт по SSE
-            else:
-                response.raise_for_status()
-                result = response.json()
-                if "error" in result:
-                    raise RuntimeError(result["error"].get("message", str(result["error"])))
-                return result.get("result", {})
-        result = await asyncio.wait_for(future, timeout=30.0)
-        return result if isinstance(result, dict) else {}
-    finally:
-        response_futures.pop(request_id, None)
-
-
+@traced("mcp.http.request")
 async def _call_mcp_via_http(server_url: str, method: str, params: Dict[str, Any] = None, request_id: int = 1) -> Dict[str, Any]:
     """
     Вызов MCP метода через HTTP
@@ -810,11 +284,11 @@ async def _call_mcp_via_http(server_url: str, method: str, params: Dict[str, Any
     last_error = None
     for url in urls_to_try:
         try:
-            logger.info(f"🌐 Calling MCP via HTTP: {url}, method: {method}, params: {params}")
+            logger.debug(f"🌐 Calling MCP via HTTP: {url}, method: {method}, params: {params}")
             async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, json=jsonrpc_request, headers=_MCP_HTTP_HEADERS)
+                response = await client.post(url, json=jsonrpc_request, headers=MCP_HTTP_HEADERS)
                 response.raise_for_status()
-                result = response.json()
+                result = loads(response.content)
                 logger.debug(f"MCP HTTP response: {result}")
                 if "error" in result:
                     error_info = result["error"]
@@ -839,7 +313,7 @@ async def _call_mcp_via_http(server_url: str, method: str, params: Dict[str, Any
             raise RuntimeError(
                 f"Failed to connect to MCP server: HTTP {e.response.status_code}. Response: {body}"
             )
-        except json.JSONDecodeError as e:
+        except JSONDecodeError as e:
             logger.error(f"Invalid JSON response from MCP server {url}: {e}")
             raise RuntimeError(f"Invalid JSON response from MCP server: {e}")
         except httpx.HTTPError as e:
@@ -852,6 +326,68 @@ async def _call_mcp_via_http(server_url: str, method: str, params: Dict[str, Any
     return {}
 
 
+async def _call_configured_server(config: MCPServerConfig, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-RPC вызов сервера из реестра по его транспорту."""
+    if config.transport == "sse":
+        with span(f"mcp.sse.{method}", server=config.name):
+            return await mcp_servers.pool(config).request(method, params)
+    if config.transport == "http":
+        return await _call_mcp_via_http(config.url, method, params)
+    with span(f"mcp.stdio_pool.{method}", server=config.name):
+        return await mcp_servers.pool(config).request(method, params)
+
+
+async def _prewarm_server(config: MCPServerConfig) -> Dict[str, Any]:
+    """Preflight (команда или URL доступны) и прогрев: подключение, initialize, tools/list."""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    if config.transport == "stdio":
+        spec = await mcp_servers.launch_spec(config)
+        exists = await asyncio.to_thread(lambda: os.path.isfile(spec.command) and os.access(spec.command, os.X_OK))
+        if not exists:
+            raise FileNotFoundError(f"Command not found or not executable: {spec.command}")
+    if config.transport != "http":
+        # Поднимаем все pool_size подключений, а не только то, что понадобится tools/list
+        await mcp_servers.pool(config).start()
+    result = await _call_configured_server(config, "tools/list", {})
+    return {
+        "state": "ready",
+        "tools": len(result.get("tools", [])),
+        "elapsed_ms": round((loop.time() - started) * 1000, 1),
+    }
+
+
+async def prewarm_mcp_servers(timeout: float = 120.0) -> Dict[str, Dict[str, Any]]:
+    """
+    Прогрев серверов реестра при старте приложения (параллельно)
+    
+    Ошибки не фатальны: сервер помечается как failed и будет подключаться
+    при первом запросе, как без прогрева.
+    
+    Returns:
+        Статус по каждому серверу (также доступен в GET /api/mcp/servers)
+    """
+    async def warm(config: MCPServerConfig) -> None:
+        mcp_servers.status[config.name] = {"state": "warming"}
+        try:
+            status = await asyncio.wait_for(_prewarm_server(config), timeout=timeout)
+            logger.info(f"MCP server '{config.name}' prewarmed in {status['elapsed_ms']} ms ({status['tools']} tools)")
+        except Exception as e:
+            status = {"state": "failed", "error": f"{type(e).__name__}: {e}"}
+            logger.warning(f"MCP server '{config.name}' prewarm failed: {status['error']}")
+        mcp_servers.status[config.name] = status
+
+    configs = [c for c in mcp_servers.configs.values() if c.prewarm]
+    await asyncio.gather(*(warm(c) for c in configs))
+    return dict(mcp_servers.status)
+
+
+async def close_mcp_servers() -> None:
+    """Закрывает пулы stdio-процессов и SSE-сессий (при остановке приложения)."""
+    pools, mcp_servers.pools = list(mcp_servers.pools.values()), {}
+    await asyncio.gather(*(pool.close() for pool in pools), return_exceptions=True)
+
+
 async def list_mcp_tools(server_name: str, locale: str = "ru-RU") -> Dict[str, Any]:
     """
     Получение списка доступных инструментов от MCP сервера
@@ -864,6 +400,15 @@ async def list_mcp_tools(server_name: str, locale: str = "ru-RU") -> Dict[str, A
     Returns:
         Словарь с информацией о сервере и инструментах
     """
+    with observe_mcp(server_name, "tools/list"), span("mcp.list_tools", server=server_name):
+        result = await _list_mcp_tools(server_name, locale)
+    if result.get("error"):
+        # Ошибки list_tools возвращаются в ответе, а не исключением
+        MCP_ERRORS.inc(server_name, "tools/list")
+    return result
+
+
+async def _list_mcp_tools(server_name: str, locale: str) -> Dict[str, Any]:
     if server_name == PROJECT_MCP_SERVER_NAME and not MCP_AVAILABLE:
         return {
             "name": PROJECT_MCP_SERVER_NAME,
@@ -871,32 +416,17 @@ async def list_mcp_tools(server_name: str, locale: str = "ru-RU") -> Dict[str, A
             "tools": [],
         }
     try:
-        # Если это weather сервер и используется HTTP, подключаемся через HTTP
-        if server_name == "mcp-weather" and MCP_USE_HTTP:
-            logger.info(f"🌐 Using HTTP connection to list tools from {MCP_WEATHER_SERVER_URL}")
+        # Серверы из реестра (mcp_servers): SSE/HTTP или пул stdio-процессов
+        config = mcp_servers.get(server_name)
+        if config is not None:
             try:
-                # Для SSE сервера используем endpoint /messages/ для JSON-RPC запросов
-                # Если URL не заканчивается на /messages/, добавляем его
-                server_url = MCP_WEATHER_SERVER_URL
-                if not server_url.endswith("/messages/") and not server_url.endswith("/messages"):
-                    # Проверяем, есть ли уже путь в URL
-                    if not any(part in server_url for part in ["/sse", "/messages", "/health"]):
-                        server_url = f"{server_url.rstrip('/')}/messages/"
-                    else:
-                        # Если есть другой путь, заменяем на /messages/
-                        parsed = urlparse(server_url)
-                        server_url = urlunparse((parsed.scheme, parsed.netloc, "/messages/", "", "", ""))
-                
-                logger.info(f"🌐 Calling MCP Weather server at: {server_url}")
-                base_url = MCP_WEATHER_SERVER_URL.rstrip("/")
-                result = await _call_mcp_via_http_sse(base_url, "tools/list", {}, request_id=None)
-                server_info = {
+                result = await _call_configured_server(config, "tools/list", {})
+                return {
                     "name": server_name,
                     "tools": result.get("tools", [])
                 }
-                return server_info
             except Exception as e:
-                logger.error(f"Error listing tools via HTTP: {e}")
+                logger.error(f"Error listing tools via {config.transport}: {e}")
                 return {
                     "name": server_name,
                     "error": str(e),
@@ -966,65 +496,12 @@ async def list_mcp_tools(server_name: str, locale: str = "ru-RU") -> Dict[str, A
         }
 
 
+@traced("mcp.stdio_fallback.call_tool")
 async def _call_tool_with_fallback(server_name: str, tool_name: str, arguments: Dict[str, Any], locale: str = "ru-RU") -> Dict[str, Any]:
     """Fallback реализация для вызова инструмента MCP через JSON-RPC"""
     try:
-        resolved_command = _resolve_mcp_server_command(server_name)
-        resolved = None
-        npx_args = None
-        
-        if resolved_command:
-            if os.path.exists(resolved_command) or os.path.isfile(resolved_command.split()[0] if ' ' in resolved_command else resolved_command):
-                resolved = resolved_command
-            else:
-                resolved = shutil.which(os.path.basename(resolved_command.split()[0] if ' ' in resolved_command else resolved_command)) or resolved_command
-        
-        if not resolved:
-            npx_path = _find_npx()
-            if npx_path:
-                server_lower = server_name.lower()
-                if "weather" in server_lower:
-                    # Для weather сервера используем Python
-                    python_path = shutil.which("python3") or shutil.which("python")
-                    if python_path:
-                        # Пробуем найти server.py
-                        weather_paths = [
-                            os.path.expanduser("~/MCP-Weather/server.py"),
-                            os.path.expanduser("~/.local/share/mcp-weather/server.py"),
-                        ]
-                        for path in weather_paths:
-                            if os.path.exists(path):
-                                resolved = f"{python_path} {path}"
-                                break
-                else:
-                    raise FileNotFoundError(f"MCP server '{server_name}' not found")
-            else:
-                raise FileNotFoundError(f"Neither MCP server '{server_name}' nor 'npx' found")
-        
-        # Подготавливаем переменные окружения
-        env = dict(os.environ)
-        if "python" in str(resolved).lower():
-            env["PYTHONUNBUFFERED"] = "1"
-        
-        # Запускаем процесс
-        if ' ' in resolved:
-            # Команда с аргументами (например, "python3 /path/to/server.py")
-            cmd_parts = resolved.split()
-            process = await asyncio.create_subprocess_exec(
-                *cmd_parts,
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                env=env
-            )
-        else:
-            process = await asyncio.create_subprocess_exec(
-                resolved,
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                env=env
-            )
+        spec = await launch_specs.resolve(server_name)
+        process = await spawn_stdio_process(spec)
         
         if not process or not process.stdin or not process.stdout:
             raise RuntimeError("Failed to create subprocess pipes")
@@ -1057,7 +534,7 @@ async def _call_tool_with_fallback(server_name: str, tool_name: str, arguments:
             }
         }
         
-        init_message = json.dumps(init_request) + "\n"
+        init_message = dumps(init_request) + "\n"
         process.stdin.write(init_message.encode('utf-8'))
         await process.stdin.drain()
         
@@ -1065,14 +542,14 @@ async def _call_tool_with_fallback(server_name: str, tool_name: str, arguments:
         if not init_response_line:
             raise RuntimeError("No response from server")
         
-        init_response = json.loads(init_response_line.decode('utf-8'))
+        init_response = loads(init_response_line)
         
         # Отправляем initialized notification
         initialized_notification = {
             "jsonrpc": "2.0",
             "method": "notifications/initialized"
         }
-        process.stdin.write((json.dumps(initialized_notification) + "\n").encode('utf-8'))
+        process.stdin.write((dumps(initialized_notification) + "\n").encode('utf-8'))
         await process.stdin.drain()
         
         # Вызываем инструмент
@@ -1086,7 +563,7 @@ async def _call_tool_with_fallback(server_name: str, tool_name: str, arguments:
             }
         }
         
-        process.stdin.write((json.dumps(call_request) + "\n").encode('utf-8'))
+        process.stdin.write((dumps(call_request) + "\n").encode('utf-8'))
         await process.stdin.drain()
         
         # Читаем ответ
@@ -1094,7 +571,7 @@ async def _call_tool_with_fallback(server_name: str, tool_name: str, arguments:
         if not call_response_line:
             raise RuntimeError("No response to tool call")
         
-        call_response = json.loads(call_response_line.decode('utf-8'))
+        call_response = loads(call_response_line)
         
         # Закрываем процесс
         process.stdin.close()
@@ -1112,7 +589,7 @@ async def _call_tool_with_fallback(server_name: str, tool_name: str, arguments:
         raise
     except asyncio.TimeoutError:
         raise RuntimeError("Timeout waiting for MCP server response")
-    except json.JSONDecodeError as e:
+    except JSONDecodeError as e:
         raise RuntimeError(f"Invalid JSON response from server: {e}")
     except Exception as e:
         raise RuntimeError(f"Error calling MCP tool: {e}")
@@ -1131,72 +608,41 @@ async def call_mcp_tool(server_name: str, tool_name: str, arguments: Dict[str, A
     Returns:
         Результат вызова инструмента
     """
+    with observe_mcp(server_name, tool_name), span("mcp.call_tool", server=server_name, tool=tool_name):
+        return await _call_mcp_tool(server_name, tool_name, arguments, locale)
+
+
+async def _call_mcp_tool(server_name: str, tool_name: str, arguments: Dict[str, Any], locale: str) -> Dict[str, Any]:
     try:
-        # Если это weather сервер и используется HTTP, подключаемся через HTTP
-        if server_name == "mcp-weather" and MCP_USE_HTTP:
-            logger.info(f"🌐 Using HTTP connection to call tool {tool_name} on {MCP_WEATHER_SERVER_URL}")
+        # Серверы из реестра (mcp_servers): SSE/HTTP или пул stdio-процессов
+        config = mcp_servers.get(server_name)
+        if config is not None:
             try:
-                # Для SSE сервера используем endpoint /messages/ для JSON-RPC запросов
-                # Если URL не заканчивается на /messages/, добавляем его
-                server_url = MCP_WEATHER_SERVER_URL
-                if not server_url.endswith("/messages/") and not server_url.endswith("/messages"):
-                    # Проверяем, есть ли уже путь в URL
-                    if not any(part in server_url for part in ["/sse", "/messages", "/health"]):
-                        server_url = f"{server_url.rstrip('/')}/messages/"
-                    else:
-                        # Если есть другой путь, заменяем на /messages/
-                        parsed = urlparse(server_url)
-                        server_url = urlunparse((parsed.scheme, parsed.netloc, "/messages/", "", "", ""))
-                
-                logger.info(f"🌐 Calling MCP Weather server at: {server_url}")
-                base_url = MCP_WEATHER_SERVER_URL.rstrip("/")
-                result = await _call_mcp_via_http_sse(
-                    base_url,
+                result = await _call_configured_server(
+                    config,
                     "tools/call",
                     {"name": tool_name, "arguments": arguments},
-                    request_id=None,
                 )
                 return {
                     "content": result.get("content", []),
                     "isError": result.get("isError", False),
                 }
             except Exception as e:
-                logger.error(f"Error calling tool via HTTP: {e}")
+                logger.error(f"Error calling tool via {config.transport}: {e}")
                 raise
         
         if MCP_AVAILABLE:
             try:
-                if server_name == PROJECT_MCP_SERVER_NAME:
-                    server_params = _get_project_mcp_server_params()
-                    if not server_params:
-                        raise FileNotFoundError(
-                            "MCP SDK not available. Install with: pip install mcp (Python >=3.10)"
-                        )
-                else:
-                    resolved_command = _resolve_mcp_server_command(server_name)
-                    if not resolved_command:
-                        raise FileNotFoundError(f"MCP server '{server_name}' not found in PATH")
-                    if ' ' in resolved_command:
-                        cmd_parts = resolved_command.split()
-                        server_params = StdioServerParameters(
-                            command=cmd_parts[0],
-                            args=cmd_parts[1:],
-                            env=None
-                        )
-                    else:
-                        server_params = StdioServerParameters(
-                            command=resolved_command,
-                            args=[],
-                            env=None
-                        )
-                async with stdio_client(server_params) as (read, write):
-                    async with ClientSession(read, write) as session:
-                        await session.initialize()
-                        result = await session.call_tool(tool_name, arguments)
-                        return {
-                            "content": result.content if hasattr(result, 'content') else [],
-                            "isError": getattr(result, 'isError', False)
-                        }
+                server_params = await _stdio_server_params(server_name)
+                with span("mcp.stdio.call_tool"):
+                    async with stdio_client(server_params) as (read, write):
+                        async with ClientSession(read, write) as session:
+                            await session.initialize()
+                            result = await session.call_tool(tool_name, arguments)
+                            return {
+                                "content": result.content if hasattr(result, 'content') else [],
+                                "isError": getattr(result, 'isError', False)
+                            }
             except FileNotFoundError:
                 logger.info(f"SDK didn't find binary for {server_name}, trying fallback")
                 return await _call_tool_with_fallback(server_name, tool_name, arguments, locale)
@@ -1210,3 +656,88 @@ async def call_mcp_tool(server_name: str, tool_name: str, arguments: Dict[str, A
     except Exception as e:
         logger.error(f"Error calling MCP tool {tool_name} from server {server_name}: {str(e)}", exc_info=True)
         raise
+
+
+def _tool_outcome(index: int, invocation: Dict[str, Any], started: float,
+                  result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> Dict[str, Any]:
+    outcome = {
+        "index": index,
+        "server_name": invocation["server_name"],
+        "tool_name": invocation["tool_name"],
+        "elapsed_ms": round((asyncio.get_running_loop().time() - started) * 1000, 1),
+    }
+    if error is not None:
+        outcome["error"] = error
+    else:
+        outcome["result"] = result
+    return outcome
+
+
+async def call_mcp_tools(invocations: List[Dict[str, Any]], locale: str = "ru-RU") -> AsyncIterator[Dict[str, Any]]:
+    """
+    Параллельный вызов нескольких инструментов на одном или нескольких MCP серверах
+    
+    Вызовы к серверу реестра с supports_batch уходят одним JSON-RPC batch, остальные
+    выполняются одновременно поверх пулов подключений (call_mcp_tool).
+    
+    Args:
+        invocations: Список {"server_name", "tool_name", "arguments"}
+        locale: Предпочтительный язык для ответов
+    
+    Yields:
+        По мере готовности: {"index", "server_name", "tool_name", "elapsed_ms"} и
+        "result" (content, isError) или "error"
+    """
+    started = asyncio.get_running_loop().time()
+    outcomes: asyncio.Queue = asyncio.Queue()
+
+    async def single(index: int, invocation: Dict[str, Any]) -> None:
+        try:
+            result = await call_mcp_tool(
+                invocation["server_name"], invocation["tool_name"], invocation.get("arguments") or {}, locale=locale,
+            )
+            outcomes.put_nowait(_tool_outcome(index, invocation, started, result=result))
+        except Exception as e:
+            outcomes.put_nowait(_tool_outcome(index, invocation, started, error=str(e)))
+
+    async def batch(config: MCPServerConfig, items: List[Tuple[int, Dict[str, Any]]]) -> None:
+        calls = [("tools/call", {"name": inv["tool_name"], "arguments": inv.get("arguments") or {}}) for _, inv in items]
+        try:
+            with observe_mcp(config.name, "batch"), span("mcp.call_tools.batch", server=config.name, size=len(calls)):
+                messages = await mcp_servers.pool(config).request_batch(calls)
+        except Exception as e:
+            logger.error(f"Error calling MCP batch on {config.name}: {e}")
+            for index, inv in items:
+                outcomes.put_nowait(_tool_outcome(index, inv, started, error=str(e)))
+            return
+        for (index, inv), message in zip(items, messages):
+            try:
+                result = result_or_raise(message)
+                outcomes.put_nowait(_tool_outcome(index, inv, started, result={
+                    "content": result.get("content", []),
+                    "isError": result.get("isError", False),
+                }))
+            except RuntimeError as e:
+                outcomes.put_nowait(_tool_outcome(index, inv, started, error=str(e)))
+
+    batches: Dict[str, Tuple[MCPServerConfig, List[Tuple[int, Dict[str, Any]]]]] = {}
+    tasks = []
+    for index, invocation in enumerate(invocations):
+        config = mcp_servers.get(invocation["server_name"])
+        if config is not None and config.supports_batch:
+            batches.setdefault(config.name, (config, []))[1].append((index, invocation))
+        else:
+            tasks.append(asyncio.create_task(single(index, invocation)))
+    for config, items in batches.values():
+        if len(items) == 1:
+            tasks.append(asyncio.create_task(single(*items[0])))
+        else:
+            tasks.append(asyncio.create_task(batch(config, items)))
+
+    try:
+        for _ in invocations:
+            yield await outcomes.get()
+    finally:
+        # Клиент отключился или генератор закрыт раньше: оставшиеся вызовы не нужны
+        for task in tasks:
+            task.cancel()
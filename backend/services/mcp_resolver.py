@@ -0,0 +1,365 @@
+"""
+Разрешение команд запуска stdio MCP-серверов с кэшированием.
+
+Поиск бинарника (PATH, альтернативные имена, скрипт MCP-Weather), npx и node,
+подготовка PATH и каталога npm cache выполняются один раз на имя сервера.
+Результат — LaunchSpec; запись кэша сбрасывается по TTL или при изменении
+mtime запускаемых файлов. Первый расчёт выполняется в пуле потоков, чтобы
+обход файловой системы не блокировал event loop.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.config import MCP_RESOLVER_TTL
+from backend.services.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Отрицательный результат (сервер не найден) кэшируем коротко: его могут установить
+NEGATIVE_TTL = 30.0
+# Как часто (секунды) перепроверять mtime файлов у закэшированной записи
+MTIME_CHECK_INTERVAL = 5.0
+
+
+@dataclass(frozen=True)
+class LaunchSpec:
+    """Как запустить stdio MCP-сервер: команда, аргументы, дополнения к окружению."""
+    server_name: str
+    command: str
+    args: Tuple[str, ...] = ()
+    env: Dict[str, str] = field(default_factory=dict)  # поверх os.environ
+    npm_cache_dir: Optional[str] = None
+    source: str = "path"  # path | alternative | script | npx
+
+    @property
+    def via_npx(self) -> bool:
+        return self.source == "npx"
+
+    def full_env(self) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update(self.env)
+        return env
+
+    def argv(self) -> List[str]:
+        return [self.command, *self.args]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "server_name": self.server_name,
+            "command": self.command,
+            "args": list(self.args),
+            "env": self.env,
+            "npm_cache_dir": self.npm_cache_dir,
+            "source": self.source,
+        }
+
+
+def _find_npx() -> Optional[str]:
+    """
+    Находит npx в PATH или в стандартных местах
+
+    Returns:
+        Путь к npx или None, если не найден
+    """
+    # Сначала пробуем найти в PATH
+    npx_path = shutil.which("npx")
+    if npx_path:
+        return npx_path
+
+    # Если не найден в PATH, пробуем стандартные места
+    standard_paths = [
+        "/opt/homebrew/bin/npx",  # Homebrew на Apple Silicon
+        "/usr/local/bin/npx",      # Homebrew на Intel Mac / Linux
+        "/usr/bin/npx",            # Системный
+        os.path.expanduser("~/.npm-global/bin/npx"),  # npm global
+    ]
+
+    for path in standard_paths:
+        if os.path.exists(path) and os.access(path, os.X_OK):
+            logger.info(f"Found npx at standard location: {path}")
+            return path
+
+    return None
+
+
+def _get_node_paths() -> list:
+    """
+    Находит пути к node и npm для добавления в PATH
+
+    Returns:
+        Список путей к директориям с node/npm
+    """
+    paths = []
+
+    # Ищем node в стандартных местах
+    node_paths = [
+        "/opt/homebrew/bin",      # Homebrew на Apple Silicon
+        "/usr/local/bin",         # Homebrew на Intel Mac / Linux
+        "/usr/bin",               # Системный
+        os.path.expanduser("~/.npm-global/bin"),  # npm global
+    ]
+
+    for path in node_paths:
+        if os.path.exists(os.path.join(path, "node")):
+            paths.append(path)
+
+    # Также проверяем через which, если доступен
+    node_path = shutil.which("node")
+    if node_path:
+        node_dir = os.path.dirname(node_path)
+        if node_dir not in paths:
+            paths.insert(0, node_dir)
+
+    return paths
+
+
+def _resolve_mcp_server_command(server_name: str) -> Optional[str]:
+    """
+    Находит правильное имя команды для MCP сервера, проверяя оригинальное имя
+    и альтернативные варианты.
+
+    Args:
+        server_name: Исходное имя сервера
+
+    Returns:
+        Найденное имя команды (или полный путь, если найден) или None, если не найдено
+    """
+    # Сначала проверяем оригинальное имя
+    if os.path.isabs(server_name):
+        if os.path.exists(server_name):
+            return server_name
+    else:
+        resolved = shutil.which(server_name)
+        if resolved:
+            # Возвращаем полный путь для надежности
+            return resolved
+
+    # Если не найдено, пробуем альтернативные имена
+    alternative_names = []
+    server_lower = server_name.lower()
+
+    if "google" in server_lower or "search" in server_lower:
+        alternative_names = [
+            "google-search-mcp",
+            "mcp-server-google-search",
+            "google-search"
+        ]
+    elif "filesystem" in server_lower:
+        alternative_names = [
+            "mcp-server-filesystem",
+            "filesystem-mcp"
+        ]
+    elif "weather" in server_lower:
+        # Для MCP-Weather сервера пробуем найти Python скрипт
+        # Проверяем стандартные пути для установленного сервера
+        weather_paths = [
+            os.path.expanduser("~/MCP-Weather/server.py"),
+            os.path.expanduser("~/.local/share/mcp-weather/server.py"),
+            "/opt/mcp-weather/server.py",
+        ]
+        for path in weather_paths:
+            if os.path.exists(path):
+                # Возвращаем команду для запуска через Python
+                python_path = shutil.which("python3") or shutil.which("python")
+                if python_path:
+                    logger.info(f"Found MCP-Weather server at: {path}")
+                    return f"{python_path} {path}"
+        alternative_names = [
+            "mcp-weather",
+            "weather-mcp",
+            "mcp-server-weather"
+        ]
+
+    # Пробуем найти альтернативные имена
+    for alt_name in alternative_names:
+        alt_resolved = shutil.which(alt_name)
+        if alt_resolved:
+            logger.info(f"Found MCP server with alternative name: {alt_name} (requested: {server_name}) -> {alt_resolved}")
+            # Возвращаем полный путь для надежности
+            return alt_resolved
+
+    return None
+
+
+def _guess_npm_package(server_name: str) -> Optional[str]:
+    """npm-пакет для запуска через npx, если бинарник сервера не установлен."""
+    server_lower = server_name.lower()
+    if "google" in server_lower or "search" in server_lower:
+        return "@mcp-server/google-search-mcp"
+    if "filesystem" in server_lower:
+        return "@modelcontextprotocol/server-filesystem"
+    server_part = server_name.replace("mcp-server-", "").replace("mcp_", "").replace("mcp-", "")
+    return f"@mcp-server/{server_part}-mcp" if server_part else None
+
+
+def _npm_cache_dir() -> str:
+    """Каталог npm cache, доступный на запись (домашний каталог или /tmp)."""
+    fallback = os.path.join("/tmp", f"npm-cache-mcp-{os.getuid()}")
+    try:
+        user_home = os.path.expanduser("~")
+        # Системные домашние каталоги без прав на запись (например, /var/www у www-data)
+        if user_home.startswith("/var/www") or not os.access(user_home, os.W_OK):
+            npm_cache_dir = fallback
+        else:
+            npm_cache_dir = os.path.join(user_home, ".npm-cache-mcp")
+    except Exception:
+        npm_cache_dir = fallback
+    try:
+        os.makedirs(npm_cache_dir, exist_ok=True, mode=0o700)
+    except OSError:
+        npm_cache_dir = fallback
+        os.makedirs(npm_cache_dir, exist_ok=True, mode=0o700)
+    return npm_cache_dir
+
+
+def _path_with_node(env_path: str) -> str:
+    current_path = env_path.split(os.pathsep) if env_path else []
+    for node_path in _get_node_paths():
+        if node_path not in current_path:
+            current_path.insert(0, node_path)
+    return os.pathsep.join(current_path)
+
+
+def compute_launch_spec(server_name: str) -> LaunchSpec:
+    """
+    Разрешает команду запуска сервера (без кэша; синхронно обходит файловую систему)
+
+    Raises:
+        FileNotFoundError: если не найден ни бинарник сервера, ни npx с подходящим пакетом
+    """
+    env: Dict[str, str] = {"PATH": _path_with_node(os.environ.get("PATH", ""))}
+    resolved_command = _resolve_mcp_server_command(server_name)
+
+    if resolved_command:
+        parts = resolved_command.split()
+        if len(parts) > 1:
+            source = "script"
+        elif os.path.basename(parts[0]) == server_name or parts[0] == server_name:
+            source = "path"
+        else:
+            source = "alternative"
+        if "python" in resolved_command.lower():
+            env["PYTHONUNBUFFERED"] = "1"
+        return LaunchSpec(server_name, parts[0], tuple(parts[1:]), env, None, source)
+
+    npx_path = _find_npx()
+    if not npx_path:
+        raise FileNotFoundError(f"Neither MCP server '{server_name}' nor 'npx' found in PATH or standard locations")
+    npm_package = _guess_npm_package(server_name)
+    if not npm_package:
+        raise FileNotFoundError(f"MCP server '{server_name}' not found in PATH and no npx package available")
+
+    npm_cache_dir = _npm_cache_dir()
+    env["NPM_CONFIG_CACHE"] = npm_cache_dir
+    logger.info(f"Using npx to run {npm_package} for {server_name} (cache: {npm_cache_dir})")
+    return LaunchSpec(server_name, npx_path, ("-y", npm_package), env, npm_cache_dir, "npx")
+
+
+def _file_mtimes(spec: LaunchSpec) -> Dict[str, float]:
+    """mtime запускаемых файлов: бинарник и аргументы-пути (скрипт сервера)."""
+    mtimes = {}
+    for path in (spec.command, *spec.args):
+        if os.path.isabs(path):
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                mtimes[path] = -1.0
+    return mtimes
+
+
+class _Entry:
+    __slots__ = ("spec", "error", "created_at", "expires_at", "mtimes", "checked_at", "hits")
+
+    def __init__(self, spec: Optional[LaunchSpec], error: Optional[str], ttl: float):
+        now = time.monotonic()
+        self.spec = spec
+        self.error = error
+        self.created_at = now
+        self.expires_at = now + ttl
+        self.mtimes = _file_mtimes(spec) if spec else {}
+        self.checked_at = now
+        self.hits = 0
+
+    def is_valid(self) -> bool:
+        now = time.monotonic()
+        if now >= self.expires_at:
+            return False
+        if self.mtimes and now - self.checked_at >= MTIME_CHECK_INTERVAL:
+            self.checked_at = now
+            return _file_mtimes(self.spec) == self.mtimes
+        return True
+
+
+class LaunchSpecRegistry:
+    """Кэш LaunchSpec по имени сервера с TTL и проверкой mtime."""
+
+    def __init__(self, ttl: float = MCP_RESOLVER_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, _Entry] = {}
+
+    def _lookup(self, server_name: str) -> Optional[_Entry]:
+        entry = self._entries.get(server_name)
+        if entry is not None and entry.is_valid():
+            entry.hits += 1
+            record_cache("mcp_launch_spec", True)
+            return entry
+        record_cache("mcp_launch_spec", False)
+        return None
+
+    def _store(self, server_name: str) -> _Entry:
+        try:
+            entry = _Entry(compute_launch_spec(server_name), None, self.ttl)
+        except FileNotFoundError as e:
+            entry = _Entry(None, str(e), min(self.ttl, NEGATIVE_TTL))
+        self._entries[server_name] = entry
+        return entry
+
+    @staticmethod
+    def _result(entry: _Entry) -> LaunchSpec:
+        if entry.spec is None:
+            raise FileNotFoundError(entry.error)
+        return entry.spec
+
+    def get(self, server_name: str) -> LaunchSpec:
+        """Синхронный вариант (для кода вне event loop)."""
+        entry = self._lookup(server_name) or self._store(server_name)
+        return self._result(entry)
+
+    async def resolve(self, server_name: str) -> LaunchSpec:
+        """LaunchSpec для сервера; при промахе кэша расчёт идёт в пуле потоков."""
+        entry = self._lookup(server_name)
+        if entry is None:
+            entry = await asyncio.to_thread(self._store, server_name)
+        return self._result(entry)
+
+    def invalidate(self, server_name: Optional[str] = None) -> int:
+        """Сбрасывает запись для сервера (или все); возвращает число удалённых записей."""
+        if server_name is None:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+        return 1 if self._entries.pop(server_name, None) else 0
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Состояние кэша для GET /api/mcp/resolver."""
+        now = time.monotonic()
+        items = []
+        for name, entry in self._entries.items():
+            items.append({
+                "server_name": name,
+                "spec": entry.spec.to_dict() if entry.spec else None,
+                "error": entry.error,
+                "age_seconds": round(now - entry.created_at, 1),
+                "expires_in_seconds": round(max(0.0, entry.expires_at - now), 1),
+                "watched_files": entry.mtimes,
+                "hits": entry.hits,
+            })
+        return items
+
+
+launch_specs = LaunchSpecRegistry()
@@ -0,0 +1,182 @@
+"""
+Декларативный реестр MCP-серверов.
+
+Серверы описываются в JSON-файле (MCP_SERVERS_CONFIG, пример — mcp_servers.example.json):
+
+    {
+      "servers": {
+        "mcp-weather": {"transport": "sse", "url": "http://127.0.0.1:9001"},
+        "google-search": {
+          "transport": "stdio",
+          "command": "npx", "args": ["-y", "@mcp-server/google-search-mcp"],
+          "env": {"GOOGLE_API_KEY": "..."},
+          "pool_size": 2
+        }
+      }
+    }
+
+Без файла в реестре есть только mcp-weather (SSE на MCP_WEATHER_SERVER_URL), если
+MCP_USE_HTTP=true. Серверы вне реестра обслуживаются как раньше: поиск команды
+эвристиками (mcp_resolver) и отдельный процесс на каждый вызов.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from backend.config import (
+    MCP_SERVERS_CONFIG,
+    MCP_SSE_HEARTBEAT_INTERVAL,
+    MCP_SSE_MAX_IN_FLIGHT,
+    MCP_SSE_POOL_SIZE,
+    MCP_USE_HTTP,
+    MCP_WEATHER_SERVER_URL,
+)
+from backend.services.mcp_resolver import LaunchSpec, launch_specs
+from backend.services.mcp_sse import SSEPool
+from backend.services.mcp_stdio import StdioPool
+
+logger = logging.getLogger(__name__)
+
+TRANSPORTS = ("stdio", "sse", "http")
+
+
+@dataclass
+class MCPServerConfig:
+    """Описание одного MCP-сервера из конфигурации."""
+    name: str
+    transport: str = "stdio"
+    command: Optional[str] = None
+    args: List[str] = field(default_factory=list)
+    env: Dict[str, str] = field(default_factory=dict)
+    url: Optional[str] = None
+    pool_size: int = 1
+    max_in_flight: int = MCP_SSE_MAX_IN_FLIGHT
+    supports_batch: bool = False
+    prewarm: bool = True
+
+    @classmethod
+    def from_dict(cls, name: str, data: Dict[str, Any]) -> "MCPServerConfig":
+        """
+        Raises:
+            ValueError: неизвестный транспорт, нет url для sse/http, неверный pool_size,
+                supports_batch для http
+        """
+        config = cls(
+            name=name,
+            transport=data.get("transport", "stdio"),
+            command=data.get("command"),
+            args=[str(a) for a in data.get("args", [])],
+            env={str(k): str(v) for k, v in data.get("env", {}).items()},
+            url=data.get("url"),
+            pool_size=int(data.get("pool_size", MCP_SSE_POOL_SIZE if data.get("transport") == "sse" else 1)),
+            max_in_flight=int(data.get("max_in_flight", MCP_SSE_MAX_IN_FLIGHT)),
+            supports_batch=bool(data.get("supports_batch", False)),
+            prewarm=bool(data.get("prewarm", True)),
+        )
+        if config.transport not in TRANSPORTS:
+            raise ValueError(f"MCP server '{name}': unknown transport '{config.transport}' (expected one of {TRANSPORTS})")
+        if config.transport in ("sse", "http") and not config.url:
+            raise ValueError(f"MCP server '{name}': 'url' is required for transport '{config.transport}'")
+        if config.supports_batch and config.transport == "http":
+            raise ValueError(f"MCP server '{name}': supports_batch is available for stdio and sse transports only")
+        if config.pool_size < 1 or config.max_in_flight < 1:
+            raise ValueError(f"MCP server '{name}': pool_size and max_in_flight must be >= 1")
+        return config
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "transport": self.transport,
+            "command": self.command,
+            "args": self.args,
+            "env": sorted(self.env),  # только имена: значения могут быть секретами
+            "url": self.url,
+            "pool_size": self.pool_size,
+            "max_in_flight": self.max_in_flight,
+            "supports_batch": self.supports_batch,
+            "prewarm": self.prewarm,
+        }
+
+
+def load_server_configs(path: Optional[str] = MCP_SERVERS_CONFIG) -> Dict[str, MCPServerConfig]:
+    """Конфигурация по умолчанию (mcp-weather по HTTP) плюс серверы из JSON-файла."""
+    configs: Dict[str, MCPServerConfig] = {}
+    if MCP_USE_HTTP:
+        configs["mcp-weather"] = MCPServerConfig(
+            "mcp-weather", transport="sse", url=MCP_WEATHER_SERVER_URL.rstrip("/"), pool_size=MCP_SSE_POOL_SIZE,
+        )
+    if not path:
+        return configs
+    config_path = Path(path)
+    if not config_path.exists():
+        logger.warning(f"MCP servers config not found: {config_path}")
+        return configs
+    # Реестр создаётся при импорте: ошибка в файле не должна мешать запуску приложения
+    try:
+        data = json.loads(config_path.read_text(encoding="utf-8"))
+        servers = {name: MCPServerConfig.from_dict(name, item) for name, item in data.get("servers", {}).items()}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.error(f"Invalid MCP servers config {config_path}: {e!r}; using default servers only")
+        return configs
+    configs.update(servers)
+    logger.info(f"Loaded {len(servers)} MCP servers from {config_path}")
+    return configs
+
+
+class MCPServerRegistry:
+    """Конфигурации серверов, пулы подключений (stdio и SSE) и результаты preflight/prewarm."""
+
+    def __init__(self, configs: Dict[str, MCPServerConfig]):
+        self.configs = configs
+        self.pools: Dict[str, Union[StdioPool, SSEPool]] = {}
+        self.status: Dict[str, Dict[str, Any]] = {}
+
+    def get(self, name: str) -> Optional[MCPServerConfig]:
+        return self.configs.get(name)
+
+    async def launch_spec(self, config: MCPServerConfig) -> LaunchSpec:
+        """Команда из конфигурации или, если её нет, найденная эвристиками mcp_resolver."""
+        if not config.command:
+            return await launch_specs.resolve(config.name)
+        command = config.command
+        if not os.path.isabs(command):
+            # Поиск по PATH обращается к файловой системе — не в event loop
+            command = await asyncio.to_thread(shutil.which, command) or command
+        env = dict(config.env)
+        if "python" in command.lower():
+            env.setdefault("PYTHONUNBUFFERED", "1")
+        return LaunchSpec(config.name, command, tuple(config.args), env, env.get("NPM_CONFIG_CACHE"), "config")
+
+    def pool(self, config: MCPServerConfig) -> Union[StdioPool, SSEPool]:
+        """
+        Пул подключений сервера: процессы для stdio, сессии для sse
+        
+        Создаётся при первом обращении, подключения — при первом запросе или прогреве.
+        """
+        pool = self.pools.get(config.name)
+        if pool is None:
+            if config.transport == "sse":
+                pool = SSEPool(config.url, config.pool_size, config.max_in_flight, MCP_SSE_HEARTBEAT_INTERVAL)
+            else:
+                pool = StdioPool(config.name, lambda: self.launch_spec(config), config.pool_size)
+            self.pools[config.name] = pool
+        return pool
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Состояние для GET /api/mcp/servers."""
+        items = []
+        for name, config in self.configs.items():
+            item = config.to_dict()
+            item["status"] = self.status.get(name, {"state": "pending"})
+            if name in self.pools:
+                item["alive_connections"] = self.pools[name].alive_count
+            items.append(item)
+        return items
+
+
+mcp_servers = MCPServerRegistry(load_server_configs())
@@ -0,0 +1,350 @@
+"""
+Пул SSE-сессий к HTTP MCP-серверам (SSE transport MCP Python SDK).
+
+Протокол: GET /sse держит поток событий; первое событие "endpoint" содержит
+session_id, JSON-RPC запросы отправляются POST /messages/?session_id=... (ответ 202),
+а ответы приходят событиями "message" в поток этой сессии.
+
+SSESession — одна такая сессия после initialize с ограничением числа запросов
+в полёте. SSEPool держит N сессий на сервер: выбирает наименее загруженную,
+проверяет простаивающие сессии пингом (heartbeat), переподключает упавшие
+в фоне и повторяет запросы, потерянные вместе с сессией, на живой.
+"""
+import asyncio
+import itertools
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+import httpx
+
+from backend.services.mcp_stdio import PROTOCOL_VERSION, MCPConnectionError, result_or_raise
+from backend.services.serialization import JSONDecodeError, dumps_bytes, loads
+from backend.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Заголовки по спецификации MCP HTTP transport (POST, Accept: application/json и text/event-stream)
+MCP_HTTP_HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json, text/event-stream",
+}
+POST_TIMEOUT = 30.0
+# Пауза перед повторным подключением после неудачи растёт до этого значения
+MAX_RECONNECT_DELAY = 30.0
+
+
+def _parse_session_id_from_endpoint_data(data: str) -> Optional[str]:
+    """Из данных SSE event 'endpoint' извлекает session_id (MCP SDK: quote(path)?session_id=HEX)."""
+    if not data:
+        return None
+    raw = unquote(data.strip())
+    if "session_id=" in raw:
+        return raw.split("session_id=", 1)[1].split("&")[0].strip()
+    return None
+
+
+class _SSELineParser:
+    """Разбор строк SSE: запоминает "event:", на строке "data:" возвращает пару (event, data)."""
+    __slots__ = ("event_type",)
+
+    def __init__(self) -> None:
+        self.event_type: Optional[str] = None
+
+    def feed(self, line: str) -> Optional[Tuple[Optional[str], str]]:
+        if line.startswith("event:"):
+            self.event_type = line[6:].strip()
+            return None
+        if line.startswith("data:"):
+            event_type, self.event_type = self.event_type, None
+            return event_type, line[5:].strip()
+        return None
+
+
+def _dispatch_sse_message(data: str, response_futures: Dict[Any, asyncio.Future]) -> None:
+    """Передаёт JSON-RPC ответ из SSE event 'message' в ожидающий future по его id."""
+    try:
+        msg = loads(data)
+    except JSONDecodeError:
+        return
+    for item in msg if isinstance(msg, list) else [msg]:
+        rid = item.get("id") if isinstance(item, dict) else None
+        if rid is None:
+            continue
+        keys_to_try = [rid]
+        if isinstance(rid, str) and rid.isdigit():
+            keys_to_try.append(int(rid))
+        elif isinstance(rid, int):
+            keys_to_try.append(str(rid))
+        for k in keys_to_try:
+            if k in response_futures:
+                fut = response_futures.pop(k, None)
+                if fut and not fut.done():
+                    fut.set_result(item)
+                break
+
+
+class SSESession:
+    """Одна инициализированная SSE-сессия к MCP-серверу."""
+
+    def __init__(self, base_url: str, max_in_flight: int = 32):
+        self.base_url = base_url.rstrip("/")
+        self.session_id: Optional[str] = None
+        self.in_flight = 0
+        self.last_activity = 0.0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._futures: Dict[Any, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self.max_in_flight = max_in_flight
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._closed = False
+
+    @property
+    def alive(self) -> bool:
+        return self.session_id is not None and not self._closed and self._reader is not None and not self._reader.done()
+
+    @property
+    def messages_url(self) -> str:
+        return f"{self.base_url}/messages/?session_id={self.session_id}"
+
+    async def connect(self, timeout: float = 15.0) -> None:
+        """GET /sse, ожидание session_id и MCP handshake (initialize + notifications/initialized)."""
+        loop = asyncio.get_running_loop()
+        # Один клиент на сессию: поток /sse занимает одно соединение, POST-ы идут по
+        # keep-alive соединениям пула (не больше max_in_flight одновременно).
+        # read=None: поток событий может молчать сколько угодно, живость проверяет heartbeat пула
+        connections = self.max_in_flight + 1
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(POST_TIMEOUT, read=None),
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+        )
+        try:
+            request = self._client.build_request("GET", f"{self.base_url}/sse", headers=MCP_HTTP_HEADERS)
+            response = await asyncio.wait_for(self._client.send(request, stream=True), timeout=timeout)
+            response.raise_for_status()
+            endpoint = loop.create_future()
+            self.last_activity = loop.time()
+            self._reader = asyncio.create_task(self._read_loop(response, endpoint))
+            try:
+                self.session_id = await asyncio.wait_for(endpoint, timeout=timeout)
+            except asyncio.TimeoutError:
+                raise RuntimeError("MCP SSE: timeout waiting for session_id from /sse")
+            with span("mcp.sse.initialize"):
+                await self.request("initialize", {
+                    "protocolVersion": PROTOCOL_VERSION,
+                    "capabilities": {},
+                    "clientInfo": {"name": "deepseek-web-client", "version": "1.0"},
+                }, timeout=timeout)
+                await self.notify("notifications/initialized")
+        except BaseException:
+            await self.close()
+            raise
+        logger.info(f"🌐 MCP SSE session ready for {self.base_url}, session_id={self.session_id[:8]}...")
+
+    async def _read_loop(self, response: httpx.Response, endpoint: asyncio.Future) -> None:
+        loop = asyncio.get_running_loop()
+        parser = _SSELineParser()
+        try:
+            async for line in response.aiter_lines():
+                self.last_activity = loop.time()
+                event = parser.feed(line)
+                if event is None:
+                    continue
+                event_type, data = event
+                if event_type == "endpoint" and not endpoint.done():
+                    session_id = _parse_session_id_from_endpoint_data(data)
+                    if session_id:
+                        endpoint.set_result(session_id)
+                elif event_type == "message":
+                    _dispatch_sse_message(data, self._futures)
+        except (asyncio.CancelledError, Exception) as e:
+            logger.debug(f"SSE read loop ended for {self.base_url}: {e}")
+        finally:
+            await response.aclose()
+            error = MCPConnectionError(f"MCP SSE session to {self.base_url} closed")
+            if not endpoint.done():
+                endpoint.set_exception(error)
+            for future in self._futures.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._futures.clear()
+
+    async def _post(self, payload: Any) -> httpx.Response:
+        if self._closed:
+            raise MCPConnectionError(f"MCP SSE session to {self.base_url} is closed")
+        response = await self._client.post(self.messages_url, content=dumps_bytes(payload), headers=MCP_HTTP_HEADERS,
+                                           timeout=POST_TIMEOUT)
+        if response.status_code == 404:
+            # Сервер забыл сессию (перезапуск): считаем её потерянной, пул переподключится
+            await self.close()
+            raise MCPConnectionError(f"MCP SSE session {self.session_id[:8]} is unknown to {self.base_url}")
+        if response.status_code != 202:
+            response.raise_for_status()
+        return response
+
+    async def notify(self, method: str, params: Optional[Dict[str, Any]] = None) -> None:
+        await self._post({"jsonrpc": "2.0", "method": method, "params": params or {}})
+
+    async def request(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: float = 30.0) -> Dict[str, Any]:
+        """JSON-RPC запрос в рамках сессии; ошибка сервера → RuntimeError, потеря сессии → MCPConnectionError."""
+        messages = await self._exchange([(method, params)], timeout, batch=False)
+        return result_or_raise(messages[0])
+
+    async def request_batch(self, calls: List[Tuple[str, Optional[Dict[str, Any]]]], timeout: float = 30.0) -> List[Dict[str, Any]]:
+        """JSON-RPC batch одним POST; возвращает ответы (с result или error) в порядке calls."""
+        return await self._exchange(calls, timeout, batch=True)
+
+    async def _exchange(self, calls: List[Tuple[str, Optional[Dict[str, Any]]]], timeout: float, batch: bool) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        self.in_flight += len(calls)
+        try:
+            # Batch занимает один слот: на сервер уходит один POST
+            async with self._slots:
+                if not self.alive:
+                    raise MCPConnectionError(f"MCP SSE session to {self.base_url} is closed")
+                payload, futures = [], []
+                for method, params in calls:
+                    request_id = next(self._ids)
+                    futures.append((request_id, loop.create_future()))
+                    self._futures[request_id] = futures[-1][1]
+                    payload.append({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}})
+                try:
+                    response = await self._post(payload if batch else payload[0])
+                    if response.status_code != 202:
+                        # Сервер ответил сразу в теле, а не через SSE
+                        body = loads(response.content)
+                        by_id = {m.get("id"): m for m in (body if isinstance(body, list) else [body])}
+                        return [by_id.get(request_id, {"error": {"message": "missing response"}}) for request_id, _ in futures]
+                    return list(await asyncio.wait_for(asyncio.gather(*(f for _, f in futures)), timeout=timeout))
+                finally:
+                    for request_id, _ in futures:
+                        self._futures.pop(request_id, None)
+        except httpx.TransportError as e:
+            raise MCPConnectionError(f"MCP SSE POST to {self.base_url} failed: {e}") from e
+        finally:
+            self.in_flight -= len(calls)
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._reader is not None and not self._reader.done():
+            self._reader.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+
+
+class SSEPool:
+    """Пул SSE-сессий к одному MCP-серверу с heartbeat, переподключением и failover."""
+
+    def __init__(self, base_url: str, size: int = 2, max_in_flight: int = 32,
+                 heartbeat_interval: float = 15.0, heartbeat_timeout: float = 10.0):
+        self.name = base_url
+        self.base_url = base_url.rstrip("/")
+        self.size = max(1, size)
+        self.max_in_flight = max_in_flight
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self._sessions: List[SSESession] = []
+        self._lock = asyncio.Lock()
+        self._supervisor: Optional[asyncio.Task] = None
+        self._refill: Optional[asyncio.Task] = None
+        self._reconnect_delay = 1.0
+
+    @property
+    def alive_count(self) -> int:
+        return sum(1 for s in self._sessions if s.alive)
+
+    async def start(self) -> None:
+        """Поднимает недостающие сессии до size (параллельно) и запускает heartbeat."""
+        async with self._lock:
+            self._sessions = [s for s in self._sessions if s.alive]
+            missing = self.size - len(self._sessions)
+            if missing > 0:
+                fresh = [SSESession(self.base_url, self.max_in_flight) for _ in range(missing)]
+                results = await asyncio.gather(*(s.connect() for s in fresh), return_exceptions=True)
+                errors = [r for r in results if isinstance(r, BaseException)]
+                self._sessions.extend(s for s, r in zip(fresh, results) if not isinstance(r, BaseException))
+                for error in errors:
+                    logger.warning(f"MCP SSE pool {self.base_url}: session failed to connect: {error}")
+                if errors and not self._sessions:
+                    raise errors[0]
+            if self._supervisor is None or self._supervisor.done():
+                self._supervisor = asyncio.create_task(self._supervise())
+
+    async def _supervise(self) -> None:
+        """Пингует простаивающие сессии и восстанавливает пул до size с растущей паузой."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = loop.time()
+            idle = [s for s in self._sessions
+                    if s.alive and s.in_flight == 0 and now - s.last_activity >= self.heartbeat_interval]
+            await asyncio.gather(*(self._heartbeat(s) for s in idle))
+            if self.alive_count >= self.size:
+                self._reconnect_delay = 1.0
+                continue
+            try:
+                await self.start()
+                self._reconnect_delay = 1.0
+            except Exception as e:
+                logger.warning(f"MCP SSE pool {self.base_url}: reconnect failed: {e}")
+                await asyncio.sleep(self._reconnect_delay)
+                self._reconnect_delay = min(self._reconnect_delay * 2, MAX_RECONNECT_DELAY)
+
+    async def _heartbeat(self, session: SSESession) -> None:
+        try:
+            await session.request("ping", timeout=self.heartbeat_timeout)
+        except Exception as e:
+            logger.warning(f"MCP SSE pool {self.base_url}: heartbeat failed, dropping session: {e}")
+            await session.close()
+
+    def _refill_in_background(self) -> None:
+        async def refill() -> None:
+            try:
+                await self.start()
+            except Exception as e:
+                logger.warning(f"MCP SSE pool {self.base_url}: reconnect failed: {e}")
+
+        if self._refill is None or self._refill.done():
+            self._refill = asyncio.create_task(refill())
+
+    async def _acquire(self, exclude: Optional[SSESession] = None) -> SSESession:
+        alive = [s for s in self._sessions if s.alive and s is not exclude]
+        if not alive:
+            # Ни одной живой сессии: запрос ждёт подключения
+            await self.start()
+            alive = [s for s in self._sessions if s.alive]
+        elif len(alive) < self.size:
+            # Часть сессий потеряна: обслуживаем живыми, недостающие поднимаются в фоне
+            self._refill_in_background()
+        if not alive:
+            raise MCPConnectionError(f"No live SSE sessions to MCP server {self.base_url}")
+        return min(alive, key=lambda s: s.in_flight)
+
+    async def request(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: float = 30.0) -> Dict[str, Any]:
+        """Запрос через наименее загруженную сессию; при потере сессии — повтор на другой живой."""
+        session = await self._acquire()
+        try:
+            return await session.request(method, params, timeout)
+        except MCPConnectionError as e:
+            logger.warning(f"MCP SSE pool {self.base_url}: {e}; failing over")
+            session = await self._acquire(exclude=session)
+            return await session.request(method, params, timeout)
+
+    async def request_batch(self, calls: List[Tuple[str, Optional[Dict[str, Any]]]], timeout: float = 30.0) -> List[Dict[str, Any]]:
+        """JSON-RPC batch через одну сессию; при потере сессии — повтор на другой живой."""
+        session = await self._acquire()
+        try:
+            return await session.request_batch(calls, timeout)
+        except MCPConnectionError as e:
+            logger.warning(f"MCP SSE pool {self.base_url}: {e}; failing over batch")
+            session = await self._acquire(exclude=session)
+            return await session.request_batch(calls, timeout)
+
+    async def close(self) -> None:
+        for task in (self._supervisor, self._refill):
+            if task is not None:
+                task.cancel()
+        async with self._lock:
+            sessions, self._sessions = self._sessions, []
+        await asyncio.gather(*(s.close() for s in sessions), return_exceptions=True)
@@ -0,0 +1,264 @@
+"""
+Долгоживущие stdio-подключения к MCP-серверам (JSON-RPC 2.0 по строкам).
+
+StdioConnection держит запущенный процесс сервера после initialize и
+сопоставляет ответы с запросами по id, поэтому один процесс обслуживает
+много вызовов подряд и параллельно. StdioPool — N таких подключений на сервер
+с выбором наименее загруженного и перезапуском упавших процессов.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from backend.services.mcp_resolver import LaunchSpec
+from backend.services.serialization import JSONDecodeError, dumps_bytes, loads
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = "2024-11-05"
+# Ответ сервера может быть больше стандартного лимита StreamReader (64 KiB)
+STDOUT_LIMIT = 16 * 1024 * 1024
+# Предел паузы между попытками перезапустить недостающие процессы пула
+MAX_RESTART_DELAY = 30.0
+
+
+async def spawn_stdio_process(spec: LaunchSpec, limit: int = STDOUT_LIMIT) -> asyncio.subprocess.Process:
+    """Запускает stdio MCP-сервер по LaunchSpec с pipe для stdin/stdout/stderr."""
+    logger.info(f"Starting MCP server '{spec.server_name}': {' '.join(spec.argv())}")
+    return await asyncio.create_subprocess_exec(
+        *spec.argv(),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=spec.full_env(),
+        limit=limit,
+    )
+
+
+class MCPConnectionError(RuntimeError):
+    """Процесс сервера завершился или подключение закрыто."""
+
+
+def result_or_raise(message: Dict[str, Any]) -> Dict[str, Any]:
+    """result из JSON-RPC ответа; ответ с error → RuntimeError с сообщением сервера."""
+    if "error" in message:
+        error = message["error"]
+        raise RuntimeError(f"MCP server error: {error.get('message', error) if isinstance(error, dict) else error}")
+    result = message.get("result", {})
+    return result if isinstance(result, dict) else {}
+
+
+class StdioConnection:
+    """Одно инициализированное подключение к stdio MCP-серверу."""
+
+    def __init__(self, spec: LaunchSpec, locale: str = "ru-RU"):
+        self.spec = spec
+        self.locale = locale
+        self.in_flight = 0
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._stderr_drain: Optional[asyncio.Task] = None
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self._process is not None
+            and self._process.returncode is None
+            and self._reader is not None
+            and not self._reader.done()
+        )
+
+    async def start(self, timeout: float = 60.0) -> None:
+        """Запускает процесс и выполняет MCP handshake (initialize + notifications/initialized)."""
+        self._process = await spawn_stdio_process(self.spec)
+        self._reader = asyncio.create_task(self._read_loop())
+        self._stderr_drain = asyncio.create_task(self._drain_stderr())
+        try:
+            await self.request("initialize", {
+                "protocolVersion": PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": "deepseek-web-client", "version": "1.0.0", "locale": self.locale},
+            }, timeout=timeout)
+            await self.notify("notifications/initialized")
+        except BaseException:
+            await self.close()
+            raise
+        logger.info(f"MCP stdio connection ready: {self.spec.server_name} (PID {self._process.pid})")
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        if self._process is None or self._process.stdin is None or self._process.returncode is not None:
+            raise MCPConnectionError(f"MCP server '{self.spec.server_name}' is not running")
+        async with self._write_lock:
+            self._process.stdin.write(dumps_bytes(message) + b"\n")
+            await self._process.stdin.drain()
+
+    async def notify(self, method: str, params: Optional[Dict[str, Any]] = None) -> None:
+        await self._send({"jsonrpc": "2.0", "method": method, "params": params or {}})
+
+    async def request(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: float = 30.0) -> Dict[str, Any]:
+        """JSON-RPC запрос; возвращает result или бросает RuntimeError с сообщением ошибки сервера."""
+        messages = await self._exchange([(method, params)], timeout, batch=False)
+        return result_or_raise(messages[0])
+
+    async def request_batch(self, calls: List[Tuple[str, Optional[Dict[str, Any]]]], timeout: float = 30.0) -> List[Dict[str, Any]]:
+        """JSON-RPC batch одной строкой; возвращает ответы (с result или error) в порядке calls."""
+        return await self._exchange(calls, timeout, batch=True)
+
+    async def _exchange(self, calls: List[Tuple[str, Optional[Dict[str, Any]]]], timeout: float, batch: bool) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        payload, futures = [], []
+        for method, params in calls:
+            self._next_id += 1
+            futures.append((self._next_id, loop.create_future()))
+            self._futures[self._next_id] = futures[-1][1]
+            payload.append({"jsonrpc": "2.0", "id": self._next_id, "method": method, "params": params or {}})
+        self.in_flight += len(calls)
+        try:
+            await self._send(payload if batch else payload[0])
+            return list(await asyncio.wait_for(asyncio.gather(*(f for _, f in futures)), timeout=timeout))
+        finally:
+            self.in_flight -= len(calls)
+            for request_id, _ in futures:
+                self._futures.pop(request_id, None)
+
+    async def _read_loop(self) -> None:
+        stdout = self._process.stdout
+        try:
+            while True:
+                line = await stdout.readline()
+                if not line:
+                    break
+                try:
+                    message = loads(line)
+                except JSONDecodeError:
+                    logger.debug(f"Non-JSON line from {self.spec.server_name}: {line[:200]!r}")
+                    continue
+                for item in message if isinstance(message, list) else [message]:
+                    future = self._futures.get(item.get("id")) if isinstance(item, dict) else None
+                    if future is not None and not future.done():
+                        future.set_result(item)
+        finally:
+            error = MCPConnectionError(f"MCP server '{self.spec.server_name}' closed the connection")
+            for future in self._futures.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    async def _drain_stderr(self) -> None:
+        # Без чтения stderr переполненный pipe может заблокировать сервер
+        while self._process.stderr is not None:
+            line = await self._process.stderr.readline()
+            if not line:
+                return
+            logger.debug(f"[{self.spec.server_name} stderr] {line.decode('utf-8', errors='ignore').rstrip()}")
+
+    async def close(self, timeout: float = 5.0) -> None:
+        process = self._process
+        if process is not None and process.returncode is None:
+            try:
+                if process.stdin is not None:
+                    process.stdin.close()
+                await asyncio.wait_for(process.wait(), timeout=timeout)
+            except (asyncio.TimeoutError, ProcessLookupError, OSError):
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+        for task in (self._reader, self._stderr_drain):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+class StdioPool:
+    """Пул stdio-подключений к одному серверу."""
+
+    def __init__(self, name: str, spec_factory: Callable[[], Awaitable[LaunchSpec]], size: int = 1,
+                 locale: str = "ru-RU"):
+        self.name = name
+        self.size = max(1, size)
+        self.locale = locale
+        self._spec_factory = spec_factory
+        self._connections: List[StdioConnection] = []
+        self._lock = asyncio.Lock()
+        self._refill: Optional[asyncio.Task] = None
+
+    @property
+    def alive_count(self) -> int:
+        return sum(1 for c in self._connections if c.alive)
+
+    async def start(self) -> None:
+        """Поднимает недостающие подключения до size (параллельно)."""
+        async with self._lock:
+            self._connections = [c for c in self._connections if c.alive]
+            missing = self.size - len(self._connections)
+            if missing <= 0:
+                return
+            spec = await self._spec_factory()
+            fresh = [StdioConnection(spec, self.locale) for _ in range(missing)]
+            results = await asyncio.gather(*(c.start() for c in fresh), return_exceptions=True)
+            errors = [r for r in results if isinstance(r, BaseException)]
+            self._connections.extend(c for c, r in zip(fresh, results) if not isinstance(r, BaseException))
+            if errors and not self._connections:
+                raise errors[0]
+            for error in errors:
+                logger.warning(f"MCP pool {self.name}: connection failed to start: {error}")
+
+    def _refill_in_background(self) -> None:
+        """Поднимает недостающие подключения в фоне; неудачный запуск повторяется с растущей паузой."""
+        async def refill() -> None:
+            delay = 1.0
+            while self.alive_count < self.size:
+                try:
+                    await self.start()
+                except Exception as e:
+                    logger.warning(f"MCP pool {self.name}: restart failed: {e}")
+                if self.alive_count >= self.size:
+                    return
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RESTART_DELAY)
+
+        if self._refill is None or self._refill.done():
+            self._refill = asyncio.create_task(refill())
+
+    async def _acquire(self) -> StdioConnection:
+        alive = [c for c in self._connections if c.alive]
+        if not alive:
+            # Ни одного живого процесса: запрос ждёт запуска
+            await self.start()
+            alive = [c for c in self._connections if c.alive]
+        elif len(alive) < self.size:
+            # Часть процессов упала: обслуживаем живыми, недостающие поднимаются в фоне
+            self._refill_in_background()
+        if not alive:
+            raise MCPConnectionError(f"No live connections to MCP server '{self.name}'")
+        return min(alive, key=lambda c: c.in_flight)
+
+    async def request(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: float = 30.0) -> Dict[str, Any]:
+        """Запрос через наименее загруженное подключение; при падении процесса — один повтор."""
+        connection = await self._acquire()
+        try:
+            return await connection.request(method, params, timeout)
+        except MCPConnectionError:
+            logger.warning(f"MCP pool {self.name}: connection lost, retrying on a fresh one")
+            connection = await self._acquire()
+            return await connection.request(method, params, timeout)
+
+    async def request_batch(self, calls: List[Tuple[str, Optional[Dict[str, Any]]]], timeout: float = 30.0) -> List[Dict[str, Any]]:
+        """JSON-RPC batch через одно подключение; при падении процесса — один повтор."""
+        connection = await self._acquire()
+        try:
+            return await connection.request_batch(calls, timeout)
+        except MCPConnectionError:
+            logger.warning(f"MCP pool {self.name}: connection lost, retrying batch on a fresh one")
+            connection = await self._acquire()
+            return await connection.request_batch(calls, timeout)
+
+    async def close(self) -> None:
+        if self._refill is not None:
+            self._refill.cancel()
+        async with self._lock:
+            connections, self._connections = self._connections, []
+        await asyncio.gather(*(c.close() for c in connections), return_exceptions=True)
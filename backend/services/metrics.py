@@ -0,0 +1,354 @@
+"""
+Лёгкий сборщик метрик в формате Prometheus (без внешних зависимостей).
+
+Метрики хранятся в словарях по кортежу значений лейблов; запись — O(1) для
+счётчиков и O(log n) для гистограмм (bisect по границам бакетов). Текстовое
+представление формируется только при запросе GET /metrics.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Границы бакетов (секунды): от быстрых CPU-операций до долгих LLM-ответов
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Tuple[str, ...]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {labels}")
+        return labels
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик."""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Значение, которое может расти и уменьшаться (например, число запросов в работе)."""
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами бакетов."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [counts по бакетам (+Inf последним), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return entry[2] if entry else 0
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Набор метрик, отдаваемых одним endpoint-ом."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        _update_cache_ratios()
+        _update_prompt_cache_ratios()
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# HTTP (роутеры)
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by route template, method and status", ("route", "method", "status"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency including streamed body", ("route", "method"))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "HTTP requests currently being processed", ("route",))
+
+# LLM upstream-ы
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "llm_upstream_duration_seconds", "Upstream LLM call latency (full response or full stream)",
+    ("provider", "operation"))
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "llm_upstream_errors_total", "Failed upstream LLM calls", ("provider", "operation"))
+UPSTREAM_IN_FLIGHT = REGISTRY.gauge(
+    "llm_upstream_in_flight", "Upstream LLM calls in progress", ("provider",))
+STREAM_TTFT = REGISTRY.histogram(
+    "llm_stream_ttft_seconds", "Time to first streamed token", ("provider",))
+STREAM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "llm_stream_tokens_per_second", "Streamed content chunks per second after the first token",
+    ("provider",), buckets=RATE_BUCKETS)
+
+# MCP
+MCP_LATENCY = REGISTRY.histogram(
+    "mcp_call_duration_seconds", "MCP call latency by server and tool", ("server", "tool"))
+MCP_ERRORS = REGISTRY.counter(
+    "mcp_call_errors_total", "Failed MCP calls by server and tool", ("server", "tool"))
+MCP_IN_FLIGHT = REGISTRY.gauge(
+    "mcp_calls_in_flight", "MCP calls in progress", ("server",))
+
+# Кэши
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total", "Cache lookups by cache name and result (hit/miss)", ("cache", "result"))
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "cache_hit_ratio", "Cache hit ratio since process start", ("cache",))
+
+# Токены по usage ответов LLM (кэш префикса запроса на стороне DeepSeek)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "LLM tokens from response usage by endpoint, prompt template and kind",
+    ("endpoint", "template", "kind"))
+LLM_PROMPT_CACHE_HIT_RATIO = REGISTRY.gauge(
+    "llm_prompt_cache_hit_ratio", "Share of prompt tokens served from the provider prompt cache",
+    ("endpoint", "template"))
+
+# Поле usage -> kind в llm_tokens_total
+USAGE_TOKEN_KINDS = (
+    ("prompt_tokens", "prompt"),
+    ("prompt_cache_hit_tokens", "prompt_cache_hit"),
+    ("prompt_cache_miss_tokens", "prompt_cache_miss"),
+    ("completion_tokens", "completion"),
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Учитывает обращение к кэшу (для cache_requests_total и cache_hit_ratio)."""
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def _update_cache_ratios() -> None:
+    caches = {key[0] for key in CACHE_REQUESTS._values}
+    for cache in caches:
+        hits = CACHE_REQUESTS.value(cache, "hit")
+        total = hits + CACHE_REQUESTS.value(cache, "miss")
+        CACHE_HIT_RATIO.set(cache, value=hits / total if total else 0.0)
+
+
+def record_llm_usage(endpoint: str, template: Optional[str], usage: Optional[Dict[str, int]]) -> None:
+    """Учитывает usage ответа LLM в llm_tokens_total (template None — запрос без шаблона)."""
+    if not usage:
+        return
+    template = template or "none"
+    for field, kind in USAGE_TOKEN_KINDS:
+        value = usage.get(field)
+        if value:
+            LLM_TOKENS.inc(endpoint, template, kind, amount=value)
+
+
+def _update_prompt_cache_ratios() -> None:
+    labels = {key[:2] for key in LLM_TOKENS._values}
+    for endpoint, template in labels:
+        hits = LLM_TOKENS.value(endpoint, template, "prompt_cache_hit")
+        total = hits + LLM_TOKENS.value(endpoint, template, "prompt_cache_miss")
+        if total:
+            LLM_PROMPT_CACHE_HIT_RATIO.set(endpoint, template, value=hits / total)
+
+
+@contextmanager
+def track_in_flight(gauge: Gauge, *labels: str) -> Iterator[None]:
+    gauge.inc(*labels)
+    try:
+        yield
+    finally:
+        gauge.dec(*labels)
+
+
+@contextmanager
+def observe_upstream(provider: str, operation: str) -> Iterator[None]:
+    """Замер вызова LLM upstream: латентность, ошибки, число вызовов в работе."""
+    start = time.perf_counter()
+    UPSTREAM_IN_FLIGHT.inc(provider)
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(provider, operation)
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(provider)
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, provider, operation)
+
+
+@contextmanager
+def observe_mcp(server: str, tool: str) -> Iterator[None]:
+    """Замер вызова MCP: латентность по серверу и инструменту, ошибки, вызовы в работе."""
+    start = time.perf_counter()
+    MCP_IN_FLIGHT.inc(server)
+    try:
+        yield
+    except Exception:
+        MCP_ERRORS.inc(server, tool)
+        raise
+    finally:
+        MCP_IN_FLIGHT.dec(server)
+        MCP_LATENCY.observe(time.perf_counter() - start, server, tool)
+
+
+class StreamTimer:
+    """Замер TTFT и скорости генерации для streaming ответа провайдера."""
+    __slots__ = ("provider", "start", "first", "chunks")
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.start = time.perf_counter()
+        self.first: Optional[float] = None
+        self.chunks = 0
+
+    def chunk(self) -> None:
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+            STREAM_TTFT.observe(now - self.start, self.provider)
+        self.chunks += 1
+
+    def finish(self) -> None:
+        if self.first is None or self.chunks < 2:
+            return
+        elapsed = time.perf_counter() - self.first
+        if elapsed > 0:
+            STREAM_TOKENS_PER_SECOND.observe((self.chunks - 1) / elapsed, self.provider)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: латентность (до конца тела ответа, включая streaming),
+    статусы и число запросов в работе по шаблону маршрута (/api/chat, /api/mcp/list-tools/{server_name}).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+        path = scope.get("path", "")
+        # До маршрутизации шаблон неизвестен; для in-flight используем префикс API
+        in_flight_label = "/api" if path.startswith("/api") else "other"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(in_flight_label)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(in_flight_label)
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or ("static" if not path.startswith("/api") else "unmatched")
+            method = scope.get("method", "")
+            HTTP_REQUESTS.inc(route_label, method, str(status["code"]))
+            HTTP_LATENCY.observe(time.perf_counter() - start, route_label, method)
@@ -0,0 +1,102 @@
+"""
+Встроенный сэмплирующий профайлер (по запросу, только для администраторов).
+
+Пока профилирование не запущено, нет ни потока, ни хуков — нулевая стоимость.
+Во время сеанса отдельный поток с заданным интервалом снимает стеки всех
+потоков процесса (sys._current_frames): event loop, пул потоков anyio/asyncio
+(sync-эндпоинты summaries, sqlite3, asyncio.to_thread) и служебные потоки.
+Результат — collapsed stacks ("thread;frame;frame count"), совместимые с
+flamegraph.pl, speedscope и inferno.
+
+Дочерние процессы MCP (stdio/npx) — отдельные процессы и в профиль не попадают;
+видно только время, которое backend тратит на их запуск и обмен с ними.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+# Не даём профилировать дольше и чаще этого (защита от случайной нагрузки)
+MAX_SECONDS = 60.0
+MIN_INTERVAL = 0.001
+
+
+class ProfilerBusyError(RuntimeError):
+    """Сеанс профилирования уже идёт."""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # Короткий путь: от каталога backend/ или имя файла для stdlib/site-packages
+    marker = filename.rfind("backend/")
+    short = filename[marker:] if marker >= 0 else filename.rsplit("/", 1)[-1]
+    return f"{code.co_name} ({short}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """Сэмплирует стеки всех потоков процесса в отдельном потоке."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = max(interval, MIN_INTERVAL)
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.is_set():
+            names: Dict[int, str] = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+            self._stop.wait(self.interval)
+
+    def collapsed(self) -> str:
+        """Профиль в формате collapsed stacks, по убыванию числа сэмплов."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+_session_lock = threading.Lock()
+
+
+async def profile(seconds: float, interval: float = 0.005) -> SamplingProfiler:
+    """
+    Профилирует процесс seconds секунд, не блокируя event loop.
+
+    Raises:
+        ProfilerBusyError: если другой сеанс ещё не завершён
+    """
+    if not _session_lock.acquire(blocking=False):
+        raise ProfilerBusyError("Profiling session already in progress")
+    profiler = SamplingProfiler(interval)
+    try:
+        profiler.start()
+        await asyncio.sleep(min(seconds, MAX_SECONDS))
+    finally:
+        profiler.stop()
+        _session_lock.release()
+    return profiler
+
+
+def profile_filename() -> str:
+    return time.strftime("profile-%Y%m%d-%H%M%S.collapsed")
@@ -0,0 +1,187 @@
+"""
+Реестр шаблонов промптов с заранее собранными system-сообщениями.
+
+DeepSeek кэширует префикс запроса на своей стороне (context caching): повторный
+запрос с тем же началом оплачивается как prompt_cache_hit_tokens. Поэтому
+system-сообщение шаблона собирается один раз при регистрации (вместе с
+LATEX_INSTRUCTION для варианта "+latex") и дальше отправляется одним и тем же
+объектом — префикс побайтно совпадает между запросами. Отпечаток префикса
+(fingerprint) позволяет убедиться, что он не менялся между версиями, а
+статистика usage по шаблону показывает, насколько хорошо он попадает в кэш.
+"""
+import hashlib
+import logging
+import string
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.constants import prompts
+from backend.services.history import estimate_message_tokens
+from backend.services.serialization import dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+# Суффикс имени варианта шаблона с инструкцией по LaTeX в system-сообщении
+LATEX_SUFFIX = "+latex"
+
+
+@dataclass
+class TemplateStats:
+    """Накопленный usage запросов с шаблоном (по полям ответа DeepSeek)."""
+    requests: int = 0
+    prompt_tokens: int = 0
+    prompt_cache_hit_tokens: int = 0
+    prompt_cache_miss_tokens: int = 0
+    completion_tokens: int = 0
+
+    def add(self, usage: Optional[Dict[str, Any]]) -> None:
+        self.requests += 1
+        usage = usage or {}
+        self.prompt_tokens += usage.get("prompt_tokens") or 0
+        self.prompt_cache_hit_tokens += usage.get("prompt_cache_hit_tokens") or 0
+        self.prompt_cache_miss_tokens += usage.get("prompt_cache_miss_tokens") or 0
+        self.completion_tokens += usage.get("completion_tokens") or 0
+
+    @property
+    def cache_hit_ratio(self) -> Optional[float]:
+        cached = self.prompt_cache_hit_tokens + self.prompt_cache_miss_tokens
+        return self.prompt_cache_hit_tokens / cached if cached else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "prompt_cache_hit_tokens": self.prompt_cache_hit_tokens,
+            "prompt_cache_miss_tokens": self.prompt_cache_miss_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cache_hit_ratio": self.cache_hit_ratio,
+        }
+
+
+def fingerprint(message: Dict[str, str]) -> str:
+    """Отпечаток сообщения-префикса: sha256 его JSON (первые 16 символов)."""
+    return hashlib.sha256(dumps_bytes(message)).hexdigest()[:16]
+
+
+@dataclass
+class PromptTemplate:
+    """
+    Шаблон: готовое system-сообщение и (необязательно) шаблон сообщения пользователя.
+
+    system_message — общий для всех запросов объект, его нельзя изменять.
+    """
+    name: str
+    system: Optional[str]
+    user: Optional[str] = None
+    system_message: Optional[Dict[str, str]] = field(init=False, default=None)
+    fingerprint: Optional[str] = field(init=False, default=None)
+    prefix_tokens: int = field(init=False, default=0)
+    fields: Tuple[str, ...] = field(init=False, default=())
+    # Разобранный шаблон пользователя: текст до поля и имя поля (None — хвост без поля)
+    _segments: Optional[Tuple[Tuple[str, Optional[str]], ...]] = field(init=False, default=None, repr=False)
+    stats: TemplateStats = field(init=False, default_factory=TemplateStats)
+
+    def __post_init__(self):
+        if self.system is not None:
+            self.system_message = {"role": "system", "content": self.system}
+            self.fingerprint = fingerprint(self.system_message)
+            self.prefix_tokens = estimate_message_tokens(self.system_message)
+        if self.user is not None:
+            # Шаблон разбирается один раз; простые поля {name} подставляются склейкой
+            # готовых кусков, поля с форматом или конверсией — через format_map
+            parsed = list(string.Formatter().parse(self.user))
+            self.fields = tuple(dict.fromkeys(name for _, name, _, _ in parsed if name))
+            if all(not spec and not conversion for _, _, spec, conversion in parsed):
+                self._segments = tuple((literal, name or None) for literal, name, _, _ in parsed)
+
+    def render_user(self, values: Dict[str, str]) -> str:
+        """Сообщение пользователя по шаблону; KeyError — не хватает значения поля."""
+        missing = [name for name in self.fields if name not in values]
+        if missing:
+            raise KeyError(f"Template '{self.name}' requires: {', '.join(missing)}")
+        if self._segments is None:
+            return self.user.format_map(values)
+        parts = []
+        for literal, name in self._segments:
+            parts.append(literal)
+            if name is not None:
+                parts.append(str(values[name]))
+        return "".join(parts)
+
+    def prefix(self) -> List[Dict[str, str]]:
+        """Начало списка сообщений (новый список, сами сообщения общие)."""
+        return [self.system_message] if self.system_message is not None else []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "fingerprint": self.fingerprint,
+            "prefix_tokens": self.prefix_tokens,
+            "fields": list(self.fields),
+            "stats": self.stats.to_dict(),
+        }
+
+
+class PromptRegistry:
+    """Шаблоны по имени и по тексту system-сообщения."""
+
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._by_system: Dict[str, PromptTemplate] = {}
+
+    def register(self, name: str, system: Optional[str] = None, user: Optional[str] = None,
+                 latex_variant: bool = True) -> PromptTemplate:
+        """
+        Регистрирует шаблон (и вариант name+latex с LATEX_INSTRUCTION в конце system).
+        """
+        template = self._add(PromptTemplate(name, system, user))
+        if latex_variant and system is not None:
+            self._add(PromptTemplate(name + LATEX_SUFFIX, system + prompts.LATEX_INSTRUCTION, user))
+        return template
+
+    def _add(self, template: PromptTemplate) -> PromptTemplate:
+        self._templates[template.name] = template
+        if template.system is not None:
+            # Клиенты, присылающие текст system_prompt целиком, получают тот же префикс
+            self._by_system.setdefault(template.system, template)
+        return template
+
+    def get(self, name: str, latex: bool = False) -> PromptTemplate:
+        """
+        Шаблон по имени (latex — его вариант "+latex"); KeyError, если такого нет.
+        Шаблон, system которого уже содержит LATEX_INSTRUCTION (например, "latex"),
+        возвращается без изменений.
+        """
+        try:
+            template = self._templates[name]
+        except KeyError:
+            raise KeyError(f"Unknown prompt template: {name}")
+        if not latex or template.system is not None and prompts.LATEX_INSTRUCTION.strip() in template.system:
+            return template
+        try:
+            return self._templates[name + LATEX_SUFFIX]
+        except KeyError:
+            raise KeyError(f"Prompt template {name} has no LaTeX variant")
+
+    def match_system(self, text: str) -> Optional[PromptTemplate]:
+        """Шаблон, system-сообщение которого совпадает с text."""
+        return self._by_system.get(text)
+
+    def record_usage(self, template: Optional[PromptTemplate], usage: Optional[Dict[str, Any]]) -> None:
+        """Учитывает usage ответа в статистике шаблона (None — запрос без шаблона)."""
+        if template is not None:
+            template.stats.add(usage)
+
+    def templates(self) -> List[PromptTemplate]:
+        return list(self._templates.values())
+
+
+prompt_registry = PromptRegistry()
+prompt_registry.register("cursor", prompts.CURSOR_SYSTEM_PROMPT)
+prompt_registry.register("expert_mathematician", prompts.EXPERT_MATHEMATICIAN)
+prompt_registry.register("expert_logician", prompts.EXPERT_LOGICIAN)
+prompt_registry.register("expert_analyst", prompts.EXPERT_ANALYST)
+prompt_registry.register("comparison", prompts.EXPERT_ANALYTIC_COMPARER, prompts.COMPARISON_PROMPT_TEMPLATE)
+prompt_registry.register("prompt_generator", prompts.PROMPT_GENERATOR_SYSTEM, prompts.PROMPT_GENERATOR_PROMPT_TEMPLATE)
+# Только инструкция по LaTeX — для запросов с latex и без system_prompt
+prompt_registry.register("latex", prompts.LATEX_INSTRUCTION.lstrip(), latex_variant=False)
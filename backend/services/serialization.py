@@ -0,0 +1,68 @@
+"""
+Сериализация JSON для SSE-чанков, ответов API и сообщений MCP.
+
+Если установлен orjson, используется он, иначе — stdlib json (JSON_BACKEND:
+auto | orjson | json). Вывод обоих вариантов одинаковый: компактный, без
+экранирования не-ASCII символов. Объекты, которые orjson не умеет сериализовать
+(нестроковые ключи, слишком большие целые), уходят в stdlib json.
+"""
+import json
+import logging
+from typing import Any, Union
+
+from backend.config import JSON_BACKEND
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if JSON_BACKEND not in ("auto", "orjson", "json"):
+    logger.warning(f"Unknown JSON_BACKEND={JSON_BACKEND!r}, using auto")
+if JSON_BACKEND == "orjson" and orjson is None:
+    logger.warning("JSON_BACKEND=orjson, but orjson is not installed; using stdlib json")
+
+# Имя используемой библиотеки ("orjson" или "json")
+BACKEND = "orjson" if orjson is not None and JSON_BACKEND != "json" else "json"
+
+# orjson.JSONDecodeError наследует json.JSONDecodeError, так что ловить достаточно его
+JSONDecodeError = json.JSONDecodeError
+
+# json.dumps с аргументами создаёт кодировщик на каждый вызов — держим готовый
+_stdlib_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def _stdlib_dumps(obj: Any) -> str:
+    return _stdlib_encode(obj)
+
+
+def _stdlib_dumps_bytes(obj: Any) -> bytes:
+    return _stdlib_dumps(obj).encode("utf-8")
+
+
+def _stdlib_loads(data: Union[str, bytes, bytearray]) -> Any:
+    return json.loads(data)
+
+
+if BACKEND == "orjson":
+    def dumps_bytes(obj: Any) -> bytes:
+        """JSON в UTF-8 байтах (тела ответов, строки stdio MCP)."""
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            return _stdlib_dumps_bytes(obj)
+
+    def dumps(obj: Any) -> str:
+        """JSON-строка (SSE-чанки)."""
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            return _stdlib_dumps(obj)
+
+    loads = orjson.loads
+else:
+    dumps = _stdlib_dumps
+    dumps_bytes = _stdlib_dumps_bytes
+    loads = _stdlib_loads
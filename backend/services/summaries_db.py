@@ -104,6 +104,11 @@ def get_latest_summary() -> Optional[str]:
         return None
 
 
+def get_db_dir() -> Path:
+    """Каталог БД (после init_db — с учётом запасного пути)."""
+    return _DB_DIR
+
+
 def is_db_available() -> bool:
     """Возвращает True, если БД суммаризаций доступна (успешно инициализирована при старте)."""
     return _db_available
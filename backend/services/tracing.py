@@ -0,0 +1,311 @@
+"""
+Лёгкая трассировка запросов: вложенные спаны в контексте запроса (contextvars).
+
+Корневой спан открывает TracingMiddleware, вложенные — span() в роутерах и
+сервисах (deepseek_api, llama_api, mcp_client). Итоги видны в заголовке
+Server-Timing; завершённые трассы экспортируются фоновым потоком в JSON-lines
+файл (TRACE_JSONL_PATH) и/или в OTLP/HTTP коллектор (TRACE_OTLP_ENDPOINT).
+"""
+import functools
+import inspect
+import json
+import logging
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+from backend.config import TRACE_JSONL_PATH, TRACE_OTLP_ENDPOINT, TRACING_ENABLED
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "deepseek-web-backend"
+# Сколько разных спанов максимум попадает в Server-Timing
+SERVER_TIMING_MAX_ENTRIES = 12
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_TOKEN_INVALID = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+
+
+class Span:
+    """Один интервал трассы; спаны одной трассы собираются в trace.spans."""
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "_start_perf",
+                 "duration_ns", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self._start_perf = time.perf_counter_ns()
+        self.duration_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        if self.duration_ns is None:
+            self.duration_ns = time.perf_counter_ns() - self._start_perf
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.duration_ns or 0) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    """Все спаны одного HTTP-запроса."""
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self) -> None:
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+
+    def start_span(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Span:
+        span = Span(self, name, parent.span_id if parent else None, attributes)
+        self.spans.append(span)
+        return span
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing: суммарная длительность завершённых спанов по имени."""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            if span.parent_id is None or span.duration_ns is None:
+                continue
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+        entries = sorted(totals.items(), key=lambda item: -item[1])[:SERVER_TIMING_MAX_ENTRIES]
+        return ", ".join(f"{_TOKEN_INVALID.sub('_', name)};dur={ms:.1f}" for name, ms in entries)
+
+
+class _NoopSpan:
+    """Заглушка вне трассируемого запроса: set() ничего не делает."""
+    __slots__ = ()
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """
+    Открывает вложенный спан в текущей трассе.
+
+    Вне запроса (нет корневого спана) ничего не записывает и отдаёт заглушку,
+    поэтому сервисы можно вызывать и из скриптов/тестов без middleware.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield _NOOP_SPAN
+        return
+    current = parent.trace.start_span(name, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Async-генератор закрыт из другого контекста (например, при сборке мусора)
+            pass
+
+
+def traced(name: str) -> Callable:
+    """Декоратор: оборачивает async-функцию или async-генератор в span(name)."""
+    def decorator(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def gen_wrapper(*args, **kwargs):
+                with span(name):
+                    async for item in fn(*args, **kwargs):
+                        yield item
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- экспорт -----------------------------------------------------------------
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(traces: List[Trace]) -> Dict[str, Any]:
+    """Тело запроса OTLP/HTTP JSON (ExportTraceServiceRequest)."""
+    spans = []
+    for trace in traces:
+        for s in trace.spans:
+            item = {
+                "traceId": trace.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 2 if s.parent_id is None else 1,  # SERVER для корня, INTERNAL для остальных
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.start_ns + (s.duration_ns or 0)),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            }
+            if s.parent_id:
+                item["parentSpanId"] = s.parent_id
+            spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+
+class TraceExporter:
+    """
+    Фоновый экспорт завершённых трасс: очередь + поток, чтобы запись в файл
+    и HTTP к коллектору не блокировали event loop. При переполнении очереди
+    трассы отбрасываются.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None, otlp_endpoint: Optional[str] = None,
+                 max_queue: int = 1000, batch_size: int = 64):
+        self.jsonl_path = jsonl_path
+        self.otlp_endpoint = otlp_endpoint
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.jsonl_path or self.otlp_endpoint)
+
+    def export(self, trace: Trace) -> None:
+        if not self.enabled:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Дожидается экспорта всех трасс из очереди (для тестов и остановки приложения)."""
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _run(self) -> None:
+        client = httpx.Client(timeout=5.0) if self.otlp_endpoint else None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch, client)
+            except Exception as e:
+                logger.warning(f"Trace export failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: List[Trace], client: Optional[httpx.Client]) -> None:
+        if self.jsonl_path:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                for trace in batch:
+                    f.write(json.dumps({
+                        "trace_id": trace.trace_id,
+                        "spans": [s.to_dict() for s in trace.spans],
+                    }, ensure_ascii=False, default=str) + "\n")
+        if client is not None:
+            client.post(self.otlp_endpoint, json=to_otlp(batch)).raise_for_status()
+
+
+exporter = TraceExporter(TRACE_JSONL_PATH, TRACE_OTLP_ENDPOINT)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: открывает корневой спан запроса, добавляет заголовки
+    Server-Timing и X-Trace-Id, по завершении отправляет трассу в экспорт.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED or not scope.get("path", "").startswith("/api"):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        root = trace.start_span("request", None, {"http.method": scope.get("method", ""),
+                                                  "http.target": scope.get("path", "")})
+        token = _current_span.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("http.status_code", message["status"])
+                headers = list(message.get("headers", []))
+                timing = trace.server_timing()
+                total = f"total;dur={(time.perf_counter_ns() - root._start_perf) / 1e6:.1f}"
+                headers.append((b"server-timing", (f"{timing}, {total}" if timing else total).encode("latin-1")))
+                headers.append((b"x-trace-id", trace.trace_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            route = scope.get("route")
+            root.name = f"{scope.get('method', '')} {getattr(route, 'path', scope.get('path', ''))}"
+            root.end()
+            _current_span.reset(token)
+            exporter.export(trace)
@@ -0,0 +1,249 @@
+"""
+Извлечение намерения из запроса о погоде.
+
+Все словари и регулярные выражения собираются один раз при импорте:
+ключевые слова — в trie-регулярку (общие префиксы вынесены, поиск идёт в C
+движке re без Python-цикла по словам), стоп-слова — во frozenset. Результат
+совпадает с исходной реализацией (benchmarks/legacy_intent.py) на всех входах.
+
+Повторяющиеся запросы обслуживает IntentMemo — LRU-кэш по нормализованному
+запросу; отдельные вызовы пишутся в debug-лог выборочно (логгер *.sampled).
+"""
+import logging
+import random
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from backend.config import WEATHER_INTENT_CACHE_SIZE, WEATHER_INTENT_LOG_SAMPLE
+from backend.services.gazetteer import get_gazetteer
+from backend.services.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+sampled_logger = logging.getLogger(f"{__name__}.sampled")
+
+# Длинные запросы не кэшируются: повторяются редко, а место в кэше занимают
+MEMO_MAX_PROMPT_LENGTH = 512
+
+WEATHER_KEYWORDS = (
+    "погода", "weather", "температура", "temperature", "temp",
+    "дождь", "rain", "дожд", "raining", "rainy",
+    "снег", "snow", "снеж", "snowing", "snowy",
+    "ветер", "wind", "ветр", "windy",
+    "прогноз", "forecast", "прогноз погоды", "weather forecast",
+    "облачно", "cloudy", "облака", "clouds",
+    "солнечно", "sunny", "солнце", "sun",
+    "туман", "fog", "туманно", "foggy",
+    "град", "hail", "гроза", "thunderstorm",
+    "влажность", "humidity", "давление", "pressure",
+    "осадки", "precipitation", "осадк",
+    "климат", "climate", "метео", "meteo",
+)
+FORECAST_WORDS = ("прогноз", "forecast", "на несколько дней", "на неделю")
+# Слова, которые не могут быть названием места
+EXCLUDE_WORDS = (
+    "какая", "какой", "какое", "какие", "the", "a", "an", "в", "для", "for",
+    "на", "по", "с", "о", "об", "про", "как", "что", "где", "когда",
+    "расскажи", "скажи", "покажи", "tell", "show", "say", "погода", "weather",
+)
+
+_EXCLUDE = frozenset(EXCLUDE_WORDS)
+_NOT_A_LOCATION = frozenset(WEATHER_KEYWORDS + EXCLUDE_WORDS)
+_STRIP_CHARS = '.,!?;:()[]{}"\''
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """
+    Регулярка "встречается ли любое из слов как подстрока" в виде префиксного дерева
+
+    Слова, содержащие другое слово набора, отбрасываются: на ответ они не влияют.
+    """
+    words = set(words)
+    trie: Dict[str, Any] = {}
+    for word in (w for w in words if not any(o != w and o in w for o in words)):
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            body = (body if len(branches) == 1 and len(branches[0]) == 1 else f"(?:{body})") + "?"
+        return body
+
+    return build(trie)
+
+
+_WEATHER_RE = re.compile(_trie_pattern(WEATHER_KEYWORDS))
+_FORECAST_RE = re.compile(_trie_pattern(FORECAST_WORDS))
+_DAYS_RE = re.compile(r'(\d+)\s*(?:дн|day|день|дня|дней)')
+# "в [название города]" — до 3 слов (для названий типа "Санкт-Петербург", "Нью-Йорк")
+_AFTER_PREPOSITION_RE = re.compile(
+    r'\b(?:в|in)\s+((?:[А-ЯЁа-яёA-Za-z][А-ЯЁа-яёA-Za-z\-]*\s*){1,3})(?:\s|$|,|\.|\?|!|;|:)', re.IGNORECASE
+)
+# "[название города] погода"
+_BEFORE_KEYWORD_RE = re.compile(
+    r'([А-ЯЁа-яёA-Za-z][А-ЯЁа-яёA-Za-z\s\-]+?)\s+(?:погода|weather|прогноз|forecast)', re.IGNORECASE
+)
+
+
+def _location_after_preposition(prompt: str) -> Optional[str]:
+    match = _AFTER_PREPOSITION_RE.search(prompt)
+    if not match:
+        return None
+    filtered_words = []
+    for word in match.group(1).strip().rstrip(_STRIP_CHARS).split():
+        word_clean = word.strip(_STRIP_CHARS)
+        if word_clean.lower() in _EXCLUDE:
+            break  # Если встретили стоп-слово, останавливаемся
+        filtered_words.append(word_clean)
+    location = ' '.join(filtered_words)
+    if len(location) > 2 and location.lower() not in _EXCLUDE:
+        # Каждое слово с заглавной буквы
+        return ' '.join(word.capitalize() for word in location.split())
+    return None
+
+
+def _location_before_keyword(prompt: str) -> Optional[str]:
+    match = _BEFORE_KEYWORD_RE.search(prompt)
+    if not match:
+        return None
+    location = match.group(1).strip().rstrip(_STRIP_CHARS)
+    if len(location) > 2 and location.lower() not in _EXCLUDE:
+        return location[0].upper() + location[1:] if location[0].islower() else location
+    return None
+
+
+def _capitalized_word(prompt: str) -> Optional[str]:
+    for word in prompt.split():
+        clean_word = word.strip(_STRIP_CHARS)
+        if len(clean_word) > 2 and clean_word[0].isupper() and clean_word.lower() not in _NOT_A_LOCATION:
+            return clean_word
+    return None
+
+
+def extract_weather_intent(prompt: str) -> Optional[Dict[str, Any]]:
+    """
+    Извлекает намерение пользователя из запроса о погоде
+
+    Returns:
+        {"type": "current" | "forecast", "location": str | None, "days": int}
+        или None, если запрос не о погоде
+    """
+    prompt_lower = prompt.lower()
+    if _WEATHER_RE.search(prompt_lower) is None:
+        return None
+
+    intent: Dict[str, Any] = {"type": "current", "location": None, "days": 3}
+    if _FORECAST_RE.search(prompt_lower) is not None:
+        intent["type"] = "forecast"
+        days_match = _DAYS_RE.search(prompt_lower)
+        if days_match:
+            intent["days"] = min(int(days_match.group(1)), 7)
+
+    # Предлог + город, затем "город погода", затем первое слово с заглавной буквы
+    intent["location"] = (
+        _location_after_preposition(prompt)
+        or _location_before_keyword(prompt)
+        or _capitalized_word(prompt)
+    )
+    return intent
+
+
+def _capitalize_words(text: str) -> str:
+    return ' '.join(word.capitalize() for word in text.split())
+
+
+def resolve_location(intent: Dict[str, Any], prompt: str) -> Dict[str, Any]:
+    """
+    Уточняет место в намерении по справочнику городов (services/gazetteer.py)
+
+    intent["canonical_location"] — каноническое название города или None.
+    intent["location"] меняется, только если эвристика ошиблась:
+        - в найденном фрагменте есть город ("Казани Дождь") — остаётся сам город;
+        - фрагмент не город, но город есть в запросе — берётся он;
+        - фрагмент — опечатка ("Масква") — подставляется каноническое название.
+    Точные формы проверяются раньше нечёткого поиска: он на порядок дороже.
+    Неизвестное справочнику место оставляется как есть (canonical_location = None).
+    """
+    gazetteer = get_gazetteer()
+    location = intent["location"]
+    match = gazetteer.find(location) if location else None
+    if match is not None:
+        location = match.text
+    else:
+        match = gazetteer.find(prompt)
+        if match is not None:
+            location = _capitalize_words(match.text)
+        elif location:
+            match = gazetteer.resolve(location) or gazetteer.find(location, fuzzy=True, ignore=_NOT_A_LOCATION)
+            if match is not None:
+                location = match.city.name
+
+    intent["location"] = location
+    intent["canonical_location"] = match.city.name if match is not None else None
+    return intent
+
+
+def parse_weather_intent(prompt: str) -> Optional[Dict[str, Any]]:
+    """Намерение с уточнённым по справочнику местом (без кэша)."""
+    intent = extract_weather_intent(prompt)
+    return resolve_location(intent, prompt) if intent else None
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Ключ кэша: пробельные символы схлопываются, края обрезаются."""
+    return " ".join(prompt.split())
+
+
+class IntentMemo:
+    """
+    Ограниченный LRU-кэш: нормализованный запрос -> намерение (или None)
+
+    Намерение вычисляется по нормализованному запросу, поэтому запросы,
+    отличающиеся только пробелами, дают один и тот же результат.
+    Обращения учитываются в cache_requests_total{cache="weather_intent"}.
+    """
+
+    def __init__(self, maxsize: int = WEATHER_INTENT_CACHE_SIZE, log_sample: float = WEATHER_INTENT_LOG_SAMPLE):
+        self.maxsize = maxsize
+        self.log_sample = log_sample
+        self._entries: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get(self, prompt: str) -> Optional[Dict[str, Any]]:
+        key = normalize_prompt(prompt)
+        if self.maxsize <= 0 or len(key) > MEMO_MAX_PROMPT_LENGTH:
+            intent = parse_weather_intent(key)
+            self._log_sampled(key, intent, None)
+            return intent
+
+        hit = key in self._entries
+        if hit:
+            self._entries.move_to_end(key)
+            intent = self._entries[key]
+        else:
+            intent = parse_weather_intent(key)
+            self._entries[key] = intent
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        record_cache("weather_intent", hit)
+        self._log_sampled(key, intent, hit)
+        # Копия: вызывающий код может дополнять намерение, кэш от этого не меняется
+        return dict(intent) if intent is not None else None
+
+    def _log_sampled(self, prompt: str, intent: Optional[Dict[str, Any]], hit: Optional[bool]) -> None:
+        if self.log_sample > 0 and sampled_logger.isEnabledFor(logging.DEBUG) and random.random() < self.log_sample:
+            sampled_logger.debug(f"Intent {intent} (cache hit: {hit}) from prompt: {prompt}")
+
+
+intent_memo = IntentMemo()
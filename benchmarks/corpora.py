@@ -0,0 +1,96 @@
+"""Детерминированные корпуса для микро-бенчмарков: промпты RU/EN, длинные истории, SSE-строки."""
+import json
+import random
+from typing import Dict, List
+
+WEATHER_PROMPTS_RU = [
+    "погода в Москве",
+    "какая погода в Новосибирске?",
+    "расскажи какая погода в Санкт-Петербурге",
+    "прогноз погоды в Москве на 5 дней",
+    "прогноз на 7 дней в Санкт-Петербурге",
+    "будет ли дождь в Казани завтра?",
+    "Расскажи, пожалуйста, какая сейчас погода в городе Новосибирск?",
+    "температура в Екатеринбурге",
+    "Москва погода",
+    "какой ветер сейчас в Сочи и нужен ли зонт?",
+    "Скажи, пойдёт ли снег в Мурманске на выходных",
+    "влажность и давление в Калининграде",
+]
+
+WEATHER_PROMPTS_EN = [
+    "weather in London",
+    "weather in New York",
+    "what is the weather forecast for Paris for 3 days?",
+    "is it going to rain in Berlin tomorrow?",
+    "temperature in Tokyo right now",
+    "Tell me the humidity in Singapore",
+    "will it snow in Oslo this weekend",
+    "Madrid weather",
+]
+
+OTHER_PROMPTS = [
+    "как дела?",
+    "Напиши функцию сортировки слиянием на Python с комментариями",
+    "Explain the difference between TCP and UDP in simple terms",
+    "Сгенерируй промпт для рефакторинга модуля авторизации в FastAPI приложении",
+    "Реши уравнение x^2 + 5x + 6 = 0 и покажи все шаги",
+    "What are the pros and cons of server-side rendering?",
+]
+
+_SENTENCES = [
+    "Давай обсудим архитектуру сервиса и узкие места по производительности.",
+    "Основная задержка приходится на ожидание ответа от upstream API.",
+    "Можно использовать потоковую генерацию, чтобы пользователь видел ответ сразу.",
+    "Let's also consider caching prompt prefixes so the provider can reuse them.",
+    "Суммаризация истории уменьшает количество токенов в каждом запросе.",
+    "The event loop must not be blocked by synchronous file system calls.",
+    "Формулы нужно оформлять в LaTeX: $E = mc^2$ и $$\\int_0^1 x^2 dx$$.",
+]
+
+
+def make_history(length: int, seed: int = 7) -> List[Dict[str, str]]:
+    """Чередующаяся история user/assistant заданной длины."""
+    rng = random.Random(seed)
+    history = []
+    for i in range(length):
+        role = "user" if i % 2 == 0 else "assistant"
+        content = " ".join(rng.choice(_SENTENCES) for _ in range(rng.randint(1, 6)))
+        history.append({"role": role, "content": content})
+    return history
+
+
+def deepseek_sse_lines(count: int = 200, seed: int = 11) -> List[str]:
+    """Строки SSE-потока DeepSeek: role-чанк, контент-чанки, finish-чанк, пустые разделители и [DONE]."""
+    rng = random.Random(seed)
+    words = " ".join(_SENTENCES).split()
+    lines = []
+
+    def chunk(delta, finish_reason=None):
+        body = {
+            "id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 1700000000,
+            "model": "deepseek-chat",
+            "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}],
+        }
+        lines.append(f"data: {json.dumps(body, ensure_ascii=False)}")
+        lines.append("")
+
+    chunk({"role": "assistant", "content": ""})
+    for _ in range(count):
+        chunk({"content": rng.choice(words) + " "})
+    chunk({"content": ""}, "stop")
+    lines.append("data: [DONE]")
+    return lines
+
+
+def mcp_sse_lines(count: int = 50) -> List[str]:
+    """Строки SSE-потока MCP: event 'endpoint' и ответы tools/call в event 'message'."""
+    lines = ["event: endpoint", "data: /messages/?session_id=0123456789abcdef", ""]
+    for i in range(1, count + 1):
+        msg = {
+            "jsonrpc": "2.0", "id": i,
+            "result": {"content": [{"type": "text", "text": f"🌤️ Погода в Москве\nТемпература: {i % 30}°C"}],
+                       "isError": False},
+        }
+        lines += ["event: message", f"data: {json.dumps(msg, ensure_ascii=False)}", ""]
+    return lines
@@ -0,0 +1,121 @@
+"""
+Исходная реализация _extract_weather_intent (до backend/services/weather_intent.py).
+
+Эталон для тестов эквивалентности и микро-бенчмарка intent_legacy/*; не менять.
+"""
+import logging
+import re
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _extract_weather_intent(prompt: str) -> Optional[Dict[str, Any]]:
+    """
+    Извлекает намерение пользователя из запроса о погоде
+    
+    Returns:
+        Словарь с информацией о намерении или None
+    """
+    prompt_lower = prompt.lower()
+    
+    # Расширенный список ключевых слов для определения запросов о погоде
+    weather_keywords = [
+        "погода", "weather", "температура", "temperature", "temp", 
+        "дождь", "rain", "дожд", "raining", "rainy",
+        "снег", "snow", "снеж", "snowing", "snowy",
+        "ветер", "wind", "ветр", "windy",
+        "прогноз", "forecast", "прогноз погоды", "weather forecast",
+        "облачно", "cloudy", "облака", "clouds",
+        "солнечно", "sunny", "солнце", "sun",
+        "туман", "fog", "туманно", "foggy",
+        "град", "hail", "гроза", "thunderstorm",
+        "влажность", "humidity", "давление", "pressure",
+        "осадки", "precipitation", "осадк",
+        "климат", "climate", "метео", "meteo"
+    ]
+    
+    # Проверяем, есть ли запрос о погоде
+    if not any(keyword in prompt_lower for keyword in weather_keywords):
+        return None
+    
+    intent = {
+        "type": None,
+        "location": None,
+        "days": 3
+    }
+    
+    # Определяем тип запроса
+    if any(word in prompt_lower for word in ["прогноз", "forecast", "на несколько дней", "на неделю"]):
+        intent["type"] = "forecast"
+        # Извлекаем количество дней
+        days_match = re.search(r'(\d+)\s*(?:дн|day|день|дня|дней)', prompt_lower)
+        if days_match:
+            intent["days"] = min(int(days_match.group(1)), 7)
+    else:
+        intent["type"] = "current"
+    
+    # Извлекаем местоположение
+    # Упрощенная и более надежная логика извлечения
+    # Список слов для исключения
+    exclude_words = [
+        "какая", "какой", "какое", "какие", "the", "a", "an", "в", "для", "for",
+        "на", "по", "с", "о", "об", "про", "как", "что", "где", "когда",
+        "расскажи", "скажи", "покажи", "tell", "show", "say", "погода", "weather"
+    ]
+    
+    # Метод 1: Ищем паттерн "в [название города]" - самый частый случай
+    # Ищем "в" или "in", затем слова до конца строки или знака препинания
+    # Берем до 3 слов (для названий типа "Санкт-Петербург", "Нью-Йорк")
+    pattern_v = r'\b(?:в|in)\s+((?:[А-ЯЁа-яёA-Za-z][А-ЯЁа-яёA-Za-z\-]*\s*){1,3})(?:\s|$|,|\.|\?|!|;|:)'
+    match = re.search(pattern_v, prompt, re.IGNORECASE)
+    if match:
+        location = match.group(1).strip().rstrip('.,!?;:()[]{}"\'')
+        location_words = location.split()
+        # Фильтруем стоп-слова из начала
+        filtered_words = []
+        for word in location_words:
+            word_clean = word.strip('.,!?;:()[]{}"\'')
+            if word_clean.lower() not in exclude_words:
+                filtered_words.append(word_clean)
+            else:
+                break  # Если встретили стоп-слово, останавливаемся
+        
+        if filtered_words:
+            location = ' '.join(filtered_words)
+            location_lower = location.lower()
+            # Проверяем, что это не исключенное слово и имеет достаточную длину
+            if (location and len(location) > 2 and 
+                location_lower not in exclude_words):
+                # Приводим к правильному регистру (каждое слово с заглавной буквы)
+                location = ' '.join(word.capitalize() for word in location.split())
+                intent["location"] = location
+                logger.debug(f"Extracted location (method 1 - 'в'): {location} from prompt: {prompt}")
+    
+    # Метод 2: Если не нашли через "в", ищем паттерн "[название города] погода"
+    if not intent["location"]:
+        pattern_city_first = r'([А-ЯЁа-яёA-Za-z][А-ЯЁа-яёA-Za-z\s\-]+?)\s+(?:погода|weather|прогноз|forecast)'
+        match = re.search(pattern_city_first, prompt, re.IGNORECASE)
+        if match:
+            location = match.group(1).strip().rstrip('.,!?;:()[]{}"\'')
+            location_lower = location.lower()
+            if (location and len(location) > 2 and 
+                location_lower not in exclude_words):
+                # Приводим к правильному регистру
+                if location[0].islower():
+                    location = location[0].upper() + location[1:]
+                intent["location"] = location
+                logger.debug(f"Extracted location (method 2 - city first): {location} from prompt: {prompt}")
+    
+    # Метод 3: Ищем слова с заглавной буквы в тексте (резервный метод)
+    if not intent["location"]:
+        words = prompt.split()
+        for word in words:
+            clean_word = word.strip('.,!?;:()[]{}"\'')
+            if (clean_word and clean_word[0].isupper() and len(clean_word) > 2 and
+                clean_word.lower() not in weather_keywords + exclude_words):
+                intent["location"] = clean_word
+                logger.debug(f"Extracted location (method 3 - capitalized): {clean_word} from prompt: {prompt}")
+                break
+    
+    return intent
@@ -0,0 +1,282 @@
+"""
+Нагрузочный бенчмарк всех API роутеров против локальных mock upstream-ов.
+
+Запускает mock LLM (DeepSeek/Hugging Face) и mock MCP Weather в этом процессе,
+backend — отдельным процессом uvicorn (чтобы CPU и RSS измерялись только для него),
+и прогоняет сценарии с заданной конкурентностью. Результат пишется в JSON,
+который можно сравнивать между коммитами:
+
+    python -m benchmarks.load --concurrency 16 --requests 200 --output bench/HEAD.json
+    python -m benchmarks.load --compare bench/main.json bench/HEAD.json --threshold 0.15
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks import mock_llm_server, mock_mcp_server
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+_HISTORY = [
+    {"role": "user" if i % 2 == 0 else "assistant",
+     "content": f"Сообщение {i}: расскажи подробнее про кэширование префиксов и потоковую генерацию."}
+    for i in range(11)
+] + [{"role": "user", "content": "Подведи итог нашего разговора."}]
+
+# name -> (method, path, json body, streaming)
+SCENARIOS: Dict[str, tuple] = {
+    "chat": ("POST", "/api/chat", {"prompt": "Сгенерируй промпт для рефакторинга модуля"}, False),
+    "chat_stream": ("POST", "/api/chat/stream", {"prompt": "Сгенерируй промпт для рефакторинга модуля"}, True),
+    "llama_stream": ("POST", "/api/llama/stream", {"prompt": "Explain prefix caching"}, True),
+    "compression_chat": ("POST", "/api/compression/chat", {"messages": _HISTORY}, False),
+    "compression_chat_stream": ("POST", "/api/compression/chat/stream", {"messages": _HISTORY}, True),
+    "weather_chat": ("POST", "/api/weather-chat", {"prompt": "какая погода в Москве?"}, False),
+    "weather_chat_stream": ("POST", "/api/weather-chat/stream", {"prompt": "какая погода в Москве?"}, True),
+    "mcp_list_tools": ("GET", "/api/mcp/list-tools/mcp-weather", None, False),
+    "mcp_call_tool": ("POST", "/api/mcp/call-tool", {
+        "server_name": "mcp-weather", "tool_name": "get_current_weather", "arguments": {"location": "Москва"},
+    }, False),
+}
+
+# Метрики, рост которых считается регрессией при --compare
+_REGRESSION_KEYS = ("p50_ms", "p95_ms", "p99_ms", "ttft_p50_ms", "cpu_ms_per_request", "rss_mb")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _proc_stats(pid: int) -> Dict[str, float]:
+    """CPU time (сек) и RSS (МБ) процесса из /proc (Linux). На других ОС возвращает пустой dict."""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        cpu = (int(stat[11]) + int(stat[12])) / ticks
+        rss_kb = hwm_kb = 0
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+            elif line.startswith("VmHWM:"):
+                hwm_kb = int(line.split()[1])
+        return {"cpu_s": cpu, "rss_mb": rss_kb / 1024, "peak_rss_mb": hwm_kb / 1024}
+    except (OSError, ValueError, IndexError):
+        return {}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _one_request(client: httpx.AsyncClient, method: str, path: str, body: Any, streaming: bool) -> Dict[str, Any]:
+    start = time.perf_counter()
+    ttft = None
+    if streaming:
+        async with client.stream(method, path, json=body) as response:
+            async for line in response.aiter_lines():
+                # Первое полезное событие: часть ответа или данные MCP (weather-chat/stream)
+                if ttft is None and line.startswith("data: ") and ('"content"' in line or '"weather_data"' in line):
+                    ttft = time.perf_counter() - start
+            status = response.status_code
+    else:
+        response = await client.request(method, path, json=body)
+        status = response.status_code
+    return {"latency": time.perf_counter() - start, "ttft": ttft, "ok": status < 400}
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, requests: int, concurrency: int,
+                       backend_pid: Optional[int], warmup: int = 3) -> Dict[str, Any]:
+    """Прогоняет один сценарий и возвращает агрегированные метрики."""
+    method, path, body, streaming = SCENARIOS[name]
+    for _ in range(warmup):
+        await _one_request(client, method, path, body, streaming)
+
+    results: List[Dict[str, Any]] = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for _ in counter:
+            try:
+                results.append(await _one_request(client, method, path, body, streaming))
+            except httpx.HTTPError:
+                results.append({"latency": None, "ttft": None, "ok": False})
+
+    before = _proc_stats(backend_pid) if backend_pid else {}
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    after = _proc_stats(backend_pid) if backend_pid else {}
+
+    latencies = [r["latency"] * 1000 for r in results if r["ok"]]
+    ttfts = [r["ttft"] * 1000 for r in results if r["ok"] and r["ttft"] is not None]
+    report = {
+        "requests": len(results),
+        "errors": sum(1 for r in results if not r["ok"]),
+        "throughput_rps": len(results) / elapsed if elapsed else None,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99),
+    }
+    if streaming:
+        report.update({
+            "ttft_p50_ms": _percentile(ttfts, 50),
+            "ttft_p95_ms": _percentile(ttfts, 95),
+        })
+    if before and after:
+        report.update({
+            "cpu_ms_per_request": (after["cpu_s"] - before["cpu_s"]) * 1000 / max(1, len(results)),
+            "rss_mb": after["rss_mb"],
+            "peak_rss_mb": after["peak_rss_mb"],
+        })
+    return report
+
+
+def _start_backend(port: int, env: Dict[str, str], log_file) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+
+
+async def _wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/api/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Backend at {base_url} did not become ready")
+
+
+async def _run_all(args, base_url: str, backend_pid: Optional[int]) -> Dict[str, Any]:
+    await _wait_ready(base_url)
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+    report: Dict[str, Any] = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        for name in args.scenarios:
+            report[name] = await run_scenario(client, name, args.requests, args.concurrency, backend_pid)
+            print(f"{name:<26} {json.dumps({k: round(v, 2) if isinstance(v, float) else v for k, v in report[name].items()})}")
+    return report
+
+
+def run(args) -> Dict[str, Any]:
+    """Поднимает mock upstream-ы и backend, выполняет сценарии, возвращает отчёт."""
+    with ExitStack() as stack:
+        llm_settings = mock_llm_server.MockSettings(ttft_ms=args.mock_ttft_ms, tokens_per_sec=args.mock_tokens_per_sec)
+        llm_url = stack.enter_context(mock_llm_server.serve_in_background(mock_llm_server.create_app(llm_settings)))
+        mcp_url = stack.enter_context(mock_llm_server.serve_in_background(mock_mcp_server.create_app()))
+
+        backend_pid = None
+        if args.backend_url:
+            base_url = args.backend_url
+        else:
+            port = _free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            db_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            env = dict(os.environ)
+            env.update({
+                "DEEPSEEK_API_URL": f"{llm_url}/v1/chat/completions",
+                "HUGGINGFACE_API_URL": f"{llm_url}/v1/chat/completions",
+                "DEEPSEEK_API_KEY": "mock",
+                "HUGGINGFACE_API_KEY": "mock",
+                "MCP_WEATHER_SERVER_URL": mcp_url,
+                "MCP_USE_HTTP": "true",
+                "SUMMARIES_DB_DIR": db_dir,
+            })
+            log_file = stack.enter_context(open(args.backend_log, "ab")) if args.backend_log else subprocess.DEVNULL
+            backend = _start_backend(port, env, log_file)
+            stack.callback(backend.wait, 10)
+            stack.callback(backend.terminate)
+            backend_pid = backend.pid
+
+        scenarios = asyncio.run(_run_all(args, base_url, backend_pid))
+
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "mock_ttft_ms": args.mock_ttft_ms,
+            "mock_tokens_per_sec": args.mock_tokens_per_sec,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    """Сравнивает два отчёта; возвращает 1, если какая-либо метрика выросла больше чем на threshold."""
+    old = json.loads(Path(old_path).read_text())["scenarios"]
+    new = json.loads(Path(new_path).read_text())["scenarios"]
+    regressions = 0
+    for name in sorted(set(old) & set(new)):
+        for key in _REGRESSION_KEYS:
+            before, after = old[name].get(key), new[name].get(key)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            mark = "REGRESSION" if change > threshold else ""
+            regressions += bool(mark)
+            print(f"{name:<26} {key:<20} {before:>10.2f} -> {after:>10.2f} ({change:+.1%}) {mark}")
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    """Точка входа для запуска из командной строки."""
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark for API routers")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--output", help="write JSON report to this file")
+    parser.add_argument("--backend-url", help="benchmark an already running backend instead of spawning one")
+    parser.add_argument("--backend-log", help="append spawned backend output to this file (default: discard)")
+    parser.add_argument("--mock-ttft-ms", type=float, default=50.0)
+    parser.add_argument("--mock-tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two JSON reports")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative growth treated as regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    report = run(args)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False, sort_keys=True))
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Бенчмарк стоимости JSON-RPC POST в SSE-сессии MCP (против mock MCP сервера).
+
+Сравнивает два режима отправки POST /messages/ одной и той же сессией:
+    per_request — новый httpx.AsyncClient на каждый POST (как было раньше);
+    pooled      — общий keep-alive клиент сессии (SSESession._post).
+Доля установки соединения в латентности tools/call = 1 - pooled / per_request.
+
+    python -m benchmarks.mcp_post --calls 300 --concurrency 4
+    python -m benchmarks.mcp_post --tool-latency-ms 0 --output bench/mcp-post.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+# backend.config требует ключ при импорте; бенчмарки не ходят в сеть
+os.environ.setdefault("DEEPSEEK_API_KEY", "mock")
+
+from backend.services.mcp_sse import MCP_HTTP_HEADERS, SSESession  # noqa: E402
+from benchmarks import mock_mcp_server  # noqa: E402
+from benchmarks.mock_llm_server import serve_in_background  # noqa: E402
+
+
+class _PerRequestClientSession(SSESession):
+    """Сессия, открывающая отдельный клиент на каждый POST (поведение до общего клиента)."""
+
+    async def _post(self, payload: Any) -> httpx.Response:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            response = await client.post(self.messages_url, json=payload, headers=MCP_HTTP_HEADERS)
+        if response.status_code != 202:
+            response.raise_for_status()
+        return response
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _measure(session_cls: type, base_url: str, calls: int, concurrency: int) -> Dict[str, float]:
+    session = session_cls(base_url)
+    await session.connect()
+    params = {"name": "get_current_weather", "arguments": {"location": "Москва"}}
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await session.request("tools/call", params)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    try:
+        await asyncio.gather(*(one() for _ in range(min(calls, 20))))  # прогрев
+        latencies.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(calls)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await session.close()
+    return {
+        "calls": calls,
+        "throughput_rps": round(calls / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "p50_ms": round(_percentile(latencies, 0.5), 3),
+        "p95_ms": round(_percentile(latencies, 0.95), 3),
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Запускает mock MCP и измеряет оба режима."""
+    settings = mock_mcp_server.MockMCPSettings(tool_latency_ms=args.tool_latency_ms)
+    with serve_in_background(mock_mcp_server.create_app(settings)) as base_url:
+        per_request = asyncio.run(_measure(_PerRequestClientSession, base_url, args.calls, args.concurrency))
+        pooled = asyncio.run(_measure(SSESession, base_url, args.calls, args.concurrency))
+    return {
+        "tool_latency_ms": args.tool_latency_ms,
+        "concurrency": args.concurrency,
+        "per_request": per_request,
+        "pooled": pooled,
+        "connection_setup_share": round(1 - pooled["mean_ms"] / per_request["mean_ms"], 3),
+    }
+
+
+def main() -> None:
+    """Точка входа для запуска из командной строки."""
+    parser = argparse.ArgumentParser(description="MCP SSE POST cost: per-request client vs pooled keep-alive client")
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--tool-latency-ms", type=float, default=0.0)
+    parser.add_argument("--output", help="write JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    for mode in ("per_request", "pooled"):
+        print(f"{mode:<12} {json.dumps(report[mode])}")
+    print(f"connection setup share of tools/call latency: {report['connection_setup_share']:.1%}")
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False, sort_keys=True))
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Микро-бенчмарки CPU hot paths, которые выполняются на каждом запросе.
+
+Для каждого кейса измеряется время на одну операцию (ns/op, лучшее из нескольких
+повторов timeit) и пик выделенной памяти на операцию (tracemalloc):
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --filter intent --output bench/micro-HEAD.json
+    python -m benchmarks.micro --compare bench/micro-main.json bench/micro-HEAD.json
+
+Новые кейсы регистрируются декоратором @case: функция-setup возвращает пару
+(op, items) — вызываемый объект без аргументов и число элементов, которое он
+обрабатывает за вызов (ns/op считается на один элемент).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+from benchmarks import corpora
+
+# backend.config требует ключ при импорте; бенчмарки не ходят в сеть
+os.environ.setdefault("DEEPSEEK_API_KEY", "mock")
+
+SetupFn = Callable[[], Tuple[Callable[[], Any], int]]
+CASES: Dict[str, SetupFn] = {}
+
+
+def case(name: str) -> Callable[[SetupFn], SetupFn]:
+    """Регистрирует кейс микро-бенчмарка."""
+    def register(setup: SetupFn) -> SetupFn:
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class _StubFuture:
+    """Минимальная замена asyncio.Future, чтобы не мерить накладные расходы event loop."""
+    __slots__ = ("result",)
+
+    def __init__(self) -> None:
+        self.result = None
+
+    def done(self) -> bool:
+        return self.result is not None
+
+    def set_result(self, value: Any) -> None:
+        self.result = value
+
+
+# --- weather intent ---------------------------------------------------------
+
+def _intent_case(prompts, legacy=False):
+    if legacy:
+        from benchmarks.legacy_intent import _extract_weather_intent
+    else:
+        # Без LRU-кэша: меряется сам разбор
+        from backend.services.weather_intent import parse_weather_intent as _extract_weather_intent
+
+    def op():
+        for prompt in prompts:
+            _extract_weather_intent(prompt)
+    return op, len(prompts)
+
+
+def _intent_memo_case(prompts):
+    from backend.services.weather_intent import IntentMemo
+    memo = IntentMemo(maxsize=len(prompts), log_sample=0)
+    for prompt in prompts:
+        memo.get(prompt)
+
+    def op():
+        for prompt in prompts:
+            memo.get(prompt)
+    return op, len(prompts)
+
+
+case("intent/ru")(lambda: _intent_case(corpora.WEATHER_PROMPTS_RU))
+case("intent/en")(lambda: _intent_case(corpora.WEATHER_PROMPTS_EN))
+case("intent/non_weather")(lambda: _intent_case(corpora.OTHER_PROMPTS))
+case("intent/memo_hit")(lambda: _intent_memo_case(corpora.WEATHER_PROMPTS_RU + corpora.WEATHER_PROMPTS_EN))
+# Исходная реализация — для сравнения в одном прогоне
+case("intent_legacy/ru")(lambda: _intent_case(corpora.WEATHER_PROMPTS_RU, legacy=True))
+case("intent_legacy/en")(lambda: _intent_case(corpora.WEATHER_PROMPTS_EN, legacy=True))
+case("intent_legacy/non_weather")(lambda: _intent_case(corpora.OTHER_PROMPTS, legacy=True))
+
+
+def _gazetteer_case(names):
+    from backend.services.gazetteer import get_gazetteer
+    gazetteer = get_gazetteer()
+
+    def op():
+        for name in names:
+            gazetteer.resolve(name)
+    return op, len(names)
+
+
+case("gazetteer/exact")(lambda: _gazetteer_case(
+    ["Москве", "Санкт-Петербурге", "Нижнем Новгороде", "London", "Нью-Йорке", "Казани", "Rostov-on-Don"]))
+case("gazetteer/fuzzy")(lambda: _gazetteer_case(
+    ["Масква", "Londn", "Новосиб", "Екатеренбург", "Санкт-Питербург", "Vladivostock", "Казани Дождь"]))
+
+
+# --- compression: token estimate и summary prompt --------------------------
+
+def _estimate_case(length):
+    from backend.routers.compression import _estimate_messages_tokens
+    history = corpora.make_history(length)
+    return (lambda: _estimate_messages_tokens(history)), 1
+
+
+def _summary_prompt_case(length):
+    from backend.routers.compression import _create_summary_prompt
+    history = corpora.make_history(length)
+    return (lambda: _create_summary_prompt(history)), 1
+
+
+def _history_builder_case(length):
+    from backend.services.history import HistoryBuilder
+    history = corpora.make_history(length)
+
+    def op():
+        # Промпт и оценка токенов за один проход (как в /api/compression/chat)
+        builder = HistoryBuilder(history)
+        return builder.summary_prompt(), builder.tokens
+    return op, 1
+
+
+for _length in (20, 200, 2000):
+    case(f"estimate_tokens/history_{_length}")(lambda length=_length: _estimate_case(length))
+    case(f"summary_prompt/history_{_length}")(lambda length=_length: _summary_prompt_case(length))
+    case(f"history_builder/history_{_length}")(lambda length=_length: _history_builder_case(length))
+
+
+# --- prepare_messages -------------------------------------------------------
+
+@case("prepare_messages/prompt")
+def _prepare_prompt():
+    from backend.routers.common import CompletionRequest, prepare_messages
+    request = CompletionRequest(prompt=corpora.OTHER_PROMPTS[3], system_prompt=corpora.OTHER_PROMPTS[1])
+    return (lambda: prepare_messages(request)), 1
+
+
+@case("prepare_messages/messages_200")
+def _prepare_history():
+    from backend.routers.common import CompletionRequest, prepare_messages
+    request = CompletionRequest(messages=corpora.make_history(200) + [{"role": "assistant", "content": "ok"}])
+    return (lambda: prepare_messages(request)), 1
+
+
+@case("prepare_messages/template")
+def _prepare_template():
+    from backend.routers.common import CompletionRequest, prepare_messages
+    request = CompletionRequest(template="prompt_generator", template_vars={"task": corpora.OTHER_PROMPTS[3]}, latex=True)
+    return (lambda: prepare_messages(request)), 1
+
+
+# --- SSE parsing ------------------------------------------------------------
+
+@case("sse/deepseek_stream_line")
+def _deepseek_sse():
+    from backend.services.deepseek_api import _parse_stream_line
+    lines = corpora.deepseek_sse_lines()
+
+    def op():
+        for line in lines:
+            _parse_stream_line(line)
+    return op, len(lines)
+
+
+@case("sse/mcp_read_loop_line")
+def _mcp_sse():
+    from backend.services.mcp_sse import _SSELineParser, _dispatch_sse_message
+    lines = corpora.mcp_sse_lines()
+    ids = range(1, len(lines))
+
+    def op():
+        futures = {i: _StubFuture() for i in ids}
+        parser = _SSELineParser()
+        for line in lines:
+            event = parser.feed(line)
+            if event is not None and event[0] == "message":
+                _dispatch_sse_message(event[1], futures)
+    return op, len(lines)
+
+
+# --- JSON serialization -----------------------------------------------------
+# Кейсы json/* — активная библиотека (services/serialization), json_stdlib/* — stdlib json
+# на тех же данных
+
+def _sse_chunks():
+    words = " ".join(corpora.OTHER_PROMPTS).split()
+    return [{"content": word + " "} for word in words]
+
+
+def _response_body():
+    from backend.services.conversations import Conversation
+    return Conversation("bench", corpora.make_history(200), summary=corpora.OTHER_PROMPTS[0]).to_dict()
+
+
+def _mcp_lines():
+    return [line[5:].strip().encode("utf-8") for line in corpora.mcp_sse_lines() if line.startswith("data: {")]
+
+
+def _active_json():
+    from backend.services.serialization import dumps, dumps_bytes, loads
+    return dumps, dumps_bytes, loads
+
+
+def _stdlib_json():
+    # Так сериализовали до services/serialization: json.dumps по умолчанию для SSE и MCP,
+    # JSONResponse FastAPI для ответов
+    from fastapi.responses import JSONResponse
+    return json.dumps, JSONResponse(None).render, json.loads
+
+
+def _json_cases(prefix, backend):
+    @case(f"{prefix}/sse_chunk")
+    def _sse_chunk():
+        dumps, _, _ = backend()
+        chunks = _sse_chunks()
+
+        def op():
+            for chunk in chunks:
+                dumps(chunk)
+        return op, len(chunks)
+
+    @case(f"{prefix}/response_200_messages")
+    def _response():
+        _, dumps_bytes, _ = backend()
+        body = _response_body()
+        return (lambda: dumps_bytes(body)), 1
+
+    @case(f"{prefix}/mcp_line")
+    def _mcp_line():
+        _, _, loads = backend()
+        lines = _mcp_lines()
+
+        def op():
+            for line in lines:
+                loads(line)
+        return op, len(lines)
+
+
+_json_cases("json", _active_json)
+_json_cases("json_stdlib", _stdlib_json)
+
+
+# --- runner -----------------------------------------------------------------
+
+def _alloc_peak_bytes(op: Callable[[], Any], items: int, samples: int = 20) -> float:
+    """Медианный пик памяти (байт) сверх текущей, выделяемой за одну операцию, на один элемент."""
+    tracemalloc.start()
+    try:
+        op()
+        peaks = []
+        for _ in range(samples):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            op()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        return statistics.median(peaks) / items
+    finally:
+        tracemalloc.stop()
+
+
+def measure(op: Callable[[], Any], items: int, repeat: int = 5) -> Dict[str, float]:
+    """Возвращает ns/op (лучший из repeat прогонов) и пик аллокаций на элемент."""
+    timer = timeit.Timer(op)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return {
+        "ns_per_op": best * 1e9 / items,
+        "alloc_peak_bytes_per_op": _alloc_peak_bytes(op, items),
+    }
+
+
+def run(name_filter: str = "") -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, setup in CASES.items():
+        if name_filter and name_filter not in name:
+            continue
+        op, items = setup()
+        results[name] = measure(op, items)
+        r = results[name]
+        print(f"{name:<36} {r['ns_per_op']:>14,.0f} ns/op {r['alloc_peak_bytes_per_op']:>12,.0f} B/op")
+    return results
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    """Сравнивает два отчёта по ns/op; возвращает 1 при замедлении больше threshold."""
+    old = json.loads(Path(old_path).read_text())["cases"]
+    new = json.loads(Path(new_path).read_text())["cases"]
+    regressions = 0
+    for name in sorted(set(old) & set(new)):
+        before, after = old[name]["ns_per_op"], new[name]["ns_per_op"]
+        change = (after - before) / before
+        mark = "REGRESSION" if change > threshold else ""
+        regressions += bool(mark)
+        print(f"{name:<36} {before:>14,.0f} -> {after:>14,.0f} ns/op ({change:+.1%}) {mark}")
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    """Точка входа для запуска из командной строки."""
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for per-request CPU hot paths")
+    parser.add_argument("--filter", default="", help="run only cases whose name contains this substring")
+    parser.add_argument("--output", help="write JSON report to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two JSON reports")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown treated as regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    results = run(args.filter)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps({"cases": results}, indent=2, sort_keys=True))
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Локальный mock OpenAI-совместимого LLM API для нагрузочного и интеграционного тестирования.
+
+Заменяет DEEPSEEK_API_URL и HUGGINGFACE_API_URL без расхода реальных токенов:
+
+    python -m benchmarks.mock_llm_server --port 8100
+    DEEPSEEK_API_URL=http://127.0.0.1:8100/v1/chat/completions \\
+    HUGGINGFACE_API_URL=http://127.0.0.1:8100/v1/chat/completions uvicorn backend.main:app
+
+Поведение детерминировано (фиксированный seed) и настраивается через переменные
+окружения MOCK_LLM_* или во время работы через POST /_mock/config.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, fields
+from typing import Any, Dict, Iterator, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Словарь, из которого собираются «сгенерированные» ответы
+_WORDS = (
+    "погода облачно температура ветер прогноз солнце дождь давление влажность "
+    "ответ модель контекст данные запрос пример решение формула система анализ "
+    "the weather is cloudy with light rain and moderate wind in the afternoon"
+).split()
+
+# DeepSeek кэширует префиксы промпта блоками по 64 токена
+_CACHE_BLOCK_TOKENS = 64
+_CHARS_PER_TOKEN = 3
+
+
+@dataclass
+class MockSettings:
+    """Настройки поведения mock-сервера."""
+    ttft_ms: float = 50.0            # задержка до первого токена
+    tokens_per_sec: float = 200.0    # скорость генерации
+    completion_tokens: int = 64      # длина ответа, если max_tokens не ограничивает
+    error_rate: float = 0.0          # доля ответов HTTP 500
+    loading_rate: float = 0.0        # доля ответов HTTP 503 "model loading"
+    loading_requests: int = 0        # первые N запросов получают 503 (прогрев модели)
+    force_length: bool = False       # всегда завершать ответ с finish_reason=length
+    seed: int = 42
+
+    @classmethod
+    def from_env(cls) -> "MockSettings":
+        values = {}
+        for f in fields(cls):
+            raw = os.getenv(f"MOCK_LLM_{f.name.upper()}")
+            if raw is None:
+                continue
+            if f.type in (bool, "bool"):
+                values[f.name] = raw.lower() in ("1", "true", "yes")
+            elif f.type in (int, "int"):
+                values[f.name] = int(raw)
+            else:
+                values[f.name] = float(raw)
+        return cls(**values)
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // _CHARS_PER_TOKEN) if text else 0
+
+
+def _render_prompt(messages: List[Dict[str, Any]]) -> str:
+    return "".join(f"<{m.get('role', '')}>{m.get('content', '')}" for m in messages)
+
+
+class _PrefixCache:
+    """Имитация context caching DeepSeek: попадание засчитывается для общего префикса, кратного 64 токенам."""
+
+    def __init__(self) -> None:
+        self._seen: set = set()
+
+    def lookup_and_store(self, prompt: str) -> int:
+        block_chars = _CACHE_BLOCK_TOKENS * _CHARS_PER_TOKEN
+        hit_blocks = 0
+        digest = hashlib.sha1()
+        matching = True
+        for start in range(0, len(prompt) - block_chars + 1, block_chars):
+            digest.update(prompt[start:start + block_chars].encode("utf-8"))
+            key = digest.copy().hexdigest()
+            if matching and key in self._seen:
+                hit_blocks += 1
+            else:
+                matching = False
+                self._seen.add(key)
+        return hit_blocks * _CACHE_BLOCK_TOKENS
+
+
+class MockLLM:
+    """Состояние mock-сервера: настройки, генератор случайных чисел, кэш префиксов, счётчики."""
+
+    def __init__(self, settings: MockSettings):
+        self.settings = settings
+        self.reset()
+
+    def reset(self) -> None:
+        self._rng = random.Random(self.settings.seed)
+        self._cache = _PrefixCache()
+        self.requests = 0
+        self.streamed_requests = 0
+
+    def next_failure(self) -> Optional[JSONResponse]:
+        """Возвращает ответ с ошибкой, если этот запрос должен завершиться неуспешно."""
+        self.requests += 1
+        s = self.settings
+        if self.requests <= s.loading_requests or (s.loading_rate and self._rng.random() < s.loading_rate):
+            return JSONResponse(
+                status_code=503,
+                content={"error": "Model is currently loading", "estimated_time": 20.0},
+            )
+        if s.error_rate and self._rng.random() < s.error_rate:
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Mock upstream error", "type": "server_error"}},
+            )
+        return None
+
+    def plan(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Определяет текст ответа, finish_reason и usage для запроса."""
+        messages = payload.get("messages") or []
+        prompt = _render_prompt(messages)
+        max_tokens = payload.get("max_tokens") or self.settings.completion_tokens
+        n_tokens = min(self.settings.completion_tokens, max_tokens)
+        finish_reason = "length" if self.settings.force_length or max_tokens < self.settings.completion_tokens else "stop"
+        tokens = [self._rng.choice(_WORDS) + " " for _ in range(n_tokens)]
+
+        prompt_tokens = sum(_estimate_tokens(str(m.get("content", ""))) + 4 for m in messages)
+        hit_tokens = min(self._cache.lookup_and_store(prompt), prompt_tokens)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": n_tokens,
+            "total_tokens": prompt_tokens + n_tokens,
+            "prompt_cache_hit_tokens": hit_tokens,
+            "prompt_cache_miss_tokens": prompt_tokens - hit_tokens,
+        }
+        return {
+            "id": f"mock-{self.requests}",
+            "model": payload.get("model", "mock-model"),
+            "tokens": tokens,
+            "finish_reason": finish_reason,
+            "usage": usage,
+        }
+
+
+def create_app(settings: Optional[MockSettings] = None) -> FastAPI:
+    """Создаёт ASGI-приложение mock-сервера."""
+    app = FastAPI(title="Mock LLM API")
+    state = MockLLM(settings or MockSettings.from_env())
+    app.state.mock = state
+
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        failure = state.next_failure()
+        if failure is not None:
+            return failure
+        plan = state.plan(payload)
+        s = state.settings
+        created = int(time.time())
+
+        if not payload.get("stream"):
+            await asyncio.sleep(s.ttft_ms / 1000 + len(plan["tokens"]) / s.tokens_per_sec)
+            return {
+                "id": plan["id"],
+                "object": "chat.completion",
+                "created": created,
+                "model": plan["model"],
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(plan["tokens"])},
+                    "finish_reason": plan["finish_reason"],
+                }],
+                "usage": plan["usage"],
+            }
+
+        state.streamed_requests += 1
+        include_usage = bool((payload.get("stream_options") or {}).get("include_usage"))
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            body = {
+                "id": plan["id"],
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": plan["model"],
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+        async def generate():
+            await asyncio.sleep(s.ttft_ms / 1000)
+            yield chunk({"role": "assistant", "content": ""})
+            delay = 1 / s.tokens_per_sec
+            for i, token in enumerate(plan["tokens"]):
+                if i:
+                    await asyncio.sleep(delay)
+                yield chunk({"content": token})
+            yield chunk({}, plan["finish_reason"])
+            if include_usage:
+                body = {"id": plan["id"], "object": "chat.completion.chunk", "created": created,
+                        "model": plan["model"], "choices": [], "usage": plan["usage"]}
+                yield f"data: {json.dumps(body)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(generate(), media_type="text/event-stream")
+
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/chat/completions", chat_completions, methods=["POST"])
+
+    @app.get("/_mock/config")
+    async def get_config():
+        return {"settings": asdict(state.settings), "requests": state.requests,
+                "streamed_requests": state.streamed_requests}
+
+    @app.post("/_mock/config")
+    async def update_config(values: Dict[str, Any]):
+        """Меняет настройки на лету и сбрасывает состояние (seed, кэш префиксов, счётчики)."""
+        known = {f.name for f in fields(MockSettings)}
+        state.settings = MockSettings(**{**asdict(state.settings), **{k: v for k, v in values.items() if k in known}})
+        state.reset()
+        return {"settings": asdict(state.settings)}
+
+    return app
+
+
+@contextmanager
+def serve_in_background(app, host: str = "127.0.0.1", port: int = 0) -> Iterator[str]:
+    """
+    Запускает ASGI-приложение через uvicorn в отдельном потоке.
+
+    Yields:
+        Базовый URL запущенного сервера (например, http://127.0.0.1:54321)
+    """
+    import uvicorn
+
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError("Mock server failed to start")
+        time.sleep(0.01)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{bound_port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+def main() -> None:
+    """Точка входа для запуска из командной строки."""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Локальный mock MCP Weather сервера (SSE transport как у MCP Python SDK) для бенчмарков и тестов.
+
+Протокол:
+    GET  /sse                          → event "endpoint" с /messages/?session_id=..., затем event "message" с ответами
+    POST /messages/?session_id=...     → 202 Accepted, ответ JSON-RPC приходит по SSE stream сессии
+    POST /                             → обычный JSON-RPC по HTTP (ответ в теле)
+
+    python -m benchmarks.mock_mcp_server --port 9101
+    MCP_WEATHER_SERVER_URL=http://127.0.0.1:9101 uvicorn backend.main:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+_TOOLS = [
+    {
+        "name": "get_current_weather",
+        "description": "Get current weather for a location",
+        "inputSchema": {
+            "type": "object",
+            "properties": {"location": {"type": "string"}},
+        },
+    },
+    {
+        "name": "get_weather_forecast",
+        "description": "Get weather forecast for a location",
+        "inputSchema": {
+            "type": "object",
+            "properties": {"location": {"type": "string"}, "days": {"type": "integer"}},
+        },
+    },
+]
+
+
+@dataclass
+class MockMCPSettings:
+    """Настройки поведения mock MCP сервера."""
+    tool_latency_ms: float = float(os.getenv("MOCK_MCP_TOOL_LATENCY_MS", "20"))
+
+
+def _tool_result(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    location = arguments.get("location") or "Москва"
+    if name == "get_current_weather":
+        text = f"🌤️ Погода в {location}\nТемпература: 15°C\nУсловия: облачно\nВетер: 4 м/с"
+    elif name == "get_weather_forecast":
+        days = int(arguments.get("days") or 3)
+        lines = [f"День {i + 1}: {14 + i}°C, переменная облачность" for i in range(days)]
+        text = f"📅 Прогноз погоды в {location} на {days} дней\n" + "\n".join(lines)
+    else:
+        return {"content": [{"type": "text", "text": f"Unknown tool: {name}"}], "isError": True}
+    return {"content": [{"type": "text", "text": text}], "isError": False}
+
+
+class MockMCP:
+    """Состояние mock MCP сервера: открытые SSE-сессии и счётчики."""
+
+    def __init__(self, settings: MockMCPSettings):
+        self.settings = settings
+        self.sessions: Dict[str, asyncio.Queue] = {}
+        self.requests = 0
+        self.posts = 0
+
+    async def handle(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Обрабатывает одно JSON-RPC сообщение; для notifications возвращает None."""
+        if "id" not in message:
+            return None
+        self.requests += 1
+        method = message.get("method")
+        params = message.get("params") or {}
+        if method == "initialize":
+            result = {
+                "protocolVersion": params.get("protocolVersion", "2024-11-05"),
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": "mock-weather", "version": "1.0"},
+            }
+        elif method == "tools/list":
+            result = {"tools": _TOOLS}
+        elif method == "tools/call":
+            await asyncio.sleep(self.settings.tool_latency_ms / 1000)
+            result = _tool_result(params.get("name", ""), params.get("arguments") or {})
+        elif method == "ping":
+            result = {}
+        else:
+            return {"jsonrpc": "2.0", "id": message["id"],
+                    "error": {"code": -32601, "message": f"Method not found: {method}"}}
+        return {"jsonrpc": "2.0", "id": message["id"], "result": result}
+
+    async def handle_payload(self, payload: Any) -> Any:
+        """Обрабатывает одиночный запрос или JSON-RPC batch (список)."""
+        if isinstance(payload, list):
+            responses = await asyncio.gather(*(self.handle(m) for m in payload))
+            return [r for r in responses if r is not None]
+        return await self.handle(payload)
+
+
+def create_app(settings: Optional[MockMCPSettings] = None) -> FastAPI:
+    """Создаёт ASGI-приложение mock MCP сервера."""
+    app = FastAPI(title="Mock MCP Weather")
+    state = MockMCP(settings or MockMCPSettings())
+    app.state.mock = state
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/sse")
+    async def sse(request: Request):
+        session_id = uuid.uuid4().hex
+        queue: asyncio.Queue = asyncio.Queue()
+        state.sessions[session_id] = queue
+
+        async def events():
+            try:
+                yield f"event: endpoint\ndata: /messages/?session_id={session_id}\n\n"
+                while True:
+                    message = await queue.get()
+                    yield f"event: message\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+            finally:
+                state.sessions.pop(session_id, None)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/messages/")
+    async def messages(request: Request, session_id: str):
+        queue = state.sessions.get(session_id)
+        if queue is None:
+            return JSONResponse(status_code=404, content={"error": "Could not find session"})
+        payload = await request.json()
+        state.posts += 1
+
+        async def respond():
+            response = await state.handle_payload(payload)
+            if response:
+                await queue.put(response)
+
+        asyncio.create_task(respond())
+        return Response(status_code=202, content="Accepted")
+
+    @app.post("/")
+    async def jsonrpc(request: Request):
+        response = await state.handle_payload(await request.json())
+        return JSONResponse(content=response if response is not None else {})
+
+    return app
+
+
+def main() -> None:
+    """Точка входа для запуска из командной строки."""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock MCP Weather server (SSE transport)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    args = parser.parse_args()
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Тесты для раскладки stable сжатой истории (кэш префикса DeepSeek)"""
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks import corpora
+from benchmarks.mock_llm_server import MockSettings, create_app, serve_in_background
+from backend.routers import compression
+from backend.services.compression_layout import BlockSummaryCache, block_summaries, stable_history
+from backend.services.conversations import conversation_store
+
+
+class _Summarizer:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, messages):
+        self.calls.append(messages)
+        return f"итог {len(self.calls)}"
+
+
+def _stable(messages, summarizer, cache):
+    return asyncio.run(stable_history(messages, summarizer, 10, cache))
+
+
+class TestStableHistory:
+    """Тесты для stable_history"""
+
+    def test_prefix_is_frozen_and_only_tail_changes(self):
+        system = {"role": "system", "content": "Отвечай кратко"}
+        history = corpora.make_history(40)
+        summarizer, cache = _Summarizer(), BlockSummaryCache()
+
+        first = _stable([system] + history[:25], summarizer, cache)
+        assert first.messages[0] is system
+        assert first.frozen_count == 20 and first.created == 2
+        assert first.messages[3:] == history[20:25]
+
+        second = _stable([system] + history[:35], summarizer, cache)
+        # Суммаризации первых блоков не переписываются — добавляется только следующая
+        assert second.messages[:3] == first.messages[:3]
+        assert second.created == 1 and len(summarizer.calls) == 3
+        assert second.messages[4:] == history[30:35]
+        assert second.prefix_tokens > first.prefix_tokens
+
+    def test_current_message_stays_in_tail(self):
+        history = corpora.make_history(10)
+        result = _stable(history, _Summarizer(), BlockSummaryCache())
+        assert result.frozen_count == 0 and result.messages == history
+
+
+@pytest.fixture
+def mock_url():
+    app = create_app(MockSettings(ttft_ms=0, tokens_per_sec=100000, completion_tokens=30))
+    with serve_in_background(app) as base_url:
+        yield base_url
+
+
+@pytest.fixture
+def client(tmp_path):
+    conversation_store._cache.clear()
+    conversation_store.open(tmp_path / "conversations.db")
+    block_summaries.clear()
+    app = FastAPI()
+    app.include_router(compression.router)
+    yield TestClient(app)
+    conversation_store.close()
+    conversation_store._cache.clear()
+    block_summaries.clear()
+
+
+def _dialog_cache_hits(client, layout, conversation_id):
+    """Сумма prompt_cache_hit/miss_tokens ответов за диалог из 20 ходов"""
+    hits = misses = 0
+    questions = [m for m in corpora.make_history(40) if m["role"] == "user"]
+    for i, question in enumerate(questions):
+        body = {"conversation_id": conversation_id, "message": question, "layout": layout}
+        if i == 0:
+            body["messages"] = []
+        data = client.post("/api/compression/chat", json=body).json()
+        assert data["layout"] == layout
+        hits += data["usage"]["prompt_cache_hit_tokens"]
+        misses += data["usage"]["prompt_cache_miss_tokens"]
+    return hits, misses
+
+
+def test_stable_layout_reuses_provider_prefix_cache(client, mock_url):
+    with patch("backend.services.deepseek_api.DEEPSEEK_API_URL", f"{mock_url}/v1/chat/completions"), \
+            patch.object(compression, "save_summary"):
+        rolling_hits, rolling_misses = _dialog_cache_hits(client, "rolling", "rolling")
+        stable_hits, stable_misses = _dialog_cache_hits(client, "stable", "stable")
+
+    # При сжатии rolling теряет кэш всего префикса, stable — только хвоста
+    assert stable_hits / (stable_hits + stable_misses) > rolling_hits / (rolling_hits + rolling_misses)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,127 @@
+"""Тесты для автопродолжения ответов, обрезанных по max_tokens"""
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.services.continuation import (
+    CONTINUATION_PROMPT,
+    complete_with_continuation,
+    merge_usage,
+    stream_with_continuation,
+)
+
+
+class _ScriptedProvider:
+    """Провайдер, отвечающий сегментами (текст, finish_reason) по очереди."""
+    config = SimpleNamespace(default_max_tokens=300)
+
+    def __init__(self, segments, tokens_per_segment=300):
+        self.segments = list(segments)
+        self.tokens_per_segment = tokens_per_segment
+        self.calls = []
+
+    def _next(self, messages, max_tokens):
+        self.calls.append((messages, max_tokens))
+        text, finish_reason = self.segments.pop(0)
+        usage = {"prompt_tokens": 10 * len(messages), "completion_tokens": self.tokens_per_segment,
+                 "total_tokens": 10 * len(messages) + self.tokens_per_segment,
+                 "prompt_tokens_details": {"cached_tokens": 10}}
+        return text, finish_reason, usage
+
+    async def complete(self, messages, temperature=None, max_tokens=None):
+        text, finish_reason, usage = self._next(messages, max_tokens)
+        return {"content": text, "finish_reason": finish_reason, "usage": usage, "raw": {}}
+
+    async def stream(self, messages, temperature=None, max_tokens=None, info=None):
+        text, finish_reason, usage = self._next(messages, max_tokens)
+        for word in text.split(" "):
+            yield json.dumps({"content": word + " "})
+        if info is not None:
+            info.update(finish_reason=finish_reason, usage=usage)
+
+
+_MESSAGES = [{"role": "user", "content": "расскажи длинно"}]
+
+
+def test_merge_usage_sums_numbers_and_nested_fields():
+    total = {}
+    merge_usage(total, {"prompt_tokens": 3, "completion_tokens": 2, "model": "x",
+                        "completion_tokens_details": {"reasoning_tokens": 1}})
+    merge_usage(total, {"prompt_tokens": 4, "completion_tokens_details": {"reasoning_tokens": 2}})
+    merge_usage(total, None)
+    assert total == {"prompt_tokens": 7, "completion_tokens": 2,
+                     "completion_tokens_details": {"reasoning_tokens": 3}}
+
+
+class TestCompleteWithContinuation:
+    """Тесты для обычного вызова"""
+
+    @pytest.mark.asyncio
+    async def test_segments_are_joined_and_usage_summed(self):
+        provider = _ScriptedProvider([("раз ", "length"), ("два ", "length"), ("три", "stop")])
+        result = await complete_with_continuation(provider, _MESSAGES, budget=2000)
+
+        assert result["content"] == "раз два три"
+        assert result["finish_reason"] == "stop"
+        assert result["segments"] == 3
+        assert result["usage"]["completion_tokens"] == 900
+        assert result["usage"]["prompt_tokens"] == 10 + 30 + 30
+        # Каждое продолжение получает исходную историю и весь ответ до обрыва
+        assert provider.calls[2][0] == _MESSAGES + [
+            {"role": "assistant", "content": "раз два "},
+            {"role": "user", "content": CONTINUATION_PROMPT},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_budget_limits_continuations(self):
+        provider = _ScriptedProvider([("a", "length")] * 5)
+        result = await complete_with_continuation(provider, _MESSAGES, max_tokens=300, budget=750)
+
+        # 300 + 300, на третий сегмент осталось 150 токенов, на четвёртый — 0
+        assert [max_tokens for _, max_tokens in provider.calls] == [300, 300, 150]
+        assert result["segments"] == 3
+        assert result["finish_reason"] == "length"
+
+    @pytest.mark.asyncio
+    async def test_complete_answer_is_not_continued(self):
+        provider = _ScriptedProvider([("готово", "stop")])
+        result = await complete_with_continuation(provider, _MESSAGES)
+        assert (result["content"], result["segments"], len(provider.calls)) == ("готово", 1, 1)
+
+
+class TestStreamWithContinuation:
+    """Тесты для streaming"""
+
+    @pytest.mark.asyncio
+    async def test_segments_go_to_one_stream(self):
+        provider = _ScriptedProvider([("раз два", "length"), ("три", "stop")])
+        chunks = [json.loads(c) async for c in stream_with_continuation(provider, _MESSAGES)]
+
+        text = "".join(c["content"] for c in chunks if "content" in c)
+        assert text == "раз два три "
+        # prompt_tokens — оплаченный промпт обоих запросов (10 + 30), а не размер исходного
+        assert chunks[-1] == {
+            "finish_reason": "stop",
+            "segments": 2,
+            "usage": {"prompt_tokens": 40, "completion_tokens": 600, "total_tokens": 640,
+                      "prompt_tokens_details": {"cached_tokens": 20}},
+        }
+        assert provider.calls[1][0][-2] == {"role": "assistant", "content": "раз два "}
+
+    @pytest.mark.asyncio
+    async def test_max_segments(self):
+        provider = _ScriptedProvider([("a", "length")] * 10, tokens_per_segment=1)
+        chunks = [json.loads(c) async for c in stream_with_continuation(provider, _MESSAGES)]
+        assert chunks[-1]["segments"] == 4
+        assert chunks[-1]["finish_reason"] == "length"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,241 @@
+"""Тесты для диалогов, хранящихся на сервере (conversation_id)"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks import corpora
+from backend.routers import chat, compression, conversations
+from backend.services.conversations import ConversationStore, conversation_store
+from backend.services.history import estimate_message_tokens
+
+
+class _FakeProvider:
+    config = SimpleNamespace(default_temperature=0.7, default_max_tokens=1000)
+
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    async def complete(self, messages, temperature=None, max_tokens=None):
+        self.calls.append(list(messages))
+        if self.fail:
+            raise RuntimeError("upstream unavailable")
+        usage = {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        return {"content": f"ответ {len(self.calls)}", "finish_reason": "stop", "usage": usage, "raw": {}}
+
+    async def stream(self, messages, temperature=None, max_tokens=None, info=None):
+        self.calls.append(list(messages))
+        if self.fail:
+            yield json.dumps({"error": "upstream unavailable"})
+            return
+        for part in ("по", "ток"):
+            yield json.dumps({"content": part})
+
+
+@pytest.fixture
+def store(tmp_path):
+    conversation_store._cache.clear()
+    conversation_store.open(tmp_path / "conversations.db")
+    yield conversation_store
+    conversation_store.close()
+    conversation_store._cache.clear()
+
+
+@pytest.fixture
+def provider():
+    provider = _FakeProvider()
+    with patch.object(chat, "get_provider", return_value=provider), \
+            patch.object(compression, "get_provider", return_value=provider), \
+            patch.object(compression, "save_summary"):
+        yield provider
+
+
+@pytest.fixture
+def client(store):
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.include_router(compression.router)
+    app.include_router(conversations.router)
+    return TestClient(app)
+
+
+class TestConversationStore:
+    """Тесты для хранилища диалогов"""
+
+    def test_persists_across_instances(self, tmp_path):
+        path = tmp_path / "conversations.db"
+        messages = corpora.make_history(5)
+
+        async def write():
+            store = ConversationStore()
+            assert store.open(path)
+            conversation = await store.create(messages[:3])
+            await store.append(conversation, messages[3:])
+            await store.set_summary(conversation, "итог", 4)
+            store.close()
+            return conversation
+
+        async def read(conversation_id):
+            store = ConversationStore()
+            store.open(path)
+            conversation = await store.get(conversation_id)
+            store.close()
+            return conversation
+
+        written = asyncio.run(write())
+        loaded = asyncio.run(read(written.id))
+        assert loaded.messages == messages
+        assert (loaded.summary, loaded.summarized_count) == ("итог", 4)
+        assert loaded.tokens == sum(map(estimate_message_tokens, messages))
+
+    def test_memory_only_keeps_recent(self):
+        async def run():
+            store = ConversationStore(cache_size=2)
+            ids = [(await store.create()).id for _ in range(3)]
+            return [await store.get(conversation_id) is not None for conversation_id in ids]
+
+        assert asyncio.run(run()) == [False, True, True]
+
+
+class TestConversationEndpoints:
+    """Тесты для /api/conversations"""
+
+    def test_create_get_delete(self, client):
+        messages = corpora.make_history(2)
+        created = client.post("/api/conversations", json={"messages": messages}).json()
+        assert created["message_count"] == 2
+
+        url = f"/api/conversations/{created['conversation_id']}"
+        assert client.get(url).json()["messages"] == messages
+        assert client.delete(url).status_code == 200
+        assert client.get(url).status_code == 404
+
+
+class TestChatWithConversation:
+    """Тесты для /api/chat с conversation_id"""
+
+    def test_history_is_kept_on_server(self, client, provider):
+        seed = corpora.make_history(2)
+        first = client.post("/api/chat", json={"conversation_id": "c1", "messages": seed, "prompt": "раз"})
+        assert first.json()["conversation_id"] == "c1"
+        client.post("/api/chat", json={"conversation_id": "c1", "prompt": "два", "system_prompt": "кратко"})
+
+        assert provider.calls[1] == [
+            {"role": "system", "content": "кратко"},
+            *seed,
+            {"role": "user", "content": "раз"},
+            {"role": "assistant", "content": "ответ 1"},
+            {"role": "user", "content": "два"},
+        ]
+        stored = client.get("/api/conversations/c1").json()["messages"]
+        assert stored[-1] == {"role": "assistant", "content": "ответ 2"}
+
+    def test_stream_records_reply(self, client, provider):
+        conversation_id = client.post("/api/conversations", json={}).json()["conversation_id"]
+        with client.stream("POST", "/api/chat/stream", json={"conversation_id": conversation_id, "prompt": "привет"}) as r:
+            r.read()
+        stored = client.get(f"/api/conversations/{conversation_id}").json()["messages"]
+        assert stored == [{"role": "user", "content": "привет"}, {"role": "assistant", "content": "поток"}]
+
+    @pytest.mark.parametrize("body, status", [
+        ({"conversation_id": "missing", "prompt": "привет"}, 404),
+        ({"conversation_id": "c2"}, 400),
+        ({"conversation_id": "c2", "messages": [], "prompt": "ещё"}, 409),
+        ({"conversation_id": "../etc", "prompt": "привет"}, 422),
+    ])
+    def test_errors(self, client, provider, body, status):
+        client.post("/api/chat", json={"conversation_id": "c2", "messages": [], "prompt": "привет"})
+        assert client.post("/api/chat", json=body).status_code == status
+
+
+class TestFailedTurn:
+    """Тесты отмены хода, на который не получен ответ"""
+
+    @pytest.mark.parametrize("path, body", [
+        ("/api/chat", {"prompt": "два"}),
+        ("/api/chat/stream", {"prompt": "два"}),
+        ("/api/compression/chat", {"message": {"role": "user", "content": "два"}}),
+        ("/api/compression/chat/stream", {"message": {"role": "user", "content": "два"}}),
+    ])
+    def test_history_is_unchanged_after_failure(self, store, client, provider, path, body):
+        client.post("/api/chat", json={"conversation_id": "c4", "messages": [], "prompt": "раз"})
+        before = client.get("/api/conversations/c4").json()
+
+        provider.fail = True
+        with client.stream("POST", path, json={"conversation_id": "c4", **body}) as r:
+            r.read()
+        # Проверяется и БД, а не только кэш в памяти
+        store._cache.clear()
+        after = client.get("/api/conversations/c4").json()
+        assert after["messages"] == before["messages"]
+        assert after["tokens"] == before["tokens"]
+
+        # Повтор хода не дублирует сообщение пользователя
+        provider.fail = False
+        client.post("/api/chat", json={"conversation_id": "c4", "prompt": "два"})
+        roles = [m["role"] for m in client.get("/api/conversations/c4").json()["messages"]]
+        assert roles == ["user", "assistant", "user", "assistant"]
+
+    def test_failed_seed_can_be_retried(self, client, provider):
+        provider.fail = True
+        body = {"conversation_id": "c5", "messages": corpora.make_history(2), "prompt": "раз"}
+        assert client.post("/api/chat", json=body).status_code == 500
+        assert client.get("/api/conversations/c5").status_code == 404
+
+        provider.fail = False
+        assert client.post("/api/chat", json=body).status_code == 200
+        assert len(client.get("/api/conversations/c5").json()["messages"]) == 4
+
+
+class TestCompressionWithConversation:
+    """Тесты для накопительной суммаризации диалога"""
+
+    def _summary_calls(self, provider):
+        return [call for call in provider.calls if call[0]["content"].startswith("Ты помощник")]
+
+    def test_rolling_summary(self, client, provider):
+        history = corpora.make_history(20)
+        body = {"conversation_id": "c3", "messages": history[:9], "message": history[9]}
+        data = client.post("/api/compression/chat", json=body).json()
+        assert data["compression_applied"] and data["conversation_id"] == "c3"
+        assert len(self._summary_calls(provider)) == 1
+
+        # Пока суммаризируемая часть не выросла, суммаризация берётся из хранилища
+        reused = client.post("/api/compression/chat", json={"conversation_id": "c3", "message": history[10]}).json()
+        assert reused["summary"] == data["summary"]
+        assert len(self._summary_calls(provider)) == 1
+
+        for message in history[11:14]:
+            client.post("/api/compression/chat", json={"conversation_id": "c3", "message": message})
+        assert len(self._summary_calls(provider)) == 1
+
+        # 20-е сообщение диалога (с ответами ассистента): модель получает прошлую
+        # суммаризацию и только сообщения после неё
+        client.post("/api/compression/chat", json={"conversation_id": "c3", "message": history[14]})
+        summary_calls = self._summary_calls(provider)
+        assert len(summary_calls) == 2
+        prompt = summary_calls[1][1]["content"]
+        assert f"(10 сообщений):\n{data['summary']}" in prompt
+        assert sum(prompt.count(f"{label}: ") for label in ("Пользователь", "Ассистент", "Система")) == 11
+
+        stored = client.get("/api/conversations/c3").json()
+        assert stored["summarized_count"] == 20
+        assert stored["tokens"] == sum(map(estimate_message_tokens, stored["messages"]))
+
+    def test_messages_or_conversation_required(self, client, provider):
+        assert client.post("/api/compression/chat", json={}).status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
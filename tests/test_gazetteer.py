@@ -0,0 +1,135 @@
+"""Тесты для справочника городов и уточнения места в намерении о погоде"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.routers.weather_chat import _extract_weather_intent
+from backend.services.gazetteer import get_gazetteer, inflect, normalize
+from backend.services.weather_intent import EXCLUDE_WORDS, WEATHER_KEYWORDS
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    return get_gazetteer()
+
+
+class TestInflection:
+    """Тесты для построения падежных форм"""
+
+    @pytest.mark.parametrize("name, form", [
+        ("Москва", "Москве"),
+        ("Прага", "Праги"),
+        ("Казань", "Казанью"),
+        ("Ярославль", "Ярославле"),
+        ("Шанхай", "Шанхае"),
+        ("Париж", "Парижем"),
+        ("Санкт-Петербург", "Санкт-Петербурге"),
+        ("Ростов-на-Дону", "Ростове-на-Дону"),
+        ("Нижний Новгород", "Нижнем Новгороде"),
+        ("Великий Новгород", "Великим Новгородом"),
+        ("Грозный", "Грозном"),
+        ("Анталия", "Анталии"),
+    ])
+    def test_form_is_generated(self, name, form):
+        assert form in inflect(name)
+
+    def test_indeclinable(self):
+        assert inflect("Сочи") == {"Сочи"}
+
+
+class TestGazetteer:
+    """Тесты для поиска города"""
+
+    @pytest.mark.parametrize("text, canonical", [
+        ("Москве", "Москва"),
+        ("москвы", "Москва"),
+        ("Moscow", "Москва"),
+        ("Питере", "Санкт-Петербург"),
+        ("СПб", "Санкт-Петербург"),
+        ("St. Petersburg", "Санкт-Петербург"),
+        ("Нью Йорке", "Нью-Йорк"),
+        ("Rostov-on-Don", "Ростов-на-Дону"),
+        ("Кишиневе", "Кишинёв"),
+    ])
+    def test_exact_forms(self, gazetteer, text, canonical):
+        match = gazetteer.resolve(text)
+        assert match.exact
+        assert match.city.name == canonical
+
+    @pytest.mark.parametrize("text, canonical", [
+        ("Масква", "Москва"),
+        ("Londn", "Лондон"),
+        ("Екатеренбург", "Екатеринбург"),
+        ("Санкт-Питербург", "Санкт-Петербург"),
+        ("Нижнем Новгрде", "Нижний Новгород"),
+        ("Новосиб", "Новосибирск"),
+    ])
+    def test_typos_and_prefixes(self, gazetteer, text, canonical):
+        match = gazetteer.resolve(text)
+        assert not match.exact
+        assert match.city.name == canonical
+
+    @pytest.mark.parametrize("word", ["городе", "гроза", "being", "читаем", "Нижний", "которому", "сегодня", "City_name"])
+    def test_common_words_are_not_cities(self, gazetteer, word):
+        assert gazetteer.resolve(word) is None
+
+    def test_no_form_collides_with_weather_vocabulary(self, gazetteer):
+        vocabulary = {normalize(word) for word in WEATHER_KEYWORDS + EXCLUDE_WORDS}
+        assert not vocabulary & set(gazetteer._exact)
+
+    def test_find_returns_surface_text(self, gazetteer):
+        match = gazetteer.find("будет ли дождь в Нижнем Новгороде завтра?")
+        assert match.city.name == "Нижний Новгород"
+        assert match.text == "Нижнем Новгороде"
+
+    def test_find_fuzzy_respects_ignore(self, gazetteer):
+        assert gazetteer.find("Права", fuzzy=True).city.name == "Прага"
+        assert gazetteer.find("Права", fuzzy=True, ignore={"права"}) is None
+
+    def test_complete(self, gazetteer):
+        assert [city.name for city in gazetteer.complete("санкт")] == ["Санкт-Петербург"]
+        assert {city.name for city in gazetteer.complete("нов")} >= {"Новосибирск", "Новокузнецк", "Новороссийск"}
+
+
+class TestResolveLocation:
+    """Тесты для уточнения места в намерении"""
+
+    def test_known_city_keeps_location(self):
+        result = _extract_weather_intent("погода в Москве")
+        assert result["location"] == "Москве"
+        assert result["canonical_location"] == "Москва"
+
+    def test_same_city_in_any_language_has_same_key(self):
+        keys = {_extract_weather_intent(p)["canonical_location"]
+                for p in ("погода в Москве", "Москва погода", "weather in Moscow", "прогноз в москве")}
+        assert keys == {"Москва"}
+
+    @pytest.mark.parametrize("prompt, location, canonical", [
+        ("будет ли дождь в Казани завтра?", "Казани", "Казань"),
+        ("is it going to rain in Berlin tomorrow?", "Berlin", "Берлин"),
+        ("what is the weather forecast for Paris for 3 days?", "Paris", "Париж"),
+        ("погода в Масква", "Москва", "Москва"),
+    ])
+    def test_wrong_guess_is_corrected(self, prompt, location, canonical):
+        result = _extract_weather_intent(prompt)
+        assert result["location"] == location
+        assert result["canonical_location"] == canonical
+
+    def test_unknown_place_is_kept(self):
+        result = _extract_weather_intent("погода в Урюпинске")
+        assert result["location"] == "Урюпинске"
+        assert result["canonical_location"] is None
+
+    def test_without_location(self):
+        result = _extract_weather_intent("какая погода?")
+        assert result["location"] is None
+        assert result["canonical_location"] is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,104 @@
+"""Тесты для построителя истории диалога (промпт суммаризации и оценка токенов)"""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks import corpora
+from backend.routers import compression
+from backend.services.history import HistoryBuilder
+
+
+def _legacy_summary_prompt(messages):
+    # Исходная реализация _create_summary_prompt (конкатенация в цикле)
+    history_text = ""
+    for msg in messages:
+        role = msg.get("role", "unknown")
+        content = msg.get("content", "")
+        if role == "user":
+            history_text += f"Пользователь: {content}\n\n"
+        elif role == "assistant":
+            history_text += f"Ассистент: {content}\n\n"
+        elif role == "system":
+            history_text += f"Система: {content}\n\n"
+    return (
+        "Создай краткую суммаризацию следующего диалога, сохраняя ключевую информацию, контекст и важные детали. \n"
+        "Суммаризация должна быть достаточно подробной, чтобы ассистент мог продолжить диалог естественным образом.\n\n"
+        f"Диалог:\n{history_text}\n\nСуммаризация:"
+    )
+
+
+def _legacy_tokens(messages):
+    return sum(max(1, len(m.get("role", "")) // 3) * bool(m.get("role"))
+               + max(1, len(m.get("content", "")) // 3) * bool(m.get("content")) + 4 for m in messages)
+
+
+_ODD_MESSAGES = [
+    {"role": "tool", "content": "не попадает в текст"},
+    {"content": "без роли"},
+    {"role": "user"},
+    {"role": "system", "content": ""},
+]
+
+
+class TestHistoryBuilder:
+    """Тесты для HistoryBuilder"""
+
+    @pytest.mark.parametrize("messages", [[], corpora.make_history(1), corpora.make_history(57), _ODD_MESSAGES])
+    def test_matches_legacy(self, messages):
+        history = HistoryBuilder(messages)
+        assert history.summary_prompt() == _legacy_summary_prompt(messages)
+        assert history.tokens == _legacy_tokens(messages)
+        assert len(history) == len(messages)
+
+    def test_incremental_appends_match_full_build(self):
+        messages = corpora.make_history(40)
+        history = HistoryBuilder()
+        for i, message in enumerate(messages):
+            history.append(message)
+            if i % 7 == 0:
+                # Промежуточные обращения к тексту не влияют на результат
+                assert history.summary_prompt() == _legacy_summary_prompt(messages[:i + 1])
+        assert history.text == HistoryBuilder(messages).text
+        assert history.tokens == _legacy_tokens(messages)
+
+
+class _FakeProvider:
+    config = SimpleNamespace(default_max_tokens=1000)
+
+    def __init__(self):
+        self.calls = []
+
+    async def complete(self, messages, temperature=None, max_tokens=None):
+        self.calls.append(messages)
+        usage = {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        return {"content": "итог", "finish_reason": "stop", "usage": usage, "raw": {}}
+
+
+def test_compression_chat_uses_single_pass_estimates():
+    app = FastAPI()
+    app.include_router(compression.router)
+    provider = _FakeProvider()
+    messages = corpora.make_history(23)
+    with patch.object(compression, "get_provider", return_value=provider), \
+            patch.object(compression, "save_summary"):
+        response = TestClient(app).post("/api/compression/chat", json={"messages": messages})
+    data = response.json()
+    summary_prompt = provider.calls[0][1]["content"]
+    compressed = provider.calls[1]
+    assert summary_prompt == _legacy_summary_prompt(messages[:20])
+    assert data["tokens_before_compression"] == _legacy_tokens(messages)
+    assert data["tokens_after_compression"] == _legacy_tokens(compressed)
+    assert data["compressed_message_count"] == 4
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
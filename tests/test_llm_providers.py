@@ -0,0 +1,81 @@
+"""Тесты для абстракции LLM-провайдеров и общей подготовки сообщений"""
+import pytest
+import sys
+from unittest.mock import patch
+from pathlib import Path
+
+from fastapi import HTTPException
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.routers.common import CompletionRequest, prepare_messages
+from backend.services.llm_providers import get_provider, list_providers
+
+
+class TestPrepareMessages:
+    """Тесты для prepare_messages"""
+
+    def test_prompt_with_system_prompt(self):
+        request = CompletionRequest(prompt="Привет", system_prompt="Ты помощник")
+        assert prepare_messages(request) == [
+            {"role": "system", "content": "Ты помощник"},
+            {"role": "user", "content": "Привет"},
+        ]
+
+    def test_takes_last_user_message(self):
+        request = CompletionRequest(messages=[
+            {"role": "user", "content": "первый"},
+            {"role": "assistant", "content": "ответ"},
+            {"role": "user", "content": "второй"},
+            {"role": "assistant", "content": "ещё ответ"},
+        ])
+        assert prepare_messages(request) == [{"role": "user", "content": "второй"}]
+
+    def test_missing_prompt_and_messages(self):
+        with pytest.raises(HTTPException) as exc_info:
+            prepare_messages(CompletionRequest())
+        assert exc_info.value.status_code == 400
+
+
+class TestProviders:
+    """Тесты для реестра и адаптеров провайдеров"""
+
+    def test_registry_contains_default_providers(self):
+        assert "deepseek" in list_providers()
+        assert "llama" in list_providers()
+        with pytest.raises(KeyError):
+            get_provider("unknown")
+
+    @pytest.mark.asyncio
+    async def test_deepseek_complete_normalizes_response(self):
+        raw = {
+            "choices": [{"message": {"content": "ответ"}, "finish_reason": "length"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        }
+        with patch("backend.services.llm_providers.call_deepseek_api", return_value=raw) as mock_call:
+            result = await get_provider("deepseek").complete([{"role": "user", "content": "вопрос"}])
+
+        assert mock_call.call_args.kwargs["temperature"] == 0.3
+        assert result["content"] == "ответ"
+        assert result["finish_reason"] == "length"
+        assert result["usage"]["total_tokens"] == 15
+
+    @pytest.mark.asyncio
+    async def test_llama_complete_strips_echoed_prompt(self):
+        messages = [{"role": "user", "content": "вопрос"}]
+        raw = [{"generated_text": "user: вопрос ответ"}]
+        with patch("backend.services.llm_providers.call_llama_api", return_value=raw):
+            result = await get_provider("llama").complete(messages)
+
+        assert result["content"] == "ответ"
+
+    def test_count_tokens(self):
+        provider = get_provider("deepseek")
+        assert provider.count_tokens([]) == 0
+        assert provider.count_tokens([{"role": "user", "content": "a" * 30}]) == 1 + 10 + 4
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,56 @@
+"""Тесты для детектора блокировок event loop"""
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.services.loop_monitor import LOOP_BLOCKED, LoopMonitor
+
+
+def _blocking_call():
+    time.sleep(0.3)
+
+
+class TestLoopMonitor:
+    """Тесты для LoopMonitor"""
+
+    @pytest.mark.asyncio
+    async def test_blocking_call_is_reported_with_stack(self, caplog):
+        monitor = LoopMonitor(interval=0.02, threshold=0.1)
+        blocked_before = LOOP_BLOCKED.value()
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            with caplog.at_level(logging.WARNING, logger="backend.services.loop_monitor"):
+                _blocking_call()
+                await asyncio.sleep(0.05)
+        finally:
+            await monitor.stop()
+
+        assert monitor.blocked_count == 1
+        assert LOOP_BLOCKED.value() == blocked_before + 1
+        assert "_blocking_call" in caplog.text
+        assert max(monitor.lags) >= 0.2
+
+    @pytest.mark.asyncio
+    async def test_idle_loop_is_not_reported(self):
+        monitor = LoopMonitor(interval=0.01, threshold=0.2)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            await monitor.stop()
+
+        assert monitor.blocked_count == 0
+        assert len(monitor.lags) > 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,101 @@
+"""Тесты для параллельного вызова нескольких MCP инструментов"""
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.mock_llm_server import serve_in_background
+from benchmarks.mock_mcp_server import MockMCPSettings, create_app
+from backend.routers import mcp as mcp_router
+from backend.services import mcp_client
+from backend.services.mcp_servers import MCPServerConfig, MCPServerRegistry
+
+CITIES = ["Москва", "Казань", "Омск", "Тула", "Сочи"]
+
+
+@pytest.fixture(scope="module")
+def mock_mcp():
+    app = create_app(MockMCPSettings(tool_latency_ms=0))
+    with serve_in_background(app) as base_url:
+        yield base_url, app.state.mock
+
+
+def _weather_calls(server_name: str):
+    return [
+        {"server_name": server_name, "tool_name": "get_current_weather", "arguments": {"location": city}}
+        for city in CITIES
+    ]
+
+
+async def _collect(registry, invocations):
+    with patch.object(mcp_client, "mcp_servers", registry):
+        try:
+            return [outcome async for outcome in mcp_client.call_mcp_tools(invocations)]
+        finally:
+            await mcp_client.close_mcp_servers()
+
+
+class TestCallMCPTools:
+    """Тесты для call_mcp_tools"""
+
+    @pytest.mark.asyncio
+    async def test_batch_is_sent_in_one_post(self, mock_mcp):
+        base_url, state = mock_mcp
+        registry = MCPServerRegistry({
+            "weather": MCPServerConfig("weather", transport="sse", url=base_url, pool_size=1, supports_batch=True),
+        })
+        await registry.pool(registry.get("weather")).start()
+        posts_before = state.posts
+
+        outcomes = await _collect(registry, _weather_calls("weather"))
+
+        assert state.posts - posts_before == 1
+        assert sorted(o["index"] for o in outcomes) == list(range(len(CITIES)))
+        for outcome in outcomes:
+            assert CITIES[outcome["index"]] in outcome["result"]["content"][0]["text"]
+
+    @pytest.mark.asyncio
+    async def test_errors_are_reported_per_call(self, mock_mcp):
+        base_url, _ = mock_mcp
+        registry = MCPServerRegistry({
+            "weather": MCPServerConfig("weather", transport="sse", url=base_url, pool_size=2),
+            "offline": MCPServerConfig("offline", transport="http", url="http://127.0.0.1:9"),
+        })
+        invocations = _weather_calls("weather") + [{"server_name": "offline", "tool_name": "x", "arguments": {}}]
+
+        outcomes = {o["index"]: o for o in await _collect(registry, invocations)}
+
+        assert len(outcomes) == len(invocations)
+        assert "error" in outcomes[len(CITIES)]
+        assert all("result" in outcomes[i] for i in range(len(CITIES)))
+
+    def test_router_streams_ndjson(self):
+        async def fake_call_mcp_tools(invocations, locale="ru-RU"):
+            for index in reversed(range(len(invocations))):
+                yield {"index": index, "result": {"content": [], "isError": False}}
+
+        app = FastAPI()
+        app.include_router(mcp_router.router)
+        client = TestClient(app)
+        with patch.object(mcp_router, "call_mcp_tools", fake_call_mcp_tools):
+            response = client.post("/api/mcp/call-tools", json={"calls": _weather_calls("mcp-weather")[:2]})
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["index"] for line in lines] == [1, 0]
+
+    def test_router_rejects_empty_calls(self):
+        app = FastAPI()
+        app.include_router(mcp_router.router)
+        assert TestClient(app).post("/api/mcp/call-tools", json={"calls": []}).status_code == 422
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,96 @@
+"""Тесты для кэша команд запуска stdio MCP-серверов"""
+import os
+import sys
+from unittest.mock import patch
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.routers import mcp as mcp_router
+from backend.services import mcp_resolver
+from backend.services.mcp_resolver import LaunchSpecRegistry, compute_launch_spec
+
+
+@pytest.fixture
+def server_bin(tmp_path, monkeypatch):
+    """Исполняемый файл mcp-server-demo в отдельном каталоге PATH."""
+    binary = tmp_path / "mcp-server-demo"
+    binary.write_text("#!/bin/sh\n")
+    binary.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ.get('PATH', '')}")
+    return binary
+
+
+class TestComputeLaunchSpec:
+    """Тесты для compute_launch_spec"""
+
+    def test_binary_in_path(self, server_bin):
+        spec = compute_launch_spec("mcp-server-demo")
+        assert spec.command == str(server_bin)
+        assert spec.args == ()
+        assert spec.source == "path"
+        assert spec.env["PATH"]
+
+    def test_npx_fallback(self, tmp_path):
+        with patch.object(mcp_resolver, "_resolve_mcp_server_command", return_value=None), \
+                patch.object(mcp_resolver, "_find_npx", return_value="/usr/bin/npx"), \
+                patch.object(mcp_resolver, "_npm_cache_dir", return_value=str(tmp_path)):
+            spec = compute_launch_spec("mcp-server-google-search")
+        assert spec.argv() == ["/usr/bin/npx", "-y", "@mcp-server/google-search-mcp"]
+        assert spec.env["NPM_CONFIG_CACHE"] == str(tmp_path)
+        assert spec.via_npx
+
+
+class TestLaunchSpecRegistry:
+    """Тесты для кэширования и инвалидации"""
+
+    @pytest.mark.asyncio
+    async def test_spec_is_computed_once(self, server_bin):
+        registry = LaunchSpecRegistry(ttl=60)
+        with patch.object(mcp_resolver, "compute_launch_spec", wraps=compute_launch_spec) as compute:
+            first = await registry.resolve("mcp-server-demo")
+            second = await registry.resolve("mcp-server-demo")
+        assert first is second
+        assert compute.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_mtime_change_invalidates(self, server_bin):
+        registry = LaunchSpecRegistry(ttl=60)
+        with patch.object(mcp_resolver, "MTIME_CHECK_INTERVAL", 0), \
+                patch.object(mcp_resolver, "compute_launch_spec", wraps=compute_launch_spec) as compute:
+            await registry.resolve("mcp-server-demo")
+            stat = server_bin.stat()
+            os.utime(server_bin, (stat.st_atime, stat.st_mtime + 10))
+            await registry.resolve("mcp-server-demo")
+        assert compute.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_not_found_is_cached_and_raised(self):
+        registry = LaunchSpecRegistry(ttl=60)
+        with patch.object(mcp_resolver, "compute_launch_spec", side_effect=FileNotFoundError("nope")) as compute:
+            for _ in range(2):
+                with pytest.raises(FileNotFoundError):
+                    await registry.resolve("missing-server")
+        assert compute.call_count == 1
+
+    def test_router_exposes_and_invalidates_cache(self, server_bin):
+        registry = LaunchSpecRegistry(ttl=60)
+        registry.get("mcp-server-demo")
+        app = FastAPI()
+        app.include_router(mcp_router.router)
+        client = TestClient(app)
+        with patch.object(mcp_router, "launch_specs", registry):
+            state = client.get("/api/mcp/resolver").json()
+            assert state["entries"][0]["spec"]["command"] == str(server_bin)
+            assert client.delete("/api/mcp/resolver").json() == {"invalidated": 1}
+            assert client.get("/api/mcp/resolver").json()["entries"] == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
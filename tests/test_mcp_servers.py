@@ -0,0 +1,158 @@
+"""Тесты для реестра MCP-серверов и пула stdio-подключений"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.services import mcp_client
+from backend.services.mcp_resolver import LaunchSpec
+from backend.services.mcp_servers import MCPServerConfig, MCPServerRegistry, load_server_configs
+from backend.services.mcp_stdio import StdioPool
+
+# Минимальный stdio MCP-сервер: initialize, tools/list (отдаёт свой PID) и exit
+ECHO_SERVER = '''
+import json, os, sys
+for line in sys.stdin:
+    msg = json.loads(line)
+    if "id" not in msg:
+        continue
+    if msg["method"] == "exit":
+        sys.exit(0)
+    result = {"tools": [{"name": "echo"}], "pid": os.getpid()} if msg["method"] == "tools/list" else {}
+    print(json.dumps({"jsonrpc": "2.0", "id": msg["id"], "result": result}), flush=True)
+'''
+
+
+@pytest.fixture
+def echo_spec(tmp_path):
+    script = tmp_path / "echo_server.py"
+    script.write_text(ECHO_SERVER)
+    return LaunchSpec("echo", sys.executable, (str(script),), {}, None, "config")
+
+
+class TestServerConfig:
+    """Тесты для разбора конфигурации"""
+
+    def test_load_from_file(self, tmp_path):
+        path = tmp_path / "servers.json"
+        path.write_text(json.dumps({"servers": {
+            "search": {"command": "npx", "args": ["-y", "pkg"], "env": {"API_KEY": "secret"}, "pool_size": 2},
+        }}))
+        configs = load_server_configs(str(path))
+        search = configs["search"]
+        assert search.transport == "stdio"
+        assert search.pool_size == 2
+        assert search.to_dict()["env"] == ["API_KEY"]
+
+    @pytest.mark.parametrize("text", [
+        "{not json",
+        '{"servers": {"bad": {"transport": "websocket"}}}',
+        '{"servers": {"bad": {"pool_size": "two"}}}',
+        '["servers"]',
+    ])
+    def test_broken_file_falls_back_to_defaults(self, tmp_path, text):
+        path = tmp_path / "servers.json"
+        path.write_text(text)
+        assert load_server_configs(str(path)) == load_server_configs(None)
+
+    @pytest.mark.parametrize("data", [
+        {"transport": "websocket"},
+        {"transport": "sse"},
+        {"pool_size": 0},
+    ])
+    def test_invalid_config(self, data):
+        with pytest.raises(ValueError):
+            MCPServerConfig.from_dict("bad", data)
+
+
+class TestStdioPool:
+    """Тесты для пула stdio-подключений"""
+
+    @pytest.mark.asyncio
+    async def test_process_is_reused_between_calls(self, echo_spec):
+        async def factory():
+            return echo_spec
+
+        pool = StdioPool("echo", factory, size=1)
+        try:
+            first = await pool.request("tools/list")
+            second = await pool.request("tools/list")
+        finally:
+            await pool.close()
+        assert first["tools"] == [{"name": "echo"}]
+        assert first["pid"] == second["pid"]
+
+    @pytest.mark.asyncio
+    async def test_dead_process_is_restarted(self, echo_spec):
+        async def factory():
+            return echo_spec
+
+        pool = StdioPool("echo", factory, size=1)
+        try:
+            first = await pool.request("tools/list")
+            with pytest.raises(Exception):
+                await pool._connections[0].request("exit", timeout=2)
+            second = await pool.request("tools/list")
+        finally:
+            await pool.close()
+        assert first["pid"] != second["pid"]
+
+    @pytest.mark.asyncio
+    async def test_live_connection_serves_while_restart_hangs(self, echo_spec):
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            if len(calls) > 1:
+                await asyncio.sleep(60)  # перезапуск зависает (как initialize с таймаутом)
+            return echo_spec
+
+        pool = StdioPool("echo", factory, size=2)
+        try:
+            await pool.start()
+            with pytest.raises(Exception):
+                await pool._connections[0].request("exit", timeout=2)
+            survivor = pool._connections[1]
+            result = await asyncio.wait_for(pool.request("tools/list"), timeout=5)
+            assert result["tools"] == [{"name": "echo"}]
+            assert survivor.alive and pool.alive_count == 1
+            # Недостающий процесс поднимается в фоне
+            assert pool._refill is not None and not pool._refill.done()
+        finally:
+            await pool.close()
+
+
+class TestRegistryRouting:
+    """Тесты для маршрутизации вызовов через реестр"""
+
+    @pytest.mark.asyncio
+    async def test_configured_stdio_server_uses_pool_and_prewarm(self, echo_spec):
+        config = MCPServerConfig("echo", command=echo_spec.command, args=list(echo_spec.args))
+        registry = MCPServerRegistry({"echo": config})
+        with patch.object(mcp_client, "mcp_servers", registry):
+            status = await mcp_client.prewarm_mcp_servers(timeout=10)
+            result = await mcp_client.list_mcp_tools("echo")
+            await mcp_client.close_mcp_servers()
+        assert status["echo"]["state"] == "ready"
+        assert status["echo"]["tools"] == 1
+        assert result["tools"] == [{"name": "echo"}]
+
+    @pytest.mark.asyncio
+    async def test_prewarm_failure_is_recorded(self):
+        config = MCPServerConfig("broken", command="/nonexistent/mcp-server")
+        registry = MCPServerRegistry({"broken": config})
+        with patch.object(mcp_client, "mcp_servers", registry):
+            status = await mcp_client.prewarm_mcp_servers(timeout=5)
+        assert status["broken"]["state"] == "failed"
+        assert "FileNotFoundError" in status["broken"]["error"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,126 @@
+"""Тесты для пула SSE-сессий к MCP-серверу (против mock MCP сервера)"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.mock_llm_server import serve_in_background
+from benchmarks.mock_mcp_server import MockMCPSettings, create_app
+from backend.services.mcp_sse import SSEPool
+
+
+@pytest.fixture(scope="module")
+def mock_mcp():
+    app = create_app(MockMCPSettings(tool_latency_ms=0))
+    with serve_in_background(app) as base_url:
+        yield base_url, app.state.mock
+
+
+@pytest.fixture(autouse=True)
+def reset_latency(mock_mcp):
+    mock_mcp[1].settings.tool_latency_ms = 0
+
+
+def _weather(location: str):
+    return {"name": "get_current_weather", "arguments": {"location": location}}
+
+
+async def _kill(session) -> None:
+    # Обрыв SSE-потока со стороны клиента: reader завершается, сессия считается потерянной
+    await session._client.aclose()
+    await asyncio.sleep(0.05)
+
+
+class TestSSEPool:
+    """Тесты для SSEPool"""
+
+    @pytest.mark.asyncio
+    async def test_requests_are_spread_over_sessions(self, mock_mcp):
+        base_url, _ = mock_mcp
+        pool = SSEPool(base_url, size=2)
+        try:
+            results = await asyncio.gather(*(pool.request("tools/call", _weather(f"City{i}")) for i in range(10)))
+            assert pool.alive_count == 2
+            assert len({s.session_id for s in pool._sessions}) == 2
+        finally:
+            await pool.close()
+        assert all("City" in r["content"][0]["text"] for r in results)
+
+    @pytest.mark.asyncio
+    async def test_pending_request_fails_over(self, mock_mcp):
+        base_url, state = mock_mcp
+        pool = SSEPool(base_url, size=2)
+        try:
+            await pool.start()
+            state.settings.tool_latency_ms = 300
+            call = asyncio.create_task(pool.request("tools/call", _weather("Казань")))
+            await asyncio.sleep(0.1)
+            busy = next(s for s in pool._sessions if s.in_flight)
+            await _kill(busy)
+            result = await asyncio.wait_for(call, timeout=5)
+        finally:
+            await pool.close()
+        assert "Казань" in result["content"][0]["text"]
+
+    @pytest.mark.asyncio
+    async def test_lost_sessions_are_reconnected(self, mock_mcp):
+        base_url, _ = mock_mcp
+        pool = SSEPool(base_url, size=2, heartbeat_interval=0.05)
+        try:
+            await pool.start()
+            for session in list(pool._sessions):
+                await _kill(session)
+            assert pool.alive_count == 0
+            result = await pool.request("tools/list")
+            await asyncio.sleep(0.3)
+            assert pool.alive_count == 2
+        finally:
+            await pool.close()
+        assert len(result["tools"]) == 2
+
+    @pytest.mark.asyncio
+    async def test_in_flight_cap(self, mock_mcp):
+        base_url, state = mock_mcp
+        pool = SSEPool(base_url, size=1, max_in_flight=1)
+        try:
+            await pool.start()
+            state.settings.tool_latency_ms = 100
+            started = time.perf_counter()
+            await asyncio.gather(*(pool.request("tools/call", _weather("Омск")) for _ in range(3)))
+            elapsed = time.perf_counter() - started
+        finally:
+            await pool.close()
+        assert elapsed >= 0.3
+
+    @pytest.mark.asyncio
+    async def test_posts_reuse_keep_alive_connection(self, mock_mcp):
+        base_url, _ = mock_mcp
+        pool = SSEPool(base_url, size=1)
+        try:
+            for _ in range(10):
+                await pool.request("tools/call", _weather("Тула"))
+            connections = pool._sessions[0]._client._transport._pool.connections
+        finally:
+            await pool.close()
+        # Поток /sse и одно keep-alive соединение для всех POST
+        assert len(connections) == 2
+
+    @pytest.mark.asyncio
+    async def test_server_error_is_raised(self, mock_mcp):
+        base_url, _ = mock_mcp
+        pool = SSEPool(base_url, size=1)
+        try:
+            with pytest.raises(RuntimeError, match="Method not found"):
+                await pool.request("resources/list")
+        finally:
+            await pool.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
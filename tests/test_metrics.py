@@ -0,0 +1,107 @@
+"""Тесты для сборщика метрик и endpoint-а /metrics"""
+import json
+import pytest
+import sys
+from unittest.mock import patch
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.routers import metrics as metrics_router
+from backend.services import metrics
+from backend.services.llm_providers import get_provider
+
+
+class TestCollectors:
+    """Тесты для счётчиков, гистограмм и текстового формата"""
+
+    def test_histogram_render_is_cumulative(self):
+        registry = metrics.Registry()
+        hist = registry.histogram("test_seconds", "Test latency", ("route",), buckets=(0.1, 1.0))
+        hist.observe(0.05, "/a")
+        hist.observe(0.5, "/a")
+        hist.observe(5.0, "/a")
+
+        text = registry.render()
+        assert '# TYPE test_seconds histogram' in text
+        assert 'test_seconds_bucket{route="/a",le="0.1"} 1' in text
+        assert 'test_seconds_bucket{route="/a",le="1.0"} 2' in text
+        assert 'test_seconds_bucket{route="/a",le="+Inf"} 3' in text
+        assert 'test_seconds_count{route="/a"} 3' in text
+
+    def test_label_count_is_checked(self):
+        counter = metrics.Counter("test_total", "Test", ("a", "b"))
+        with pytest.raises(ValueError):
+            counter.inc("only-one")
+
+    def test_cache_hit_ratio(self):
+        metrics.record_cache("test-cache", hit=True)
+        metrics.record_cache("test-cache", hit=True)
+        metrics.record_cache("test-cache", hit=False)
+        text = metrics.REGISTRY.render()
+        assert 'cache_requests_total{cache="test-cache",result="hit"} 2' in text
+        assert 'cache_hit_ratio{cache="test-cache"} 0.666' in text
+
+    def test_llm_usage_by_endpoint_and_template(self):
+        usage = {"prompt_tokens": 100, "prompt_cache_hit_tokens": 75, "prompt_cache_miss_tokens": 25,
+                 "completion_tokens": 10, "total_tokens": 110}
+        metrics.record_llm_usage("test-endpoint", "cursor", usage)
+        metrics.record_llm_usage("test-endpoint", None, {"prompt_tokens": 40, "completion_tokens": 2})
+        text = metrics.REGISTRY.render()
+        assert 'llm_tokens_total{endpoint="test-endpoint",template="cursor",kind="prompt_cache_hit"} 75' in text
+        assert 'llm_tokens_total{endpoint="test-endpoint",template="none",kind="prompt"} 40' in text
+        assert 'llm_prompt_cache_hit_ratio{endpoint="test-endpoint",template="cursor"} 0.75' in text
+        # Без полей кэша в usage доля не публикуется
+        assert 'llm_prompt_cache_hit_ratio{endpoint="test-endpoint",template="none"}' not in text
+
+
+class TestMiddleware:
+    """Тесты для MetricsMiddleware и GET /metrics"""
+
+    def test_route_template_and_status_are_recorded(self):
+        app = FastAPI()
+        app.add_middleware(metrics.MetricsMiddleware)
+        app.include_router(metrics_router.router)
+
+        @app.get("/api/items/{item_id}")
+        async def item(item_id: str):
+            return {"id": item_id}
+
+        client = TestClient(app)
+        assert client.get("/api/items/1").status_code == 200
+        assert client.get("/api/items/2").status_code == 200
+
+        response = client.get("/metrics")
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'http_requests_total{route="/api/items/{item_id}",method="GET",status="200"} 2' in response.text
+        assert metrics.HTTP_IN_FLIGHT.value("/api") == 0
+
+
+class TestProviderMetrics:
+    """Тесты для метрик upstream-вызовов в LLMProvider"""
+
+    @pytest.mark.asyncio
+    async def test_stream_records_ttft_and_errors(self):
+        async def fake_stream(*args, **kwargs):
+            yield json.dumps({"content": "a"})
+            yield json.dumps({"content": "b"})
+            yield json.dumps({"error": "boom"})
+
+        ttft_before = metrics.STREAM_TTFT.count("deepseek")
+        errors_before = metrics.UPSTREAM_ERRORS.value("deepseek", "stream")
+        with patch("backend.services.llm_providers.stream_deepseek_api", fake_stream):
+            chunks = [c async for c in get_provider("deepseek").stream([{"role": "user", "content": "x"}])]
+
+        assert len(chunks) == 3
+        assert metrics.STREAM_TTFT.count("deepseek") == ttft_before + 1
+        assert metrics.UPSTREAM_ERRORS.value("deepseek", "stream") == errors_before + 1
+        assert metrics.UPSTREAM_IN_FLIGHT.value("deepseek") == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
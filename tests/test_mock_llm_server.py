@@ -0,0 +1,124 @@
+"""Тесты mock LLM сервера и работы сервисов против него (без сети)"""
+import json
+import pytest
+import sys
+from unittest.mock import patch
+from pathlib import Path
+
+import httpx
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.mock_llm_server import MockSettings, create_app, serve_in_background
+from backend.services.deepseek_api import call_deepseek_api, stream_deepseek_api
+from backend.services.llama_api import call_llama_api
+
+FAST = dict(ttft_ms=0, tokens_per_sec=100000)
+
+
+@pytest.fixture(scope="module")
+def mock_url():
+    app = create_app(MockSettings(**FAST))
+    with serve_in_background(app) as base_url:
+        yield base_url, app.state.mock
+
+
+@pytest.fixture(autouse=True)
+def reset_mock(mock_url):
+    _, state = mock_url
+    state.settings = MockSettings(**FAST)
+    state.reset()
+
+
+def _client(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://mock")
+
+
+class TestMockLLMServer:
+    """Тесты протокола mock-сервера"""
+
+    @pytest.mark.asyncio
+    async def test_non_stream_length_finish_reason(self):
+        app = create_app(MockSettings(completion_tokens=20, **FAST))
+        async with _client(app) as client:
+            r = await client.post("/v1/chat/completions", json={
+                "messages": [{"role": "user", "content": "привет"}],
+                "max_tokens": 5,
+            })
+        data = r.json()
+        assert r.status_code == 200
+        assert data["choices"][0]["finish_reason"] == "length"
+        assert data["usage"]["completion_tokens"] == 5
+
+    @pytest.mark.asyncio
+    async def test_stream_with_usage(self):
+        app = create_app(MockSettings(completion_tokens=3, **FAST))
+        async with _client(app) as client:
+            r = await client.post("/v1/chat/completions", json={
+                "messages": [{"role": "user", "content": "привет"}],
+                "stream": True,
+                "stream_options": {"include_usage": True},
+            })
+        events = [line[6:] for line in r.text.splitlines() if line.startswith("data: ")]
+        assert events[-1] == "[DONE]"
+        chunks = [json.loads(e) for e in events[:-1]]
+        content = "".join(c["choices"][0]["delta"].get("content", "") for c in chunks if c["choices"])
+        assert len(content.split()) == 3
+        assert chunks[-1]["usage"]["completion_tokens"] == 3
+
+    @pytest.mark.asyncio
+    async def test_prefix_cache_hits_on_repeated_prompt(self):
+        app = create_app(MockSettings(**FAST))
+        payload = {"messages": [{"role": "system", "content": "x" * 1000}, {"role": "user", "content": "q"}]}
+        async with _client(app) as client:
+            first = (await client.post("/v1/chat/completions", json=payload)).json()["usage"]
+            second = (await client.post("/v1/chat/completions", json=payload)).json()["usage"]
+        assert first["prompt_cache_hit_tokens"] == 0
+        assert second["prompt_cache_hit_tokens"] > 0
+        assert second["prompt_cache_hit_tokens"] + second["prompt_cache_miss_tokens"] == second["prompt_tokens"]
+
+
+class TestServicesAgainstMock:
+    """Интеграционные тесты сервисов с mock-сервером вместо реальных API"""
+
+    @pytest.mark.asyncio
+    async def test_deepseek_call_and_stream(self, mock_url):
+        base_url, _ = mock_url
+        messages = [{"role": "user", "content": "привет"}]
+        with patch("backend.services.deepseek_api.DEEPSEEK_API_URL", f"{base_url}/v1/chat/completions"):
+            data = await call_deepseek_api(messages)
+            chunks = [json.loads(c) async for c in stream_deepseek_api(messages)]
+
+        assert data["choices"][0]["message"]["content"]
+        assert chunks and all("content" in c for c in chunks)
+
+    @pytest.mark.asyncio
+    async def test_deepseek_stream_reports_finish_reason_and_usage(self, mock_url):
+        base_url, _ = mock_url
+        messages = [{"role": "user", "content": "привет"}]
+        info = {}
+        with patch("backend.services.deepseek_api.DEEPSEEK_API_URL", f"{base_url}/v1/chat/completions"):
+            chunks = [c async for c in stream_deepseek_api(messages, max_tokens=10, info=info)]
+
+        assert len(chunks) == 10
+        assert info["finish_reason"] == "length"
+        assert info["usage"]["completion_tokens"] == 10
+
+    @pytest.mark.asyncio
+    async def test_llama_model_loading(self, mock_url):
+        base_url, state = mock_url
+        state.settings = MockSettings(loading_requests=1, **FAST)
+        messages = [{"role": "user", "content": "привет"}]
+        with patch("backend.services.llama_api.HUGGINGFACE_API_URL", f"{base_url}/v1/chat/completions"), \
+             patch("backend.services.llama_api.HUGGINGFACE_API_KEY", "test"):
+            with pytest.raises(ValueError, match="Model is loading"):
+                await call_llama_api(messages)
+            data = await call_llama_api(messages)
+
+        assert data[0]["generated_text"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
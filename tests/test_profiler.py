@@ -0,0 +1,80 @@
+"""Тесты для сэмплирующего профайлера и админского endpoint-а"""
+import pytest
+import sys
+import threading
+import time
+from unittest.mock import patch
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.routers import admin
+from backend.services.profiler import SamplingProfiler
+
+
+def _busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestSamplingProfiler:
+    """Тесты для SamplingProfiler"""
+
+    def test_collapsed_stacks_include_worker_threads(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy-worker")
+        worker.start()
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        time.sleep(0.1)
+        profiler.stop()
+        stop.set()
+        worker.join()
+
+        lines = profiler.collapsed().splitlines()
+        assert profiler.sample_count > 0
+        busy = [line for line in lines if line.startswith("busy-worker;")]
+        assert busy and "_busy_loop (" in busy[0]
+        stack, count = busy[0].rsplit(" ", 1)
+        assert int(count) > 0
+        assert not any(line.startswith("sampling-profiler;") for line in lines)
+
+
+class TestAdminProfileEndpoint:
+    """Тесты для GET /api/admin/profile"""
+
+    def _client(self):
+        app = FastAPI()
+        app.include_router(admin.router)
+        return TestClient(app)
+
+    def test_disabled_without_admin_token(self):
+        with patch.object(admin, "ADMIN_TOKEN", None):
+            response = self._client().get("/api/admin/profile", params={"seconds": 0.1})
+        assert response.status_code == 404
+
+    def test_wrong_token_is_rejected(self):
+        with patch.object(admin, "ADMIN_TOKEN", "secret"):
+            response = self._client().get(
+                "/api/admin/profile", params={"seconds": 0.1}, headers={"X-Admin-Token": "wrong"}
+            )
+        assert response.status_code == 403
+
+    def test_returns_collapsed_profile(self):
+        with patch.object(admin, "ADMIN_TOKEN", "secret"):
+            response = self._client().get(
+                "/api/admin/profile", params={"seconds": 0.1}, headers={"X-Admin-Token": "secret"}
+            )
+        assert response.status_code == 200
+        assert response.headers["content-disposition"].startswith("attachment;")
+        assert int(response.headers["x-profile-samples"]) > 0
+        assert "MainThread;" in response.text
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
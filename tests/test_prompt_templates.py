@@ -0,0 +1,170 @@
+"""Тесты для реестра шаблонов промптов"""
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.constants import prompts
+from backend.routers import chat
+from backend.routers.common import CompletionRequest, prepare_messages
+from backend.services import metrics
+from backend.services.prompt_templates import PromptRegistry, prompt_registry
+
+
+class TestPromptRegistry:
+    """Тесты для PromptRegistry"""
+
+    def test_prefix_is_precomputed_and_shared(self):
+        template = prompt_registry.get("expert_analyst")
+        first, second = template.prefix(), template.prefix()
+        assert first == [{"role": "system", "content": prompts.EXPERT_ANALYST}]
+        assert first is not second and first[0] is second[0]
+
+    def test_latex_variant(self):
+        template = prompt_registry.get("expert_logician", latex=True)
+        assert template.name == "expert_logician+latex"
+        assert template.system == prompts.EXPERT_LOGICIAN + prompts.LATEX_INSTRUCTION
+        assert template.fingerprint != prompt_registry.get("expert_logician").fingerprint
+
+    def test_latex_flag_without_latex_variant(self):
+        registry = PromptRegistry()
+        latex = registry.register("latex", prompts.LATEX_INSTRUCTION.lstrip(), latex_variant=False)
+        registry.register("plain", "Ты помощник", latex_variant=False)
+        assert registry.get("latex", latex=True) is latex
+        with pytest.raises(KeyError, match="has no LaTeX variant"):
+            registry.get("plain", latex=True)
+
+    def test_fingerprint_is_stable(self):
+        registry = PromptRegistry()
+        again = registry.register("cursor", prompts.CURSOR_SYSTEM_PROMPT)
+        assert again.fingerprint == prompt_registry.get("cursor").fingerprint
+
+    def test_user_template(self):
+        template = prompt_registry.get("prompt_generator")
+        assert template.fields == ("task",)
+        assert template.render_user({"task": "2+2"}).endswith("Задача: 2+2")
+        with pytest.raises(KeyError):
+            template.render_user({})
+
+    @pytest.mark.parametrize("user", ["a {{b}} {c} {c}", "{c!r} {c:>4}"])
+    def test_render_matches_format(self, user):
+        template = PromptRegistry().register("t", None, user)
+        assert template.render_user({"c": "x"}) == user.format(c="x")
+
+    def test_match_system_text(self):
+        assert prompt_registry.match_system(prompts.EXPERT_MATHEMATICIAN).name == "expert_mathematician"
+        assert prompt_registry.match_system("свой промпт") is None
+
+    def test_stats(self):
+        registry = PromptRegistry()
+        template = registry.register("t", "system")
+        registry.record_usage(template, {"prompt_tokens": 100, "prompt_cache_hit_tokens": 64,
+                                         "prompt_cache_miss_tokens": 36, "completion_tokens": 7})
+        registry.record_usage(template, {"prompt_tokens": 100, "prompt_cache_hit_tokens": None})
+        stats = template.stats.to_dict()
+        assert stats["requests"] == 2
+        assert stats["prompt_tokens"] == 200
+        assert stats["cache_hit_ratio"] == 0.64
+
+
+class TestPrepareMessagesWithTemplates:
+    """Тесты для шаблонов в запросах"""
+
+    def test_template_by_name(self):
+        request = CompletionRequest(template="comparison", template_vars={"task": "x", "responses": "a, b"})
+        messages = prepare_messages(request)
+        assert messages[0] is prompt_registry.get("comparison").system_message
+        assert messages[1]["content"].startswith('Проанализируй и сравни следующие ответы на задачу "x"')
+
+    def test_latex_flag_with_plain_system_prompt(self):
+        request = CompletionRequest(prompt="вопрос", system_prompt="Ты помощник", latex=True)
+        assert prepare_messages(request)[0]["content"] == "Ты помощник" + prompts.LATEX_INSTRUCTION
+
+    @pytest.mark.parametrize("fields", [
+        {"template": "latex", "latex": True, "prompt": "x"},
+        {"system_prompt": prompts.LATEX_INSTRUCTION.lstrip(), "latex": True, "prompt": "x"},
+    ])
+    def test_latex_template_with_latex_flag(self, fields):
+        messages = prepare_messages(CompletionRequest(**fields))
+        assert messages[0] is prompt_registry.get("latex").system_message
+
+    @pytest.mark.parametrize("fields", [
+        {"template": "missing", "prompt": "x"},
+        {"template": "cursor", "system_prompt": "x", "prompt": "x"},
+        {"template": "prompt_generator"},
+    ])
+    def test_bad_template_requests(self, fields):
+        with pytest.raises(Exception) as info:
+            prepare_messages(CompletionRequest(**fields))
+        assert info.value.status_code == 400
+
+
+class _FakeProvider:
+    config = SimpleNamespace(default_temperature=0.7, default_max_tokens=1000)
+
+    def __init__(self):
+        self.calls = []
+
+    async def complete(self, messages, temperature=None, max_tokens=None):
+        self.calls.append(messages)
+        usage = {"prompt_tokens": 120, "completion_tokens": 5, "total_tokens": 125,
+                 "prompt_cache_hit_tokens": 64, "prompt_cache_miss_tokens": 56}
+        return {"content": "ответ", "finish_reason": "stop", "usage": usage, "raw": {}}
+
+    async def stream(self, messages, temperature=None, max_tokens=None, info=None):
+        self.calls.append(messages)
+        yield json.dumps({"content": "ответ"})
+        info.update(finish_reason="stop", usage={"prompt_tokens": 120, "completion_tokens": 1,
+                                                 "prompt_cache_hit_tokens": 120, "prompt_cache_miss_tokens": 0})
+
+
+def test_chat_records_usage_for_matched_system_prompt():
+    app = FastAPI()
+    app.include_router(chat.router)
+    template = prompt_registry.get("expert_mathematician")
+    before = template.stats.prompt_cache_hit_tokens
+    with patch.object(chat, "get_provider", return_value=_FakeProvider()):
+        response = TestClient(app).post("/api/chat", json={"prompt": "2+2", "system_prompt": prompts.EXPERT_MATHEMATICIAN})
+    assert template.stats.prompt_cache_hit_tokens == before + 64
+    assert response.json()["usage"]["prompt_cache_miss_tokens"] == 56
+
+
+def test_chat_stream_records_usage_metrics():
+    app = FastAPI()
+    app.include_router(chat.router)
+    before = metrics.LLM_TOKENS.value("chat_stream", "cursor", "prompt_cache_hit")
+    with patch.object(chat, "get_provider", return_value=_FakeProvider()):
+        with TestClient(app).stream("POST", "/api/chat/stream", json={"prompt": "привет", "template": "cursor"}) as r:
+            r.read()
+    assert metrics.LLM_TOKENS.value("chat_stream", "cursor", "prompt_cache_hit") == before + 120
+
+
+@pytest.mark.parametrize("path, system_prompt, prompt", [
+    # ReasoningComparison.tsx: метод генерации промпта и суммаризатор
+    ("/api/chat", prompts.PROMPT_GENERATOR_SYSTEM, prompts.PROMPT_GENERATOR_PROMPT_TEMPLATE.format(task="2+2")),
+    ("/api/chat/stream", prompts.EXPERT_ANALYTIC_COMPARER,
+     prompts.COMPARISON_PROMPT_TEMPLATE.format(task="2+2", responses="4") + prompts.LATEX_INSTRUCTION),
+], ids=["prompt_generator", "comparison"])
+def test_frontend_system_prompt_keeps_formatted_prompt(path, system_prompt, prompt):
+    app = FastAPI()
+    app.include_router(chat.router)
+    provider = _FakeProvider()
+    with patch.object(chat, "get_provider", return_value=provider):
+        response = TestClient(app).post(path, json={"system_prompt": system_prompt, "prompt": prompt})
+    assert response.status_code == 200
+    assert provider.calls == [[{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}]]
+    # Префикс — общий объект шаблона
+    assert provider.calls[0][0] is prompt_registry.match_system(system_prompt).system_message
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
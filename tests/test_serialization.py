@@ -0,0 +1,61 @@
+"""Тесты для слоя сериализации JSON (orjson или stdlib json)"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.routers.common import FastJSONResponse, FastJSONRoute
+from backend.services import serialization
+
+_SAMPLES = [
+    {"content": "Привет, мир! 🌤️ \"кавычки\" и \\n"},
+    {"usage": {"prompt_tokens": 10, "completion_tokens": 5}, "finish_reason": None, "segments": 2},
+    [{"jsonrpc": "2.0", "id": 1, "result": {"isError": False, "value": 1.5}}],
+]
+
+
+class TestSerialization:
+    """Тесты для dumps/loads"""
+
+    @pytest.mark.parametrize("obj", _SAMPLES)
+    def test_backends_produce_same_output(self, obj):
+        stdlib = serialization._stdlib_dumps(obj)
+        assert serialization.dumps(obj) == stdlib
+        assert serialization.dumps_bytes(obj) == stdlib.encode("utf-8")
+        assert serialization.loads(stdlib) == serialization.loads(stdlib.encode("utf-8")) == obj
+
+    def test_unsupported_by_orjson_falls_back(self):
+        assert serialization.loads(serialization.dumps({1: 2 ** 70})) == {"1": 2 ** 70}
+
+    def test_decode_error_is_stdlib_compatible(self):
+        with pytest.raises(json.JSONDecodeError):
+            serialization.loads(b"{not json")
+
+
+def test_routes_use_fast_json():
+    router = APIRouter(route_class=FastJSONRoute)
+
+    @router.post("/echo")
+    async def echo(body: dict):
+        return {"echo": body}
+
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.include_router(router)
+    client = TestClient(app)
+
+    response = client.post("/echo", json={"text": "погода"})
+    assert response.content == '{"echo":{"text":"погода"}}'.encode("utf-8")
+    invalid = client.post("/echo", content=b"{oops", headers={"Content-Type": "application/json"})
+    assert invalid.status_code == 422
+    assert invalid.json()["detail"][0]["type"] == "json_invalid"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,83 @@
+"""Тесты для трассировки запросов (спаны, Server-Timing, экспорт)"""
+import asyncio
+import json
+import pytest
+import sys
+from unittest.mock import patch
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.services import tracing
+
+
+@tracing.traced("test.upstream")
+async def _upstream():
+    await asyncio.sleep(0.01)
+    return "ok"
+
+
+def _make_app():
+    app = FastAPI()
+    app.add_middleware(tracing.TracingMiddleware)
+
+    @app.get("/api/items/{item_id}")
+    async def item(item_id: str):
+        with tracing.span("test.intent", item=item_id):
+            pass
+        return {"result": await _upstream()}
+
+    return app
+
+
+class TestTracing:
+    """Тесты для TracingMiddleware и экспорта"""
+
+    def test_server_timing_header_lists_spans(self):
+        response = TestClient(_make_app()).get("/api/items/1")
+
+        timing = response.headers["server-timing"]
+        assert "test.upstream;dur=" in timing
+        assert "test.intent;dur=" in timing
+        assert "total;dur=" in timing
+        assert len(response.headers["x-trace-id"]) == 32
+
+    def test_span_outside_request_is_noop(self):
+        with tracing.span("no.trace") as s:
+            s.set("key", "value")
+        assert tracing.current_span() is None
+
+    def test_jsonl_export_contains_nested_spans(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        exporter = tracing.TraceExporter(jsonl_path=str(path))
+        with patch.object(tracing, "exporter", exporter):
+            TestClient(_make_app()).get("/api/items/42")
+            exporter.flush()
+
+        record = json.loads(path.read_text().strip())
+        spans = {s["name"]: s for s in record["spans"]}
+        root = spans["GET /api/items/{item_id}"]
+        assert root["parent_id"] is None
+        assert root["attributes"]["http.status_code"] == 200
+        assert spans["test.upstream"]["parent_id"] == root["span_id"]
+        assert spans["test.intent"]["attributes"]["item"] == "42"
+
+    def test_otlp_payload_shape(self):
+        trace = tracing.Trace()
+        root = trace.start_span("GET /api/chat", None, {})
+        child = trace.start_span("deepseek.complete", root, {"max_tokens": 100})
+        child.end()
+        root.end()
+
+        spans = tracing.to_otlp([trace])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+        assert spans[1]["attributes"] == [{"key": "max_tokens", "value": {"intValue": "100"}}]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -1,6 +1,10 @@
 """Тесты для проверки, что запросы о погоде проходят через MCP"""
+import asyncio
+import json
 import pytest
 import sys
+import time
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, patch, MagicMock
 from pathlib import Path
 
@@ -11,7 +15,7 @@ pytest_plugins = ('pytest_asyncio',)
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from backend.routers.weather_chat import weather_chat, _get_weather_data
+from backend.routers.weather_chat import weather_chat, weather_chat_stream, _get_weather_data
 from backend.routers.weather_chat import WeatherChatRequest
 
 
@@ -54,7 +58,7 @@ class TestWeatherChatMCP:
             assert call_args[0][0] == "mcp-weather", "Должен вызываться mcp-weather сервер"
             assert call_args[0][1] == "get_current_weather", "Должен вызываться get_current_weather"
             assert "location" in call_args[0][2], "Должен передаваться location"
-            assert call_args[0][2]["location"] == "Москве", "Location должен быть 'Москве'"
+            assert call_args[0][2]["location"] == "Москва", "Location должен быть каноническим: 'Москва'"
             
             # Проверяем, что ответ содержит данные от MCP
             assert "погода" in result["response"].lower() or "weather" in result["response"].lower()
@@ -86,7 +90,7 @@ class TestWeatherChatMCP:
             call_args = mock_call_tool.call_args
             assert call_args[0][1] == "get_weather_forecast", "Должен вызываться get_weather_forecast"
             assert call_args[0][2]["days"] == 5, "Должно быть указано 5 дней"
-            assert call_args[0][2]["location"] == "Москве", "Location должен быть 'Москве'"
+            assert call_args[0][2]["location"] == "Москва", "Location должен быть каноническим: 'Москва'"
     
     @pytest.mark.asyncio
     async def test_non_weather_request_does_not_call_mcp(self):
@@ -95,7 +99,7 @@ class TestWeatherChatMCP:
         
         with patch('backend.routers.weather_chat.list_mcp_tools') as mock_list_tools, \
              patch('backend.routers.weather_chat.call_mcp_tool') as mock_call_tool, \
-             patch('backend.routers.weather_chat.call_deepseek_api') as mock_deepseek:
+             patch('backend.services.llm_providers.call_deepseek_api') as mock_deepseek:
             
             mock_deepseek.return_value = {
                 "choices": [{"message": {"content": "У меня все хорошо!"}}]
@@ -117,7 +121,7 @@ class TestWeatherChatMCP:
         
         with patch('backend.routers.weather_chat.list_mcp_tools') as mock_list_tools, \
              patch('backend.routers.weather_chat.call_mcp_tool') as mock_call_tool, \
-             patch('backend.routers.weather_chat.call_deepseek_api') as mock_deepseek:
+             patch('backend.services.llm_providers.call_deepseek_api') as mock_deepseek:
             
             # MCP возвращает ошибку
             mock_list_tools.return_value = {
@@ -175,6 +179,162 @@ class TestWeatherChatMCP:
             assert result is not None
             assert "Погода" in result or "погода" in result
 
+    @pytest.mark.asyncio
+    async def test_get_weather_data_prefers_canonical_location(self):
+        """Тест: город из справочника передаётся в MCP каноническим названием"""
+        intent = {"type": "current", "location": "Масквы", "canonical_location": "Москва", "days": 3}
+
+        with patch('backend.routers.weather_chat.list_mcp_tools', return_value={"tools": []}), \
+             patch('backend.routers.weather_chat.call_mcp_tool') as mock_call_tool:
+            mock_call_tool.return_value = {"content": [{"text": "15°C"}], "isError": False}
+            await _get_weather_data(intent)
+
+        assert mock_call_tool.call_args[0][2]["location"] == "Москва"
+
+
+class _FakeProvider:
+    """Провайдер, отдающий ответ двумя частями и запоминающий сообщения."""
+
+    config = SimpleNamespace(default_max_tokens=100)
+
+    def __init__(self):
+        self.messages = None
+
+    async def stream(self, messages, temperature=None, max_tokens=None, info=None):
+        self.messages = messages
+        if info is not None:
+            info.update(finish_reason="stop", usage={"completion_tokens": 2})
+        for part in ("Сегодня ", "облачно"):
+            yield json.dumps({"content": part})
+
+
+async def _events(prompt):
+    request = WeatherChatRequest(prompt=prompt)
+    response = await weather_chat_stream(request)
+    body = [chunk async for chunk in response.body_iterator]
+    return [json.loads(line[len("data: "):]) for line in body]
+
+
+class TestWeatherChatStream:
+    """Тесты для /api/weather-chat/stream"""
+
+    @pytest.mark.asyncio
+    async def test_weather_data_is_sent_before_explanation(self):
+        provider = _FakeProvider()
+        with patch('backend.routers.weather_chat._get_weather_data', AsyncMock(return_value="Погода в Москве: 15°C")), \
+             patch('backend.routers.weather_chat.get_provider', return_value=provider):
+            events = await _events("какая погода в Москве?")
+
+        assert events[0]["weather_data"] == "Погода в Москве: 15°C"
+        assert events[0]["intent"]["location"] == "Москве"
+        assert "".join(e["content"] for e in events[1:] if "content" in e) == "Сегодня облачно"
+        assert events[-1] == {"finish_reason": "stop", "segments": 1, "usage": {"completion_tokens": 2}}
+        assert "Погода в Москве: 15°C" in provider.messages[-1]["content"]
+
+    @pytest.mark.asyncio
+    async def test_statement_prompt_streams_data_without_llm(self):
+        provider = _FakeProvider()
+        with patch('backend.routers.weather_chat._get_weather_data', AsyncMock(return_value="15°C")), \
+             patch('backend.routers.weather_chat.get_provider', return_value=provider):
+            events = await _events("погода в Москве")
+
+        assert events[1] == {"content": "Вот информация о погоде:\n\n15°C"}
+        assert provider.messages is None
+
+    @pytest.mark.asyncio
+    async def test_mcp_failure_streams_fallback(self):
+        provider = _FakeProvider()
+        with patch('backend.routers.weather_chat._get_weather_data', AsyncMock(return_value=None)), \
+             patch('backend.routers.weather_chat.get_provider', return_value=provider):
+            events = await _events("погода в Москве")
+
+        assert all("weather_data" not in e for e in events)
+        assert "не удалось получить данные" in provider.messages[0]["content"]
+
+
+def _deepseek_answer(text):
+    return {"choices": [{"message": {"content": text}}]}
+
+
+class TestWeatherChatSpeculativeFallback:
+    """Тесты для параллельного запасного ответа DeepSeek"""
+
+    @pytest.mark.asyncio
+    async def test_failed_mcp_and_fallback_overlap(self):
+        async def slow_mcp_failure(intent):
+            await asyncio.sleep(0.3)
+            return None
+
+        async def slow_deepseek(messages, **kwargs):
+            await asyncio.sleep(0.3)
+            return _deepseek_answer("Не удалось получить погоду")
+
+        with patch('backend.routers.weather_chat._get_weather_data', slow_mcp_failure), \
+             patch('backend.services.llm_providers.call_deepseek_api', side_effect=slow_deepseek), \
+             patch('backend.routers.weather_chat.WEATHER_FALLBACK_HEDGE_MS', 50):
+            started = time.perf_counter()
+            result = await weather_chat(WeatherChatRequest(prompt="погода в Москве"))
+            elapsed = time.perf_counter() - started
+
+        assert result == {"response": "Не удалось получить погоду"}
+        assert elapsed < 0.5, "MCP и запасной ответ должны выполняться параллельно"
+
+    @pytest.mark.asyncio
+    async def test_fallback_is_cancelled_when_mcp_succeeds(self):
+        cancelled = asyncio.Event()
+
+        async def slow_mcp(intent):
+            await asyncio.sleep(0.1)
+            return "15°C"
+
+        async def hanging_deepseek(messages, **kwargs):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with patch('backend.routers.weather_chat._get_weather_data', slow_mcp), \
+             patch('backend.services.llm_providers.call_deepseek_api', side_effect=hanging_deepseek), \
+             patch('backend.routers.weather_chat.WEATHER_FALLBACK_HEDGE_MS', 0):
+            result = await weather_chat(WeatherChatRequest(prompt="погода в Москве"))
+            await asyncio.sleep(0)
+
+        assert result == {"response": "Вот информация о погоде:\n\n15°C"}
+        assert cancelled.is_set()
+
+    @pytest.mark.asyncio
+    async def test_mcp_deadline(self):
+        async def hanging_mcp(intent):
+            await asyncio.sleep(10)
+
+        deepseek = AsyncMock(return_value=_deepseek_answer("fallback"))
+        with patch('backend.routers.weather_chat._get_weather_data', hanging_mcp), \
+             patch('backend.services.llm_providers.call_deepseek_api', deepseek), \
+             patch('backend.routers.weather_chat.WEATHER_MCP_DEADLINE_MS', 100):
+            started = time.perf_counter()
+            result = await weather_chat(WeatherChatRequest(prompt="погода в Москве"))
+
+        assert result == {"response": "fallback"}
+        assert time.perf_counter() - started < 1
+        assert deepseek.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_truncated_fallback_is_continued_and_usage_recorded(self):
+        deepseek = AsyncMock(side_effect=[
+            {"choices": [{"message": {"content": "Не удалось "}, "finish_reason": "length"}],
+             "usage": {"completion_tokens": 5}},
+            {"choices": [{"message": {"content": "получить погоду"}, "finish_reason": "stop"}],
+             "usage": {"completion_tokens": 3}},
+        ])
+        with patch('backend.routers.weather_chat._get_weather_data', AsyncMock(return_value=None)), \
+             patch('backend.services.llm_providers.call_deepseek_api', deepseek), \
+             patch('backend.routers.weather_chat.record_usage') as record_usage:
+            result = await weather_chat(WeatherChatRequest(prompt="погода в Москве"))
+
+        assert result == {"response": "Не удалось получить погоду"}
+        record_usage.assert_called_once_with("weather_chat", None, {"completion_tokens": 8})
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,103 @@
+"""Тесты эквивалентности нового извлечения намерения и исходной реализации и LRU-кэша намерений"""
+import logging
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем корневую директорию проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks import corpora
+from benchmarks.legacy_intent import _extract_weather_intent as legacy_extract
+from backend.services.metrics import CACHE_REQUESTS
+from backend.services.weather_intent import (
+    FORECAST_WORDS, WEATHER_KEYWORDS, EXCLUDE_WORDS, IntentMemo, extract_weather_intent, parse_weather_intent,
+)
+
+_VOCABULARY = (
+    list(WEATHER_KEYWORDS) + list(FORECAST_WORDS) + list(EXCLUDE_WORDS)
+    + ["Москве", "москва", "Санкт-Петербурге", "New", "York", "in", "London", "тумана", "5", "дней", "days",
+       "7дн", "завтра", "?", "!", ",", "(Сочи)", "-", "ЕКАТЕРИНБУРГ", "İstanbul", "sunday", "Raining"]
+)
+
+
+def _fuzz_prompts(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    for _ in range(count):
+        words = [rng.choice(_VOCABULARY) for _ in range(rng.randint(1, 8))]
+        yield rng.choice((" ", "  ", ", ")).join(words)
+
+
+@pytest.mark.parametrize("prompt", corpora.WEATHER_PROMPTS_RU + corpora.WEATHER_PROMPTS_EN + corpora.OTHER_PROMPTS)
+def test_corpus_matches_legacy(prompt):
+    assert extract_weather_intent(prompt) == legacy_extract(prompt)
+
+
+def test_fuzz_matches_legacy():
+    for prompt in _fuzz_prompts(5000):
+        assert extract_weather_intent(prompt) == legacy_extract(prompt), prompt
+
+
+@pytest.mark.parametrize("prompt", ["", "   ", "тумана неделю", "прогноз на 12 дней", "в", "weather in a"])
+def test_edge_cases_match_legacy(prompt):
+    assert extract_weather_intent(prompt) == legacy_extract(prompt)
+
+
+def _cache_count(result: str) -> float:
+    return CACHE_REQUESTS.value("weather_intent", result)
+
+
+class TestIntentMemo:
+    """Тесты для LRU-кэша намерений"""
+
+    def test_repeated_prompt_is_a_hit(self):
+        memo = IntentMemo(maxsize=8, log_sample=0)
+        hits, misses = _cache_count("hit"), _cache_count("miss")
+        first = memo.get("какая погода в Москве?")
+        second = memo.get("  какая погода   в Москве? ")
+        assert first == second == parse_weather_intent("какая погода в Москве?")
+        assert len(memo) == 1
+        assert _cache_count("miss") - misses == 1
+        assert _cache_count("hit") - hits == 1
+
+    def test_non_weather_result_is_cached(self):
+        memo = IntentMemo(maxsize=8, log_sample=0)
+        assert memo.get("как дела?") is None
+        assert memo.get("как дела?") is None
+        assert len(memo) == 1
+
+    def test_least_recently_used_is_evicted(self):
+        memo = IntentMemo(maxsize=2, log_sample=0)
+        memo.get("погода в Москве")
+        memo.get("погода в Казани")
+        memo.get("погода в Москве")
+        memo.get("погода в Омске")
+        assert list(memo._entries) == ["погода в Москве", "погода в Омске"]
+
+    def test_caller_cannot_modify_cached_intent(self):
+        memo = IntentMemo(maxsize=8, log_sample=0)
+        memo.get("погода в Москве")["location"] = "Казань"
+        assert memo.get("погода в Москве")["location"] == "Москве"
+
+    def test_disabled_and_long_prompts_bypass_cache(self):
+        disabled = IntentMemo(maxsize=0, log_sample=0)
+        assert disabled.get("погода в Москве")["canonical_location"] == "Москва"
+        assert len(disabled) == 0
+        memo = IntentMemo(maxsize=8, log_sample=0)
+        memo.get("погода в Москве " + "очень " * 100)
+        assert len(memo) == 0
+
+    def test_logging_is_sampled(self, caplog):
+        caplog.set_level(logging.DEBUG, logger="backend.services.weather_intent.sampled")
+        IntentMemo(maxsize=8, log_sample=0).get("погода в Москве")
+        assert not caplog.records
+        IntentMemo(maxsize=8, log_sample=1.0).get("погода в Москве")
+        assert len(caplog.records) == 1
+        assert "cache hit: False" in caplog.records[0].getMessage()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])